@@ -39,28 +39,25 @@ print("""
     JJJJ  KK  KKK MM      MM DDDDD
 """)
 
+def frame_buffers():
+  if Qconstraints == 4 and len(species) == 2:
+    return [cluster_dic1,cluster_dic2]
+  else:
+    return [cluster_dic]
+
+def checkpoint():
+  #only the new frames are written (as the next chunk of the trajectory)
+  trajectory.flush(*frame_buffers())
+
 def savepickle():
-  global cluster_dic
-  if "cluster_dic" in globals() or "cluster_dic1" in globals() or "cluster_dic2" in globals():
-    from pandas import DataFrame
-    if Qconstraints == 4 and len(species) == 2:
-      global cluster_dic1,cluster_dic2
-      for key in cluster_dic1:
-        cluster_dic2[key] = cluster_dic2[key][::-1]
-      cluster_dic = mergeDictionary(cluster_dic1, cluster_dic2)
-    else: 
-      for key in cluster_dic:
-        cluster_dic[key] = cluster_dic[key][::-1]
-    clusters_df = DataFrame(cluster_dic) #, index = range(len(cluster_dic)))
+  if "trajectory" in globals():
+    from trajectory import save_trajectory
     global Qfolder
     try:
-      clusters_df.to_pickle(Qfolder+"/../sim"+Qfolder.split("/")[-1]+".pkl")
-      print("The sim"+Qfolder.split("/")[-1]+".pkl has been hopefully created.")
+      if save_trajectory(Qfolder+"/../sim"+Qfolder.split("/")[-1]+".pkl", [(trajectory, frame_buffers())]):
+        print("The sim"+Qfolder.split("/")[-1]+".pkl has been hopefully created.")
     except:
       print("Something got fucked up.")
-    if not (Qconstraints == 4 and len(species) == 2):
-      for key in cluster_dic:
-        cluster_dic[key] = cluster_dic[key][::-1]
 
 #print(f"Using {os.environ['OMP_NUM_THREADS']} threads.")
 current_time = 0
@@ -76,6 +73,11 @@ QEF_applied = 0
 while not Qfollow_activated == 0:
   if Qfollow_activated == -1:
     locals().update(arguments(argv[1:]))
+    if Qwalkers > 1:
+      from walkers import run_walkers
+      run_walkers(argv[1:], Qwalkers)
+      print("Done.")
+      exit()
     if Qfollow_activated == 1 and Qout > 1:
       print([Qfollow,Qfollow_activated])
   else:
@@ -257,35 +259,24 @@ while not Qfollow_activated == 0:
  
   #DUMPING
   from print_properties import print_properties, init
-  def mergeDictionary(dict_1, dict_2):
-    if len(dict_1) == 0:
-      return dict_2
-    dict_3 = {**dict_1, **dict_2}
-    for key, value in dict_3.items():
-      if key in dict_1 and key in dict_2:
-        dict_3[key] = value + dict_1[key]
-      elif key in dict_1:
-        dict_3[key] = [float("nan")] + value
-      else:
-        ml = max([len(x) for x in dict_1.values()])
-        dict_3[key] = value + ml*[float("nan")]
-    return dict_3
-    #dict1 = dist3
+  from trajectory import FrameBuffer, TrajectoryWriter
 
   init(current_time,current_step)
   #global cluster_dic
   if Qconstraints == 4 and len(species) == 2:
-    cluster_dic1 = {}
-    cluster_dic2 = {}
+    cluster_dic1 = FrameBuffer()
+    cluster_dic2 = FrameBuffer()
   else:
     if "cluster_dic" not in globals(): #current_step == 0:
-      cluster_dic = {}
+      cluster_dic = FrameBuffer()
+  if "trajectory" not in globals():
+    trajectory = TrajectoryWriter(Qfolder+"/sim"+Qfolder.split("/")[-1])
   if Qdump == 0:
     print_properties(species = all_species, timestep = Qdt, interval = 0, Qconstraints = Qconstraints, Qdistance = Qdistance, split = Qlenfirst, fail = False, QINFOfile_basename = QINFOfile_basename, QINFOcluster_type = QINFOcluster_type, QINFOcomponents = QINFOcomponents, QINFOcomponent_ratio = QINFOcomponent_ratio, heavyatoms = Qheavyatoms, print_flag = True)
   if Qdumpdf == 0:
     toupdate, current_time, current_step = print_properties(species = all_species, timestep = Qdt, interval = 0, Qconstraints = Qconstraints, Qdistance = Qdistance, split = Qlenfirst, fail = False, QINFOfile_basename = QINFOfile_basename, QINFOcluster_type = QINFOcluster_type, QINFOcomponents = QINFOcomponents, QINFOcomponent_ratio = QINFOcomponent_ratio, heavyatoms = Qheavyatoms, print_flag = False)
     if Qsavepickle:
-      cluster_dic = mergeDictionary(cluster_dic, toupdate)
+      cluster_dic.append(toupdate)
   def save(fail = False):
     global current_time,current_step
     if Qconstraints == 4 and len(species) == 2:
@@ -311,7 +302,7 @@ while not Qfollow_activated == 0:
           toupdate.update({("log","method"):[" ".join(argv[1:])],("log","program"):["Python"]})
           if Qconstraints == 3:
             toupdate.update({("log","k_bias"):[min(current_step/max(Qslow,0.0000001),1)*Qk_bias],("log","harm_distance"):[Qharm]})
-          cluster_dic = mergeDictionary(cluster_dic, toupdate)
+          cluster_dic.append(toupdate)
       else:
         interval = 0 if Qdump == 0 else Qdump
         current_time += interval * Qdt
@@ -320,8 +311,8 @@ while not Qfollow_activated == 0:
     if Qconstraints == 4 and len(species) == 2:
       toupdate1.update({("log","method"):[" ".join(argv[1:])],("log","program"):["Python"]})
       toupdate2.update({("log","method"):[" ".join(argv[1:])],("log","program"):["Python"]})
-      cluster_dic1 = mergeDictionary(cluster_dic1, toupdate1)
-      cluster_dic2 = mergeDictionary(cluster_dic2, toupdate2)
+      cluster_dic1.append(toupdate1)
+      cluster_dic2.append(toupdate2)
   if Qdump == 0:
     save()
   else:
@@ -331,7 +322,7 @@ while not Qfollow_activated == 0:
     else:
       dyn.attach(save, interval = Qdump)
   if Qsave >= 0:
-    dyn.attach(savepickle, interval = Qsave)
+    dyn.attach(checkpoint, interval = Qsave)
   if Qcalculator == "PhysNet": 
     #from calculator import calculator
     def updatephysnet():
@@ -432,11 +423,8 @@ while not Qfollow_activated == 0:
           Qsavepickle = 1
           save(fail = True)
           print(Qfolder)
-          from pandas import DataFrame
-          for key in cluster_dic:
-            cluster_dic[key] = cluster_dic[key][::-1]
-          clusters_df = DataFrame(cluster_dic)
-          clusters_df.to_pickle(Qfolder+"/error.pkl")
+          from trajectory import save_trajectory
+          save_trajectory(Qfolder+"/error.pkl", [(trajectory, [cluster_dic])])
         exit()
 
   if Qout > 1:
@@ -446,21 +434,5 @@ if Qsavepickle == 1:
   if Qout > 1:
     print("Done and now just saving pickle.")
   savepickle()
-  #save(Qfolder+"/../sim"+Qfolder.split("/")[-1]+".pkl")
- # if "cluster_dic" in globals() or "cluster_dic1" in globals() or "cluster_dic2" in globals():
- #   from pandas import DataFrame
- #   if Qconstraints == 4 and len(species) == 2:
- #     for key in cluster_dic1:
- #       cluster_dic2[key] = cluster_dic2[key][::-1]
- #     cluster_dic = mergeDictionary(cluster_dic1, cluster_dic2) 
- #   else:
- #     for key in cluster_dic:
- #       cluster_dic[key] = cluster_dic[key][::-1]
- #   clusters_df = DataFrame(cluster_dic) #, index = range(len(cluster_dic)))
- #   try:
- #     clusters_df.to_pickle(Qfolder+"/../sim"+Qfolder.split("/")[-1]+".pkl")
- #     print("The sim"+Qfolder.split("/")[-1]+".pkl has been hopefully created.")
- #   except:
- #     print("Something got fucked up.")
 
 print("Done.")
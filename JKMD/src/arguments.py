@@ -146,7 +146,8 @@ def print_help():
     -ns,-steps <int>  number of steps [default = 1000]
     -dump <int>       dumping properties every <int> step [0 means no dump, default = 1]
     -dumpdf <int>     dumping structures to dataframe every <int> step [default = -dump value]
-    -save <int>       save every <int> step [default = -1 = no intermediate save]
+    -save <int>       save new frames every <int> step (as chunks <folder>/sim*_part<k>.pkl, joined
+                      into sim*.pkl at the end) [default = -1 = no intermediate save]
 
   OTHER:
     -nf <str>         folder where the simulation will be performed
@@ -158,6 +159,8 @@ def print_help():
     -seed             set random seed (use at the begginning before specie setup) [TESTING]
     -repeat <int>     repeat x times
     -maxfails <int>   stop if number of failures exceed <int> [default = 20]
+    -walkers <int>    run <int> replicas (walkers) in one process, seed shifted by walker index,
+                      all saved into one database [NN: batched evaluation of all walkers]
     --                use for looping [m=minus] (e.g. 0--10, m1.1--0.1--m0.1, or 0--0.2--5)
     
   EXAMPLES:
@@ -200,6 +203,7 @@ def arguments(argument_list = [], species_from_previous_run = [], charge_from_pr
     Qrng = random
     Qout = 1 #output level. 0=only neccessary,1=yes,2=rich print
     Qfolder = ""
+    Qwalkers = 1
   
     #CONSTRAINTS
     Qharm = 10
@@ -646,6 +650,15 @@ def arguments(argument_list = [], species_from_previous_run = [], charge_from_pr
       Qsave = int(i)
       continue
 
+    # WALKERS
+    if i == "-walkers":
+      last = "-walkers"
+      continue
+    if last == "-walkers":
+      last = ""
+      Qwalkers = int(i)
+      continue
+
     # MAXFAILS
     if i == "-maxfails":
       last = "-maxfails"
@@ -0,0 +1,73 @@
+##################################################################
+### TRAJECTORY BUFFERING AND STREAMING OUTPUT                  ###
+##################################################################
+# Frames (dictionaries of one-element lists from print_properties) are appended to a
+# FrameBuffer. Every checkpoint (-save) writes only the new frames into the next chunk
+# <prefix>_part<k>.pkl (a normal JKQC pickle, e.g. JKQC SIM1/1sa-LM/sim*_part*.pkl) and
+# empties the buffer. At the end, the chunks are joined into the final sim*.pkl.
+
+class FrameBuffer:
+  def __init__(self):
+    self.frames = []
+
+  def __len__(self):
+    return len(self.frames)
+
+  def append(self, frame):
+    self.frames.append(frame)
+
+  def clear(self):
+    self.frames = []
+
+  def to_df(self):
+    """one DataFrame; frames with missing columns are filled with nan"""
+    from pandas import DataFrame
+    columns = {}
+    for frame in self.frames:
+      for key in frame:
+        columns.setdefault(key, None)
+    nan = float("nan")
+    return DataFrame({key: [frame[key][0] if key in frame else nan for frame in self.frames] for key in columns})
+
+class TrajectoryWriter:
+  def __init__(self, prefix):
+    self.prefix = prefix
+    self.parts = []
+
+  def flush(self, *buffers):
+    """writes the frames of the buffers into a new chunk and empties the buffers"""
+    from pandas import concat
+    from os import replace
+    dfs = [buffer.to_df() for buffer in buffers if len(buffer) > 0]
+    if len(dfs) == 0:
+      return
+    part = self.prefix+"_part"+str(len(self.parts))+".pkl"
+    concat(dfs, ignore_index = True).to_pickle(part+".tmp", compression = None)
+    replace(part+".tmp", part)
+    self.parts.append(part)
+    for buffer in buffers:
+      buffer.clear()
+
+  def collect(self, *buffers):
+    """all frames written so far (chunks + buffers) as a list of DataFrames"""
+    from pandas import read_pickle
+    return [read_pickle(part) for part in self.parts] + [buffer.to_df() for buffer in buffers if len(buffer) > 0]
+
+  def remove(self):
+    from os import remove
+    for part in self.parts:
+      remove(part)
+    self.parts = []
+
+def save_trajectory(output, pieces):
+  """joins [(writer, buffers), ...] into the output pickle and removes the chunks"""
+  from pandas import concat
+  dfs = [df for writer, buffers in pieces for df in writer.collect(*buffers)]
+  if len(dfs) == 0:
+    return False
+  concat(dfs, ignore_index = True).to_pickle(output)
+  for writer, buffers in pieces:
+    writer.remove()
+    for buffer in buffers:
+      buffer.clear()
+  return True
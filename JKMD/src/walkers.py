@@ -0,0 +1,387 @@
+##################################################################
+### MULTI-WALKER MD: N replicas in one process                 ###
+##################################################################
+# Every walker is the same simulation setup (incl. -follow) parsed with its own seed
+# (-seed, or a random seed printed at the start, shifted by the walker index), so
+# different initial velocities (-mb), random structures (-indexrange) and thermostat
+# noise. Walkers run in threads (the calculators release the GIL). NN (SchNetPack)
+# walkers share one model and their energies/forces are evaluated in one batch per MD
+# step. All frames are written into one database (see trajectory.py; with -save every
+# walker writes its own chunks).
+
+from threading import Condition, Lock
+print_lock = Lock()
+
+def base_seed(argument_list):
+  """None if -seed is given, else a random seed for the walkers of this run (printed for reproduction)"""
+  if "-seed" in argument_list:
+    return None
+  from numpy.random import SeedSequence
+  seed = SeedSequence().entropy % 2**63
+  print("JKMD: walkers seeded with -seed "+str(seed)+" (walker w uses -seed "+str(seed)+"+w)", flush = True)
+  return seed
+
+def walker_arguments(argument_list, walker, seed = None):
+  """argument list of one walker: every -seed is shifted by the walker index (or seed + walker is added)"""
+  argument_list = list(argument_list)
+  seeded = False
+  for i in range(len(argument_list)-1):
+    if argument_list[i] == "-seed":
+      argument_list[i+1] = str(int(argument_list[i+1]) + walker)
+      seeded = True
+  if not seeded:
+    if seed is None:
+      seed = base_seed(argument_list)
+    argument_list = ["-seed", str(seed + walker)] + argument_list
+  return argument_list
+
+def quiet_arguments(*args, **kwargs):
+  from arguments import arguments
+  from contextlib import redirect_stdout
+  from io import StringIO
+  with redirect_stdout(StringIO()):
+    return arguments(*args, **kwargs)
+
+class BatchEvaluator:
+  """One SchNetPack model evaluating all waiting walkers at once.
+
+  Each walker asks for its energy and forces and waits until all active walkers
+  asked (or finished); the last one evaluates the whole batch.
+  """
+  def __init__(self, model_file, cutoff):
+    import torch
+    import schnetpack as spk
+    from schnetpack.interfaces import AtomsConverter
+    if 1==1:
+      import warnings
+      warnings.filterwarnings(
+          "ignore",
+          ".*which uses the default pickle module implicitly. It is possible to construct malicious pickle data which will execute arbitrary code during unpickling.*"
+      )
+    from os import environ
+    try:
+      torch.set_num_threads(int(environ['SLURM_JOB_CPUS_PER_NODE']))
+    except:
+      from multiprocessing import cpu_count
+      torch.set_num_threads(cpu_count())
+    self.model = torch.load(model_file, map_location = "cpu", weights_only = False).to(dtype = torch.float32).eval()
+    self.converter = AtomsConverter(neighbor_list = spk.transform.ASENeighborList(cutoff = cutoff), device = "cpu", dtype = torch.float32)
+    self.cond = Condition()
+    self.active = 0
+    self.pending = {}
+    self.results = {}
+
+  def reset(self, active):
+    with self.cond:
+      self.active = active
+      self.pending = {}
+      self.results = {}
+
+  def evaluate(self):
+    from numpy import split, cumsum
+    keys = list(self.pending.keys())
+    batch = [self.pending[key] for key in keys]
+    self.pending = {}
+    try:
+      out = self.model(self.converter(batch))
+      energies = out['energy'].detach().cpu().numpy().reshape(-1)
+      forces = split(out['forces'].detach().cpu().numpy(), cumsum([len(atoms) for atoms in batch])[:-1])
+      for key, E, F in zip(keys, energies, forces):
+        self.results[key] = (float(E), F)
+    except Exception as e:
+      for key in keys:
+        self.results[key] = e
+    self.cond.notify_all()
+
+  def compute(self, key, atoms):
+    with self.cond:
+      self.pending[key] = atoms
+      if len(self.pending) >= self.active:
+        self.evaluate()
+      else:
+        self.cond.wait_for(lambda: key in self.results)
+      result = self.results.pop(key)
+    if isinstance(result, Exception):
+      raise result
+    return result
+
+  def retire(self):
+    with self.cond:
+      self.active -= 1
+      if len(self.pending) > 0 and len(self.pending) >= self.active:
+        self.evaluate()
+
+from ase.calculators.calculator import Calculator, all_changes
+class BatchedCalculator(Calculator):
+  """ASE calculator of one walker using the shared BatchEvaluator [eV, eV/Ang as SpkCalculator]"""
+  implemented_properties = ['energy', 'forces']
+
+  def __init__(self, evaluator, walker):
+    Calculator.__init__(self)
+    self.evaluator = evaluator
+    self.walker = walker
+
+  def calculate(self, atoms = None, properties = ['energy'], system_changes = all_changes):
+    Calculator.calculate(self, atoms, properties, system_changes)
+    E, F = self.evaluator.compute(self.walker, self.atoms)
+    self.results = {'energy': E, 'forces': F}
+
+class Walker:
+  def __init__(self, walker, argument_list, seed = None):
+    self.walker = walker
+    self.argument_list = walker_arguments(argument_list, walker, seed)
+    from trajectory import FrameBuffer
+    self.p = {}
+    self.frames = FrameBuffer()
+    self.writer = None
+    self.current_time = 0
+    self.current_step = 0
+    self.QEF_applied = 0
+    self.failed = False
+
+  def parse(self):
+    """parses the next simulation (the first one or the next -follow); False if there is none"""
+    p = self.p
+    if len(p) == 0:
+      p.update(quiet_arguments(self.argument_list))
+    elif p["Qfollow_activated"] == 1:
+      p.update(quiet_arguments(p["Qfollow"], p["all_species"], charge_from_previous_run = p["Qcharge"], multiplicity_from_previous_run = p["Qmultiplicity"], QINFOcluster_type = p["QINFOcluster_type"], QINFOcomponents = p["QINFOcomponents"], QINFOcomponent_ratio = p["QINFOcomponent_ratio"]))
+    else:
+      return False
+    all_species = p["species"][0]
+    for i in range(1,len(p["species"])):
+      all_species = all_species + p["species"][i]
+    p["all_species"] = all_species
+    return True
+
+  def setup(self, evaluator = None):
+    p = self.p
+    all_species = p["all_species"]
+
+    #CONSTRAINTS
+    constraints = []
+    if p["Qconstraints"] == 1:
+      if len(p["species"]) != 2:
+        print("Nice try. The umbrella sampling part of JKMD is yet not ready for your jokes.")
+        exit()
+      from umbrellaconstraint import UmbrellaConstraint
+      constraints.append(UmbrellaConstraint(all_species,p["Qk_bias"],len(p["species"][0]),p["Qharm"],p["Qslow"],p["Qheavyatoms"]))
+      p["Qconstraints"] = 3
+    if p["Qconstraints"] == 2:
+      print("JKMD: -rmsd is not available with -walkers. [EXITING]")
+      exit()
+    for QMMMspecies in p["QMMM"]:
+      from QMMM import QMMM as QMMMcalc
+      constraints.append(QMMMcalc(QMMMspecies))
+    for i in range(self.QEF_applied,len(p["QEF"])):
+      self.QEF_applied += 1
+      QEF, QEF_par, QEF_systems = p["QEF"][i], p["QEF_par"][i], p["QEF_systems"][i]
+      if QEF == "h_A" or QEF == "h_A_xyz" or QEF == "fbh_A" or QEF == "fbh_A_xyz" or QEF == "c_COM":
+        from externalforce import ExternalForce
+        constraints.append(ExternalForce(QEF,QEF_par,QEF_systems))
+      if QEF == "h_COM_COM":
+        from umbrellaconstraint import UmbrellaConstraint
+        constraints.append(UmbrellaConstraint(all_species,QEF_par[0],len(p["species"][0]),QEF_par[1],p["Qslow"]))
+      if QEF == "deltalearning":
+        from deltalearning import DeltaLearning
+        constraints.append(DeltaLearning(QEF,QEF_par,QEF_systems))
+      if QEF == "h_RMSD":
+        from umbrellaRMSDconstraint import UmbrellaConstraint
+        p["Qdistance"] = 2
+        constraints.append(UmbrellaConstraint(all_species,QEF_par[1],QEF_par[0],p["Qslow"]))
+    if len(constraints) > 0:
+      all_species.set_constraint(constraints)
+
+    #CALCULATOR
+    if p["Qcalculator"] == "PhysNet" or (p["Qcalculator"] == "XTB" and p["Qcalculator_input"] == "GFNFF"):
+      print("JKMD: PhysNet and GFNFF are not available with -walkers. [EXITING]")
+      exit()
+    if evaluator is not None:
+      all_species.calc = BatchedCalculator(evaluator, self.walker)
+    else:
+      from calculator import calculator
+      all_species.calc = calculator(p["Qcalculator"], p["Qcalculator_input"], p["Qcalculator_max_iterations"], p["Qcharge"], p["Qmultiplicity"], 0, all_species, p["Qmixer_damping"], p["Qcutoff"])
+      # file based calculators (e.g. ORCA) must not share the working directory
+      from ase.calculators.calculator import FileIOCalculator
+      from ase.calculators.genericfileio import GenericFileIOCalculator
+      if isinstance(all_species.calc, (FileIOCalculator, GenericFileIOCalculator)):
+        all_species.calc.directory = "walker"+str(self.walker)
+
+    #THERMOSTAT
+    from ase import units
+    Qthermostat, Qdt, Qtemp, Qrng = p["Qthermostat"], p["Qdt"], p["Qtemp"], p["Qrng"]
+    if Qthermostat == "VV":
+      if p["Qfixcm"] == 1:
+        print("Sorry did not check yet how to fix COM for VV")
+        exit()
+      from ase.md.verlet import VelocityVerlet
+      dyn = VelocityVerlet(all_species, Qdt * units.fs)
+    elif Qthermostat == "L":
+      from ase.md.langevin import Langevin
+      dyn = Langevin(all_species, Qdt * units.fs, temperature_K = Qtemp, friction = p["Qthermostat_L"] / units.fs, fixcm = p["Qfixcm"], rng = Qrng)
+    elif Qthermostat == "NH":
+      from ase.md.npt import NPT
+      from numpy import identity
+      all_species.set_cell(2 * identity(3))
+      dyn = NPT(atoms = all_species, timestep = Qdt * units.fs, temperature_K = Qtemp, ttime = p["Qthermostat_NH"] * units.fs, externalstress = None)
+      if p["Qfixcm"] == 1:
+        dyn.zero_center_of_mass_momentum(verbose = 1)
+    elif Qthermostat == "B":
+      from ase_bussi import Bussi
+      dyn = Bussi(all_species, Qdt * units.fs, temperature_K = Qtemp, taut = p["Qthermostat_NH"] * units.fs, rng = Qrng)
+    elif Qthermostat == "A":
+      from ase.md.andersen import Andersen
+      dyn = Andersen(all_species, Qdt * units.fs, temperature_K = Qtemp, andersen_prob = p["Qthermostat_A"] * units.fs, rng = Qrng)
+    elif Qthermostat == "OPT":
+      from ase.optimize import BFGS
+      dyn = BFGS(all_species, logfile = None)
+    else:
+      print("Some weird thermostat.")
+      exit()
+    self.dyn = dyn
+    if self.writer is None:
+      from trajectory import TrajectoryWriter
+      self.writer = TrajectoryWriter(p["Qfolder"]+"/sim"+p["Qfolder"].split("/")[-1]+"_w"+str(self.walker))
+    if p["Qsave"] >= 0:
+      dyn.attach(lambda: self.writer.flush(self.frames), interval = p["Qsave"])
+    self.stepsmade = 0
+    def stepsmadeadd():
+      self.stepsmade += 1
+    if p["Qdump"] == 0:
+      dyn.attach(stepsmadeadd, interval = 1)
+    else:
+      dyn.attach(self.save, interval = p["Qdump"])
+      dyn.attach(stepsmadeadd, interval = 1)
+
+  def dump(self, interval, fail = False, print_flag = True):
+    from print_properties import print_properties, init
+    p = self.p
+    all_species = p["all_species"]
+    if not fail:
+      # outside of the lock: a batched calculator waits for the other walkers
+      all_species.get_potential_energy()
+    if p["QINFOfile_basename"] == "str":
+      basename = "str"
+    else:
+      basename = p["QINFOfile_basename"]+"_w"+str(self.walker)
+    with print_lock:
+      init(self.current_time,self.current_step)
+      toupdate, self.current_time, self.current_step = print_properties(species = all_species, timestep = p["Qdt"], interval = interval, Qconstraints = p["Qconstraints"], Qdistance = p["Qdistance"], split = p["Qlenfirst"], fail = fail, QINFOfile_basename = basename, QINFOcluster_type = p["QINFOcluster_type"], QINFOcomponents = p["QINFOcomponents"], QINFOcomponent_ratio = p["QINFOcomponent_ratio"], heavyatoms = p["Qheavyatoms"], print_flag = print_flag, label = "JKMD(w"+str(self.walker)+")")
+    return toupdate
+
+  def save(self, fail = False):
+    from sys import argv
+    p = self.p
+    Qdump, Qdumpdf = p["Qdump"], p["Qdumpdf"]
+    should_print = fail or Qdump == 0 or (self.current_step % Qdump) == 0
+    should_save_df = (fail and p["Qsavepickle"]) or Qdumpdf == 0 or (self.current_step % Qdumpdf) == 0
+    interval = 0 if Qdump == 0 else Qdump
+    if should_print or should_save_df:
+      toupdate = self.dump(interval, fail = fail, print_flag = should_print)
+      if should_save_df and p["Qsavepickle"]:
+        toupdate.update({("log","method"):[" ".join(argv[1:])],("log","program"):["Python"],("log","walker"):[self.walker]})
+        if p["Qconstraints"] == 3:
+          toupdate.update({("log","k_bias"):[min(self.current_step/max(p["Qslow"],0.0000001),1)*p["Qk_bias"]],("log","harm_distance"):[p["Qharm"]]})
+        self.frames.append(toupdate)
+    else:
+      self.current_time += interval * p["Qdt"]
+      self.current_step += interval
+
+  def run(self, evaluator = None):
+    """one simulation (segment) of this walker, the same steps and error handling as JKMD.py"""
+    from numpy import random
+    p = self.p
+    all_species = p["all_species"]
+    try:
+      if p["Qdump"] == 0:
+        self.dump(0)
+      if p["Qdumpdf"] == 0 and p["Qsavepickle"]:
+        self.frames.append(self.dump(0, print_flag = False))
+      if p["Qdump"] == 0:
+        self.save()
+      sim_errors = 0
+      sim_tot_errors = 0
+      sim_last_error = -1
+      Qns, Qdump, Qdt = p["Qns"], p["Qdump"], p["Qdt"]
+      while self.stepsmade < Qns:
+        try:
+          if p["Qthermostat"] == "OPT":
+            self.dyn.run(fmax=0.05)
+          else:
+            self.dyn.run(Qns - self.stepsmade)
+          if Qdump == 0:
+            self.current_time += Qdt*Qns
+            self.current_step += Qns
+          else:
+            self.current_time -= Qdt*Qdump
+            self.current_step -= Qdump
+        except Exception as e:
+          print("JKMD(w"+str(self.walker)+"): Something got screwed up within the dyn.run(Qns). Small adjustment to the structure!!!", flush = True)
+          print(str(e), flush = True)
+          positions = all_species.get_positions()
+          all_species.set_positions(positions + random.normal(scale=0.01, size=positions.shape))
+          sim_tot_errors += 1
+          if self.current_step == sim_last_error:
+            sim_errors += 1
+          else:
+            sim_errors = 1
+            sim_last_error = self.current_step
+          if sim_errors == 4 or sim_tot_errors > p["Qmaxfails"]:
+            print("JKMD(w"+str(self.walker)+"): Too many errors in the simulation. Walker stopped.", flush = True)
+            self.save(fail = True)
+            self.failed = True
+            return
+    finally:
+      if evaluator is not None:
+        evaluator.retire()
+
+def run_walkers(argument_list, Qwalkers):
+  from concurrent.futures import ThreadPoolExecutor
+  from os import environ
+  try:
+    num_cores = int(environ['SLURM_JOB_CPUS_PER_NODE'])
+  except:
+    from multiprocessing import cpu_count
+    num_cores = cpu_count()
+
+  seed = base_seed(argument_list)
+  walkers = [Walker(w, argument_list, seed) for w in range(Qwalkers)]
+  evaluator = None
+  segment = 0
+  while True:
+    running = [walker for walker in walkers if not walker.failed and walker.parse()]
+    if len(running) == 0:
+      break
+    segment += 1
+    p = running[0].p
+    if segment == 1 and p["Qconstraints"] == 2:
+      print("JKMD: -rmsd is not available with -walkers. [EXITING]")
+      exit()
+    if p["Qcalculator"] == "NN":
+      if evaluator is None:
+        evaluator = BatchEvaluator(p["Qcalculator_input"], p["Qcutoff"])
+      evaluator.reset(len(running))
+    elif evaluator is not None:
+      evaluator = None
+    for walker in running:
+      walker.setup(evaluator)
+    # batched walkers have to step together, the others just share the cores
+    threads = len(running) if evaluator is not None else min(len(running), num_cores)
+    print("JKMD: Running "+str(len(running))+" walkers (simulation "+str(segment)+") in "+str(threads)+" threads"+(" with batched NN evaluation." if evaluator is not None else "."), flush = True)
+    with ThreadPoolExecutor(max_workers = threads) as pool:
+      for future in [pool.submit(walker.run, evaluator) for walker in running]:
+        future.result()
+
+  Qsavepickle, Qfolder = walkers[0].p["Qsavepickle"], walkers[0].p["Qfolder"]
+  failed = [walker.walker for walker in walkers if walker.failed]
+  if len(failed) > 0:
+    print("JKMD: Failed walkers: "+str(failed), flush = True)
+  if Qsavepickle == 1:
+    from trajectory import save_trajectory
+    try:
+      if save_trajectory(Qfolder+"/../sim"+Qfolder.split("/")[-1]+".pkl", [(walker.writer, [walker.frames]) for walker in walkers if walker.writer is not None]):
+        print("The sim"+Qfolder.split("/")[-1]+".pkl has been hopefully created.")
+      else:
+        print("I have nothing to save.")
+    except:
+      print("Something got fucked up.")
@@ -71,18 +71,24 @@ if Qtrain == 0 and not Qhyper:
     exit()
 
 # SAMPLE EACH SECTION:
-if Qsampleeach > 0:
+# KRR: local models for all test structures at once (src/sampleeach.py: local_krr)
+Qlocal = 0
+if Qsampleeach != 0 and Qmethod == "krr":
+    Qlocal = Qsampleeach
+    Qsampleeach = 0
+    sampleeach_all = ["once"]
+elif Qsampleeach > 0:
     from src.sampleeach import sampleeach_mbtr
 
     sampleeach_all, sample_train, sample_test = sampleeach_mbtr(
         train_high_database, test_high_database
     )
 elif Qsampleeach < 0:
-    from src.sampleeach import sampleeach_fchl
-
-    sampleeach_all, sample_train, sample_test = sampleeach_fchl(
-        train_high_database, test_high_database, krr_cutoff
+    print(
+        "JKML: -similarity is only supported with KRR (-krr). [EXITING]",
+        flush=True,
     )
+    exit()
 else:
     sampleeach_all = ["once"]
 
@@ -126,7 +132,7 @@ for sampleeach_i in sampleeach_all:
         print("JKML is preparing things for training.")
         from src.data import prepare_data_for_training as prepare_data
 
-        # returns: strs, Y_train, F_train, Qforces, Q_charge, Q_charges, Qcharge, D_dipole, Qdipole, size
+        # returns: strs, Y_train, F_train, Qforces, Q_charge, Q_charges, Qcharge, D_dipole, Qdipole, size, monomer rows
         (
             strs_train,
             Y_train,
@@ -138,6 +144,7 @@ for sampleeach_i in sampleeach_all:
             D_dipole_train,
             Qdipole_train,
             size_train,
+            monomer_rows_train,
         ) = prepare_data(
             train_high_database,
             monomers_high_database,
@@ -163,7 +170,11 @@ for sampleeach_i in sampleeach_all:
         #####################################
         print("JKML is starting the training.")
         train_start = timer()
-        if Qmethod == "krr":
+        if Qmethod == "krr" and Qlocal != 0:
+            print(
+                "JKML: local KRR models are trained during the evaluation.", flush=True
+            )
+        elif Qmethod == "krr":
             from src.QML import training
 
             locals().update(
@@ -180,6 +191,9 @@ for sampleeach_i in sampleeach_all:
                     Qsplit_i,
                     Qsplit_j,
                     hyper_cache,
+                    Qooc,
+                    kernel_cache,
+                    repr_cache,
                 )
             )
         #####################################
@@ -195,6 +209,7 @@ for sampleeach_i in sampleeach_all:
                     sigmas=sigmas,
                     no_metric=no_metric,
                     hyper_cache=hyper_cache,
+                    repr_cache=repr_cache,
                     subsample_mlkr=subsample_mlkr,
                 )
             )
@@ -209,6 +224,7 @@ for sampleeach_i in sampleeach_all:
                     Y_train,
                     varsoutfile,
                     hyper_cache=hyper_cache,
+                    repr_cache=repr_cache,
                     subsample_mlkr=subsample_mlkr,
                 )
             )
@@ -443,7 +459,27 @@ for sampleeach_i in sampleeach_all:
         eval_start = timer()
         #####################################
         print("JKML is starting the testing/evaluation.")
-        if Qmethod == "krr":
+        if Qmethod == "krr" and Qlocal != 0:
+            from src.sampleeach import local_krr
+
+            Y_predicted, repr_test_wall, repr_test_cpu, test_wall, test_cpu, d_test = (
+                local_krr(
+                    strs_train,
+                    Y_train,
+                    strs,
+                    Qlocal,
+                    Qrepresentation,
+                    Qkernel,
+                    krr_cutoff,
+                    sigmas,
+                    lambdas,
+                    monomer_rows_train,
+                    hyper_cache,
+                )
+            )
+            Qforces = 0
+            F_predicted = None
+        elif Qmethod == "krr":
             from src.QML import evaluate
 
             Y_predicted, repr_test_wall, repr_test_cpu, test_wall, test_cpu, d_test = (
@@ -457,6 +493,8 @@ for sampleeach_i in sampleeach_all:
                     strs,
                     Qkernel,
                     hyper_cache,
+                    eval_memory,
+                    repr_cache,
                 )
             )
             Qforces = 0
@@ -473,6 +511,7 @@ for sampleeach_i in sampleeach_all:
                     strs,
                     knn,
                     hyper_cache=hyper_cache,
+                    repr_cache=repr_cache,
                 )
             )
             Qforces = 0
@@ -489,6 +528,7 @@ for sampleeach_i in sampleeach_all:
                     strs,
                     mlkr,
                     hyper_cache=hyper_cache,
+                    repr_cache=repr_cache,
                 )
             )
             Qforces = 0
@@ -499,7 +539,14 @@ for sampleeach_i in sampleeach_all:
             from src.SchNetPack import evaluate
 
             Y_predicted, F_predicted, Qa_predicted = evaluate(
-                Qforces, varsoutfile, nn_cutoff, clusters_df, method, Qmin, Qifcharges
+                Qforces,
+                varsoutfile,
+                nn_cutoff,
+                clusters_df,
+                method,
+                Qmin,
+                Qifcharges,
+                nn_eval_batch,
             )
         #####################################
         elif Qmethod == "physnet":
@@ -668,7 +715,7 @@ for sampleeach_i in sampleeach_all:
         print("JKML is preparing things for training.", flush=True)
         from src.data import prepare_data_for_training as prepare_data
 
-        # returns: strs, Y_train, F_train, Qforces, Q_charge, Q_charges, Qcharge, D_dipole, Qdipole, size
+        # returns: strs, Y_train, F_train, Qforces, Q_charge, Q_charges, Qcharge, D_dipole, Qdipole, size, monomer rows
         (
             strs_train,
             Y_train,
@@ -680,6 +727,7 @@ for sampleeach_i in sampleeach_all:
             D_dipole_train,
             Qdipole_train,
             size_train,
+            monomer_rows_train,
         ) = prepare_data(
             train_high_database,
             monomers_high_database,
@@ -711,6 +759,7 @@ for sampleeach_i in sampleeach_all:
                 sigmas,
                 no_metric,
                 hyper_cache=hyper_cache,
+                repr_cache=repr_cache,
             )
         else:
             raise ValueError(
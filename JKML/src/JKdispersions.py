@@ -8,6 +8,58 @@ import numpy as np
 ang_to_bohr = 1.0 / 0.52917721092
 
 
+class Dispersion:
+    """
+    Persistent Grimme D4 (method="d4") or D3BJ (method="d3bj") dispersion for one molecular system.
+
+    Atomic numbers, total charge and damping parameters are converted to torch tensors only
+    once and reused for every call (e.g. every MD step). batch() evaluates many
+    configurations of the system in one (batched) call.
+    """
+
+    def __init__(self, symbols, totalcharge: float = 0.0, method: str = "d4", **param):
+        if method not in ["d4", "d3bj"]:
+            raise ValueError("method must be 'd4' or 'd3bj'")
+        self.method = method
+        self.numbers = mctc.convert.symbol_to_number(symbols=[str(symbol) for symbol in symbols])
+        self.charge = torch.tensor(totalcharge, dtype=torch.float64)
+        self.param = {key: torch.tensor(value, dtype=torch.float64) for key, value in param.items()}
+
+    def energy(self, numbers, pos, charge):
+        if self.method == "d4":
+            return d4.dftd4(numbers, pos, charge, self.param)
+        return d3.dftd3(numbers, pos, self.param)
+
+    def __call__(self, positions: np.ndarray):
+        """Energy in Hartree and forces in Hartree/Angstrom."""
+        pos = torch.tensor(positions * ang_to_bohr, dtype=torch.float64, requires_grad=True)
+        energy = self.energy(self.numbers, pos, self.charge)
+        (grad,) = torch.autograd.grad(energy.sum(), pos)
+        return energy.sum().item(), -grad.detach().numpy() * ang_to_bohr
+
+    def batch(self, positions: np.ndarray):
+        """Energies (B) and forces (B, N, 3) of B configurations (B, N, 3) of the system."""
+        pos = torch.tensor(np.asarray(positions) * ang_to_bohr, dtype=torch.float64, requires_grad=True)
+        numbers = self.numbers.unsqueeze(0).expand(pos.shape[0], -1)
+        charge = self.charge.expand(pos.shape[0])
+        energy = self.energy(numbers, pos, charge).sum(-1)
+        (grad,) = torch.autograd.grad(energy.sum(), pos)
+        return energy.detach().numpy(), -grad.detach().numpy() * ang_to_bohr
+
+
+# persistent engines of the systems seen so far (see get_dispersion)
+engines = {}
+
+
+def get_dispersion(symbols, totalcharge: float = 0.0, method: str = "d4", **param):
+    key = (tuple(str(symbol) for symbol in symbols), float(totalcharge), method, tuple(sorted(param.items())))
+    if key not in engines:
+        if len(engines) >= 16:
+            engines.clear()
+        engines[key] = Dispersion(symbols, totalcharge, method, **param)
+    return engines[key]
+
+
 def compute_d4_energy_forces(positions: np.ndarray, symbols: np.ndarray, totalcharge: float = 0.0, 
                           s6: float = 1.0, s8: float = 1.85897750, s9: float = 1.0, 
                           a1: float = 0.44286966, a2: float = 4.60230534):
@@ -22,7 +74,7 @@ def compute_d4_energy_forces(positions: np.ndarray, symbols: np.ndarray, totalch
     totalcharge : float, optional
         Total charge of the system (default: 0.0).
     s6, s8, s9, a1, a2 : float, optional
-        D4 dispersion parameters
+        D4 dispersion parameters (default: TPSSh-D4-ATM)
     
     Returns:
     total_energy : float
@@ -30,33 +82,7 @@ def compute_d4_energy_forces(positions: np.ndarray, symbols: np.ndarray, totalch
     forces : (N, 3) numpy array
         Forces in Hartree/Ångström.
     """
-    # Convert coordinates from Angstrom to Bohr
-    pos = torch.tensor(positions * ang_to_bohr, dtype=torch.float64, requires_grad=True)
-    
-    # Convert symbols to atomic numbers
-    numbers = mctc.convert.symbol_to_number(symbols=symbols.tolist())
-    
-    # Convert charge to torch tensor
-    charge = torch.tensor(totalcharge, dtype=torch.float64)
-    
-    # TPSSh-D4-ATM parameters
-    param = {
-        "s6": pos.new_tensor(s6),
-        "s8": pos.new_tensor(s8),
-        "s9": pos.new_tensor(s9),
-        "a1": pos.new_tensor(a1),
-        "a2": pos.new_tensor(a2),
-    }
-    
-    # Compute energy
-    energy = d4.dftd4(numbers, pos, charge, param)
-    total_energy = energy.sum().item()  # Convert to Python float
-    
-    # Compute forces via autograd
-    (grad,) = torch.autograd.grad(energy.sum(), pos)
-    forces = -grad.detach().numpy() * ang_to_bohr  # Convert from Hartree/Bohr to Hartree/Å
-    
-    return total_energy, forces
+    return get_dispersion(symbols, totalcharge, "d4", s6=s6, s8=s8, s9=s9, a1=a1, a2=a2)(positions)
 
 
 def compute_d3bj_energy_forces(positions: np.ndarray, symbols: np.ndarray, totalcharge: float = 0.0,
@@ -79,26 +105,31 @@ def compute_d3bj_energy_forces(positions: np.ndarray, symbols: np.ndarray, total
     forces : (N, 3) numpy array
         Forces in Hartree/Ångström.
     """
-    # Convert coordinates from Angstrom to Bohr
-    pos = torch.tensor(positions * ang_to_bohr, dtype=torch.float64, requires_grad=True)
-
-    # Convert symbols to atomic numbers
-    numbers = mctc.convert.symbol_to_number(symbols=symbols.tolist())
+    return get_dispersion(symbols, totalcharge, "d3bj", a1=a1, s8=s8, a2=a2)(positions)
 
-    # D3BJ parameters
-    param = {
-        "a1": pos.new_tensor(a1),
-        "s8": pos.new_tensor(s8),
-        "a2": pos.new_tensor(a2),
-    }
 
-    # Compute energy
-    energy = d3.dftd3(numbers, pos, param)
-    total_energy = energy.sum().item()  # Convert to Python float
+def compute_dispersions_batch(positions, symbols, totalcharge=0.0, method: str = "d4", **param):
+    """
+    Dispersion energies and forces of many structures (lists of (N_i, 3) positions and (N_i) symbols).
 
-    # Compute forces via autograd
+    Structures of different size/composition are padded (tad_mctc.batch.pack) and evaluated
+    in one batched call. totalcharge is a float or a list of floats; param as in Dispersion
+    (default: the parameters of compute_d4_energy_forces/compute_d3bj_energy_forces).
+    """
+    if len(param) == 0:
+        if method == "d4":
+            param = dict(s6=1.0, s8=1.85897750, s9=1.0, a1=0.44286966, a2=4.60230534)
+        else:
+            param = dict(a1=0.49484001, s8=0.78981345, a2=5.73083694)
+    engine = get_dispersion(symbols[0], totalcharge if np.ndim(totalcharge) == 0 else 0.0, method, **param)
+    if len(set(tuple(str(symbol) for symbol in s) for s in symbols)) == 1 and np.ndim(totalcharge) == 0:
+        energies, forces = engine.batch(np.array(positions))
+        return energies, list(forces)
+    numbers = mctc.batch.pack([mctc.convert.symbol_to_number(symbols=[str(symbol) for symbol in s]) for s in symbols])
+    pos = mctc.batch.pack([torch.tensor(np.asarray(p) * ang_to_bohr, dtype=torch.float64) for p in positions])
+    pos.requires_grad_(True)
+    charge = torch.tensor(np.broadcast_to(totalcharge, (len(positions),)), dtype=torch.float64)
+    energy = engine.energy(numbers, pos, charge).sum(-1)
     (grad,) = torch.autograd.grad(energy.sum(), pos)
-    forces = -grad.detach().numpy() * ang_to_bohr  # Convert from Hartree/Bohr to Hartree/Å
-
-    return total_energy, forces
-
+    forces = -grad.detach().numpy() * ang_to_bohr
+    return energy.detach().numpy(), [forces[k, :len(p)] for k, p in enumerate(positions)]
@@ -1,32 +1,49 @@
 import numpy as np
 
-def compute_energies_forces(positions, charges, sr_cut=5.0):
+conv_hartree = 0.529177  # Conversion factor to Hartree
+
+
+def switch(x, sr_cut):
+    x = x / sr_cut
+    return 3*x**2 - 2*x**3
+
+
+def intsw(x, sr_cut):
+    x = x / sr_cut
+    return - x**3 + 3*x**4/4
+
+
+def damped_pair(r, qiqj, sr_cut):
+    """Pair energy and force magnitude of the damped Coulomb interaction (r < sr_cut) in e^2/Angstrom."""
+    c = -sr_cut + 1/4
+    energy = -qiqj / sr_cut**2 * (intsw(r, sr_cut) + c)
+    force_magnitude = switch(r, sr_cut) * qiqj / sr_cut**2
+    return energy, force_magnitude
+
+
+def dense_energies_forces(positions, charges, sr_cut=5.0):
     """
-    Compute Coulomb energies and forces between atoms using vectorized operations.
+    Electrostatic energies and forces of B structures with the same number of atoms at once.
 
     Parameters:
-    positions : (N, 3) numpy array
-        Cartesian coordinates of N atoms in Angstrom.
-    charges : (N) numpy array
-        Atomic charges of N atoms in elementary charge.
-    sr_cut : float, optional
-        Cut-off distance for switching function in Angstrom.
+    positions : (B, N, 3) numpy array
+        Cartesian coordinates in Angstrom.
+    charges : (B, N) numpy array
+        Atomic charges in elementary charge.
 
     Returns:
-    energy : float
-        Total electrostatic energy in Hartree.
-    forces : (N, 3) numpy array
-        Forces on each atom due to Coulomb interactions in Hartree per Angstrom.
+    energy : (B) numpy array in Hartree
+    forces : (B, N, 3) numpy array in Hartree per Angstrom
     """
-    conv_hartree = 0.529177  # Conversion factor to Hartree
-
     # Compute pairwise distance vectors and distances
-    pos_diff = positions[:, np.newaxis, :] - positions[np.newaxis, :, :]
+    pos_diff = positions[:, :, np.newaxis, :] - positions[:, np.newaxis, :, :]
     r2 = np.sum(pos_diff**2, axis=-1)
+    diagonal = np.arange(positions.shape[1])
+    r2[:, diagonal, diagonal] = np.inf
     r = np.sqrt(r2)
 
     # Compute pairwise charge products
-    qiqj = np.outer(charges, charges)
+    qiqj = charges[:, :, np.newaxis] * charges[:, np.newaxis, :]
 
     # Define switch function
     #def switch(d):
@@ -76,22 +93,174 @@ def compute_energies_forces(positions, charges, sr_cut=5.0):
     #F_shielded = 0        #qiqj * np.where(r2 > 100000, 0.0, np.sqrt(r2 / (r2 + 1.0)**3)) 
     #force_magnitude = (cswitch * F_shielded + switch_value * F_ordinary + dswitch * E_ordinary - dswitch * E_shielded)
 
-    def switch(x):
-      x = x / sr_cut
-      return 3*x**2 - 2*x**3
+    E_damped, F_damped = damped_pair(r, qiqj, sr_cut)
+    near = r < sr_cut
 
-    def intsw(x):
-      x = x / sr_cut
-      return - x**3 + 3*x**4/4   
+    energy = 0.5 * np.sum(np.where(near, E_damped, qiqj / r), axis=(1, 2)) * conv_hartree
 
-    np.fill_diagonal(r2, np.inf) 
-    np.fill_diagonal(r, np.inf) 
+    force_magnitude = np.where(near, F_damped, qiqj / r2)
+    forces = np.sum(force_magnitude[:, :, :, np.newaxis] * pos_diff / r[:, :, :, np.newaxis], axis=2) * conv_hartree
 
-    c = -sr_cut + 1/4    
+    return energy, forces
 
-    energy = np.sum(np.triu(np.where(r < sr_cut, -qiqj / sr_cut**2 * (intsw(r) + c), qiqj / r), k=1)) * conv_hartree    
 
-    force_magnitude = np.where(r < sr_cut, switch(r) * qiqj / sr_cut**2, qiqj / r2 )
-    forces = np.sum(force_magnitude[:, :, np.newaxis] * pos_diff / r[:, :, np.newaxis], axis=1) * conv_hartree
+class Electrostatics:
+    """
+    Persistent electrostatics engine for large clusters (no N x N x 3 arrays).
 
-    return energy, forces
+    Atom pairs within the list cutoff + skin are kept in a Verlet neighbor list which is
+    rebuilt only when some atom moved by more than skin/2 since the last build. The damped
+    short-range part (r < sr_cut) is evaluated on the neighbor list. The long-range part is
+    either summed exactly in blocks of atoms (long_range="direct", identical to
+    compute_energies_forces) or approximated by the damped shifted force (Wolf) summation
+    truncated at cutoff (long_range="dsf", alpha in 1/Angstrom), which is linear in N but
+    only approximate (check it against "direct" for the system of interest).
+    """
+
+    def __init__(self, sr_cut=5.0, skin=1.0, long_range="direct", cutoff=12.0, alpha=0.2, block=512):
+        if long_range not in ["direct", "dsf"]:
+            raise ValueError("long_range must be 'direct' or 'dsf'")
+        self.sr_cut = sr_cut
+        self.skin = skin
+        self.long_range = long_range
+        self.cutoff = max(cutoff, sr_cut)
+        self.alpha = alpha
+        self.block = block
+        self.list_cutoff = (sr_cut if long_range == "direct" else self.cutoff) + skin
+        self.reference = None
+        self.pairs = None
+        self.builds = 0
+
+    def neighbor_pairs(self, positions):
+        if self.reference is None or len(self.reference) != len(positions) or \
+                np.max(np.sum((positions - self.reference)**2, axis=1)) > (self.skin / 2)**2:
+            from scipy.spatial import cKDTree
+            self.pairs = cKDTree(positions).query_pairs(self.list_cutoff, output_type="ndarray")
+            self.reference = positions.copy()
+            self.builds += 1
+        return self.pairs[:, 0], self.pairs[:, 1]
+
+    def direct_coulomb(self, positions, charges):
+        """Plain Coulomb energy (e^2/Angstrom) and forces over all pairs i < j, by blocks of rows."""
+        n = len(positions)
+        energy = 0.0
+        forces = np.zeros((n, 3))
+        for a in range(0, n, self.block):
+            b = min(a + self.block, n)
+            pos_diff = positions[a:b, np.newaxis, :] - positions[np.newaxis, a:, :]
+            r2 = np.sum(pos_diff**2, axis=-1)
+            r2[np.tril_indices(b - a)] = np.inf
+            r = np.sqrt(r2)
+            qiqj = charges[a:b, np.newaxis] * charges[np.newaxis, a:]
+            energy += np.sum(qiqj / r)
+            pair_forces = (qiqj / (r2 * r))[:, :, np.newaxis] * pos_diff
+            forces[a:b] += np.sum(pair_forces, axis=1)
+            forces[a:] -= np.sum(pair_forces, axis=0)
+        return energy, forces
+
+    def __call__(self, positions, charges):
+        """Energy in Hartree and forces in Hartree per Angstrom (as compute_energies_forces)."""
+        from scipy.special import erfc
+        positions = np.asarray(positions, dtype=float)
+        charges = np.asarray(charges, dtype=float).reshape(-1)
+        n = len(positions)
+        i, j = self.neighbor_pairs(positions)
+        pos_diff = positions[i] - positions[j]
+        r = np.sqrt(np.sum(pos_diff**2, axis=1))
+        qiqj = charges[i] * charges[j]
+
+        # damped short range as a correction to the plain Coulomb interaction
+        near = r < self.sr_cut
+        E_damped, F_damped = damped_pair(r[near], qiqj[near], self.sr_cut)
+        pair_energy = np.zeros(len(r))
+        pair_force = np.zeros(len(r))
+        pair_energy[near] = E_damped - qiqj[near] / r[near]
+        pair_force[near] = F_damped - qiqj[near] / r[near]**2
+
+        if self.long_range == "direct":
+            energy, forces = self.direct_coulomb(positions, charges)
+        else:
+            a, rc = self.alpha, self.cutoff
+            within = r < rc
+            rw = r[within]
+            shift_force = erfc(a * rc) / rc**2 + 2 * a / np.sqrt(np.pi) * np.exp(-(a * rc)**2) / rc
+            pair_energy[within] += qiqj[within] * (erfc(a * rw) / rw - erfc(a * rc) / rc + shift_force * (rw - rc))
+            pair_force[within] += qiqj[within] * (erfc(a * rw) / rw**2 + 2 * a / np.sqrt(np.pi) * np.exp(-(a * rw)**2) / rw - shift_force)
+            energy = -(erfc(a * rc) / (2 * rc) + a / np.sqrt(np.pi)) * np.sum(charges**2)
+            forces = np.zeros((n, 3))
+
+        energy += np.sum(pair_energy)
+        pair_forces = (pair_force / r)[:, np.newaxis] * pos_diff
+        for k in range(3):
+            forces[:, k] += np.bincount(i, weights=pair_forces[:, k], minlength=n) - np.bincount(j, weights=pair_forces[:, k], minlength=n)
+        return energy * conv_hartree, forces * conv_hartree
+
+
+# one persistent engine per setup (keeps the neighbor list between MD steps)
+engines = {}
+
+
+def get_engine(sr_cut=5.0, **kwargs):
+    key = (sr_cut,) + tuple(sorted(kwargs.items()))
+    if key not in engines:
+        engines[key] = Electrostatics(sr_cut=sr_cut, **kwargs)
+    return engines[key]
+
+
+def compute_energies_forces(positions, charges, sr_cut=5.0, size_threshold=2000, **kwargs):
+    """
+    Compute Coulomb energies and forces between atoms using vectorized operations.
+
+    Parameters:
+    positions : (N, 3) numpy array
+        Cartesian coordinates of N atoms in Angstrom.
+    charges : (N) numpy array
+        Atomic charges of N atoms in elementary charge.
+    sr_cut : float, optional
+        Cut-off distance for switching function in Angstrom.
+    size_threshold : int, optional
+        Above this number of atoms, the persistent neighbor-list engine is used
+        (kwargs are passed to Electrostatics, e.g. long_range="dsf").
+
+    Returns:
+    energy : float
+        Total electrostatic energy in Hartree.
+    forces : (N, 3) numpy array
+        Forces on each atom due to Coulomb interactions in Hartree per Angstrom.
+    """
+    positions = np.asarray(positions, dtype=float)
+    charges = np.asarray(charges, dtype=float).reshape(-1)
+    if len(positions) > size_threshold:
+        return get_engine(sr_cut, **kwargs)(positions, charges)
+    energy, forces = dense_energies_forces(positions[np.newaxis], charges[np.newaxis], sr_cut)
+    return energy[0], forces[0]
+
+
+def compute_energies_forces_batch(positions, charges, sr_cut=5.0, size_threshold=2000, max_memory=0.5, **kwargs):
+    """
+    compute_energies_forces for many configurations (list of (N_i, 3) positions and (N_i) charges).
+
+    Configurations with the same number of atoms are evaluated together in chunks using at
+    most about max_memory GB; large ones go through the neighbor-list engine.
+    """
+    energies = [None] * len(positions)
+    forces = [None] * len(positions)
+    by_size = {}
+    for k, pos in enumerate(positions):
+        by_size.setdefault(len(pos), []).append(k)
+    for n, indices in by_size.items():
+        if n > size_threshold:
+            for k in indices:
+                energies[k], forces[k] = compute_energies_forces(positions[k], charges[k], sr_cut, size_threshold, **kwargs)
+            continue
+        chunk = max(1, int(max_memory * 1e9 / (8 * 8 * n * n)))
+        for c in range(0, len(indices), chunk):
+            part = indices[c:c + chunk]
+            E, F = dense_energies_forces(
+                np.array([positions[k] for k in part], dtype=float),
+                np.array([np.asarray(charges[k], dtype=float).reshape(-1) for k in part]),
+                sr_cut,
+            )
+            for k, e, f in zip(part, E, F):
+                energies[k], forces[k] = e, f
+    return np.array(energies), forces
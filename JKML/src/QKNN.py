@@ -16,6 +16,7 @@ import warnings
 import sys
 import os
 from src.representations import *
+from src.representation_cache import cached_representation
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "fortran"))
 from qmllib.utils.alchemy import get_alchemy
@@ -30,25 +31,26 @@ warnings.filterwarnings(
 )
 
 
-def calculate_representation(Qrepresentation, strs, **repr_kwargs):
+def calculate_representation(Qrepresentation, strs, repr_cache=None, **repr_kwargs):
     if Qrepresentation == "fchl":
-        return generate_global_fchl19(strs, **repr_kwargs)
+        generate = generate_global_fchl19
     elif Qrepresentation == "mbdf":
-        return generate_global_mbdf(strs, **repr_kwargs)
+        generate = generate_global_mbdf
     elif Qrepresentation == "bob":
-        return generate_bob(strs, **repr_kwargs)
+        generate = generate_bob
     elif Qrepresentation == "coulomb":
-        return generate_coulomb(strs, **repr_kwargs)
+        generate = generate_coulomb
     elif Qrepresentation == "mbtr":
-        return generate_global_mbtr(strs, **repr_kwargs)
+        generate = generate_global_mbtr
     elif Qrepresentation == "fchl-kernel":
-        return generate_fchl18(strs, **repr_kwargs)
+        generate = generate_fchl18
     elif Qrepresentation == "fchl19-kernel":
-        return generate_fchl19(strs, **repr_kwargs)
+        generate = generate_fchl19
     else:
         raise NotImplementedError(
             f"Representation '{Qrepresentation}' not supported with the k-NN model!"
         )
+    return cached_representation(generate, strs, repr_cache, **repr_kwargs)
 
 
 class VPTreeKNN19:
@@ -588,6 +590,7 @@ def training(
     no_metric: bool = False,
     hyper_cache: Optional[Union[str, os.PathLike]] = None,
     subsample_mlkr: bool = False,
+    repr_cache: Optional[Union[str, os.PathLike]] = None,
 ):
 
     hyperparams = load_hyperparams(hyper_cache)
@@ -605,7 +608,7 @@ def training(
     )
     X_atoms = [strs[i].get_atomic_numbers() for i in range(len(strs))]
     X_train = calculate_representation(
-        Qrepresentation, strs, **hyperparams["representation"]
+        Qrepresentation, strs, repr_cache, **hyperparams["representation"]
     )
     repr_train_wall = time.perf_counter() - repr_wall_start
     repr_train_cpu = time.process_time() - repr_cpu_start
@@ -729,7 +732,7 @@ def training(
 ###############################################################################
 
 
-def evaluate(Qrepresentation, X_train, strs, knn_model, hyper_cache=None):
+def evaluate(Qrepresentation, X_train, strs, knn_model, hyper_cache=None, repr_cache=None):
 
     import numpy as np
 
@@ -743,7 +746,7 @@ def evaluate(Qrepresentation, X_train, strs, knn_model, hyper_cache=None):
     repr_wall_start = time.perf_counter()
     repr_cpu_start = time.process_time()
     X_test = calculate_representation(
-        Qrepresentation, strs, **hyperparams["representation"]
+        Qrepresentation, strs, repr_cache, **hyperparams["representation"]
     )
     if Qrepresentation == "fchl-kernel":
         X_test, X_train = correct_fchl18_kernel_size(X_test, X_train)
@@ -781,6 +784,7 @@ def hyperopt(
     verbose=True,
     optimise_representation=False,
     hyper_cache=None,
+    repr_cache=None,
 ):
 
     import skopt
@@ -831,7 +835,7 @@ def hyperopt(
             hyperparams = {"knn": {}, "representation": {}}
         global X
         global X_atoms
-        X = calculate_representation(Qrepresentation, strs, **repr_params)
+        X = calculate_representation(Qrepresentation, strs, repr_cache, **repr_params)
         X_atoms = [strs[i].get_atomic_numbers() for i in range(len(strs))]
 
     # add k-nn specific hyperparameters
@@ -848,7 +852,7 @@ def hyperopt(
         @skopt.utils.use_named_args(space)
         @lru_cache
         def objective(n_neighbors, weights, **repr_params):
-            X = calculate_representation(Qrepresentation, strs, **repr_params)
+            X = calculate_representation(Qrepresentation, strs, repr_cache, **repr_params)
             if not no_metric:
                 mlkr = MLKR(n_components=50)
                 mlkr.fit(X, Y_train)
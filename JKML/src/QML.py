@@ -2,6 +2,8 @@ from typing import Optional, Union, Dict, Any
 import os
 import pickle
 
+from src.representation_cache import cached_representation
+
 ###############################################################################
 ###############################################################################
 ###############################################################################
@@ -42,6 +44,9 @@ def training(
     Qsplit_i,
     Qsplit_j,
     hyper_cache: Optional[Union[str, os.PathLike]] = None,
+    Qooc: int = 0,
+    kernel_cache: Optional[Union[str, os.PathLike]] = None,
+    repr_cache: Optional[Union[str, os.PathLike]] = None,
 ):
 
     ### IMPORTS ###
@@ -95,7 +100,9 @@ def training(
         # by getting the values, we can treat the structures as a list and no worry about
         # pandas indexing
         strs = strs.values
-    X_train = generate_representation(strs, **hyperparams["representation"])
+    X_train = cached_representation(
+        generate_representation, strs, repr_cache, **hyperparams["representation"]
+    )
     repr_train_wall = time.perf_counter() - repr_wall_start
     repr_train_cpu = time.process_time() - repr_cpu_start
     n_train = X_train.shape[0]
@@ -108,8 +115,63 @@ def training(
 
     train_wall_start = time.perf_counter()
     train_cpu_start = time.process_time()
+    # OUT-OF-CORE: KERNEL TILES IN A MEMORY-MAPPED FILE + BLOCKED CHOLESKY
+    # (with -kernel-cache the raw kernel is kept and only the missing tiles are computed)
+    if Qooc > 0 or kernel_cache is not None:
+        if kernel_cache is not None:
+            from src.kernel_cache import cached_krr
+
+            alpha = cached_krr(
+                kernel_cache,
+                strs,
+                X_train,
+                X_atoms_train,
+                Y_train,
+                sigmas,
+                lambdas,
+                Qrepresentation,
+                Qkernel,
+                hyperparams["representation"],
+                JKML_sym_kernel,
+                JKML_kernel,
+                Qooc,
+            )
+        else:
+            from src.blocked_krr import blocked_krr
+
+            kernel_file = varsoutfile.split(".pkl")[0] + "_kernel.npy"
+            try:
+                alpha = blocked_krr(
+                    kernel_file,
+                    X_train,
+                    X_atoms_train,
+                    Y_train,
+                    sigmas,
+                    lambdas,
+                    Qrepresentation,
+                    JKML_sym_kernel,
+                    JKML_kernel,
+                    Qooc,
+                )
+            finally:
+                if os.path.exists(kernel_file):
+                    os.remove(kernel_file)
+        train_wall = time.perf_counter() - train_wall_start
+        train_cpu = time.process_time() - train_cpu_start
+        train_metadata = {
+            "repr_train_wall": repr_train_wall,
+            "repr_train_cpu": repr_train_cpu,
+            "train_wall": train_wall,
+            "train_cpu": train_cpu,
+            "n_train": n_train,
+            "d_train": d_train,
+        }
+        f = open(varsoutfile, "wb")
+        pickle.dump([X_train, X_atoms_train, strs, sigmas, alpha, train_metadata], f)
+        f.close()
+        print("JKML(QML): Training completed.", flush=True)
     # ONLY FOR JOINING ALL THE SPLITS AND CHOLESKY DECOMPOSITION
-    if Qsplit == -1:
+    elif Qsplit == -1:
         splits = Qsplit_i + 1
         K = []
         for i in range(0, splits):
@@ -277,6 +339,50 @@ def training(
 ###############################################################################
 
 
+def evaluate_chunk(
+    Qrepresentation,
+    generate_representation,
+    JKML_kernel,
+    representation_params,
+    X_train,
+    X_atoms_train,
+    sigmas,
+    alpha,
+    strs,
+    repr_cache=None,
+):
+    """Predictions for one chunk of test structures (used by the memory-bounded evaluate)."""
+    import numpy as np
+    import time
+
+    repr_wall_start = time.perf_counter()
+    repr_cpu_start = time.process_time()
+    X_atoms = [s.get_atomic_numbers() for s in strs]
+    if Qrepresentation != "mbdf":
+        # chunks are already distributed over the cores
+        representation_params = dict(representation_params, n_jobs=1)
+    X_test = cached_representation(
+        generate_representation, strs, repr_cache, **representation_params
+    )
+    repr_wall = time.perf_counter() - repr_wall_start
+    repr_cpu = time.process_time() - repr_cpu_start
+    if Qrepresentation == "fchl" or Qrepresentation == "fchl18":
+        from src.representations import correct_fchl18_kernel_size
+
+        X_test, _ = correct_fchl18_kernel_size(X_test, X_train)
+        Ks = JKML_kernel(X_test, X_train, kernel_args={"sigma": sigmas})
+    else:
+        Ks = [JKML_kernel(X_train, X_test, X_atoms_train, X_atoms, sigmas[0])]
+    Y_predicted = [np.dot(Ks[i], alpha[i]) for i in range(len(Ks))]
+    return (
+        Y_predicted,
+        repr_wall,
+        repr_cpu,
+        time.process_time() - repr_cpu_start - repr_cpu,
+        np.sum(X_test.shape[1:]),
+    )
+
+
 def evaluate(
     Qrepresentation,
     krr_cutoff,
@@ -287,6 +393,8 @@ def evaluate(
     strs,
     Qkernel,
     hyper_cache: Optional[Union[str, os.PathLike]] = None,
+    eval_memory: float = 0,
+    repr_cache: Optional[Union[str, os.PathLike]] = None,
 ):
 
     from pandas import DataFrame
@@ -319,6 +427,68 @@ def evaluate(
     import numpy as np
 
     hyperparams = load_hyperparams(hyper_cache, krr_cutoff)
+
+    ### MEMORY-BOUNDED EVALUATION: REPRESENTATIONS AND KERNEL ROWS IN CHUNKS
+    if eval_memory > 0:
+        from joblib import Parallel, delayed
+
+        try:
+            num_cores = int(os.environ["SLURM_JOB_CPUS_PER_NODE"])
+        except (KeyError, ValueError):
+            from multiprocessing import cpu_count
+
+            num_cores = cpu_count()
+        strs = strs.values
+        n_test = len(strs)
+        representation_params = dict(hyperparams["representation"])
+        if Qrepresentation in ["fchl", "fchl18", "fchl19"]:
+            # the same padding as if the whole test set was generated at once
+            representation_params.setdefault(
+                "max_atoms", max([len(s) for s in strs])
+            )
+        if Qrepresentation == "fchl" or Qrepresentation == "fchl18":
+            m = representation_params["max_atoms"]
+            _, X_train = correct_fchl18_kernel_size(np.zeros((0, m, 5, m)), X_train)
+        # kernel rows (all sigmas) + test representations held by each worker
+        per_structure = 8 * (
+            len(alpha) * X_train.shape[0] + int(np.prod(X_train.shape[1:]))
+        )
+        chunk = max(1, int(eval_memory * 1024**3 / (num_cores * per_structure)))
+        chunks = [(i, min(i + chunk, n_test)) for i in range(0, n_test, chunk)]
+        num_cores = min(num_cores, len(chunks))
+        print(
+            f"JKML(QML): Evaluating {n_test} structures in {len(chunks)} chunks of {chunk} on {num_cores} cores.",
+            flush=True,
+        )
+        Y_predicted = [np.zeros(n_test) for _ in range(len(alpha))]
+        repr_test_wall, repr_test_cpu, test_cpu, d_test = 0.0, 0.0, 0.0, 0
+        wall_start = time.perf_counter()
+        results = Parallel(n_jobs=num_cores, return_as="generator")(
+            delayed(evaluate_chunk)(
+                Qrepresentation,
+                generate_representation,
+                JKML_kernel,
+                representation_params,
+                X_train,
+                X_atoms_train,
+                sigmas,
+                alpha,
+                strs[c0:c1],
+                repr_cache,
+            )
+            for c0, c1 in chunks
+        )
+        # predictions are stored as soon as a chunk is done, kernel rows are dropped
+        for (c0, c1), (Y_chunk, r_wall, r_cpu, k_cpu, d) in zip(chunks, results):
+            for i in range(len(Y_chunk)):
+                Y_predicted[i][c0:c1] = Y_chunk[i]
+            repr_test_wall += r_wall / num_cores
+            repr_test_cpu += r_cpu
+            test_cpu += k_cpu
+            d_test = d
+        test_wall = time.perf_counter() - wall_start - repr_test_wall
+        return Y_predicted, repr_test_wall, repr_test_cpu, test_wall, test_cpu, d_test
+
     repr_wall_start = time.perf_counter()
     repr_cpu_start = time.process_time()
     ### REPRESENTATION CALCULATION ###
@@ -328,7 +498,9 @@ def evaluate(
         # pandas indexing
         strs = strs.values
     # TODO: allow passing more args
-    X_test = generate_representation(strs, **hyperparams["representation"])
+    X_test = cached_representation(
+        generate_representation, strs, repr_cache, **hyperparams["representation"]
+    )
     repr_test_wall = time.perf_counter() - repr_wall_start
     repr_test_cpu = time.process_time() - repr_cpu_start
     # some info about the full representation
@@ -86,6 +86,7 @@ def training(
     varsoutfile: Union[str, os.PathLike],
     hyper_cache=None,
     subsample_mlkr=False,
+    repr_cache=None,
 ):
 
     hyperparams = load_hyperparams(hyper_cache)
@@ -101,7 +102,7 @@ def training(
     )
     X_atoms = [strs[i].get_atomic_numbers() for i in range(len(strs))]
     X_train = calculate_representation(
-        Qrepresentation, strs, **hyperparams["representation"]
+        Qrepresentation, strs, repr_cache, **hyperparams["representation"]
     )
     repr_train_wall = time.perf_counter() - repr_wall_start
     repr_train_cpu = time.process_time() - repr_cpu_start
@@ -170,7 +171,7 @@ def training(
     }
 
 
-def evaluate(Qrepresentation, X_train, strs, mlkr_model, hyper_cache=None):
+def evaluate(Qrepresentation, X_train, strs, mlkr_model, hyper_cache=None, repr_cache=None):
 
     import numpy as np
 
@@ -183,7 +184,7 @@ def evaluate(Qrepresentation, X_train, strs, mlkr_model, hyper_cache=None):
     repr_wall_start = time.perf_counter()
     repr_cpu_start = time.process_time()
     X_test = calculate_representation(
-        Qrepresentation, strs, **hyperparams["representation"]
+        Qrepresentation, strs, repr_cache, **hyperparams["representation"]
     )
     print("JKML(k-NN): Calculate test kernel(s).", flush=True)
     repr_test_wall = time.perf_counter() - repr_wall_start
@@ -390,7 +390,35 @@ def training(Qforces,Y_train,F_train,Qenergytradoff,strs,nn_tvv,nn_cutoff,nw,nn_
 #####################################################################################################
 #####################################################################################################
 
-def evaluate(Qforces,varsoutfile,nn_cutoff,clusters_df,method,Qmin,Qifcharges):
+def evaluate_batched(varsoutfile,nn_cutoff,structures,Qforces,device,batch_size):
+  '''
+  Energies [and forces] of many structures at once. Structures are collated into batches
+  of batch_size molecules, neighbor lists are built by the (vectorized) torch neighbor list
+  and the model is called once per batch. Returns raw model outputs (as SpkCalculator in eV units).
+  '''
+  import torch
+  import schnetpack.transform as trn
+  from schnetpack.interfaces import AtomsConverter
+  from numpy import concatenate, split, cumsum
+
+  model = torch.load(varsoutfile, map_location=device, weights_only=False)
+  model = model.to(device=device, dtype=torch.float32).eval()
+  converter = AtomsConverter(
+      neighbor_list=trn.TorchNeighborList(cutoff=nn_cutoff),
+      device=device,
+      dtype=torch.float32,
+  )
+  energies = []
+  forces = []
+  for b in range(0, len(structures), batch_size):
+    batch = [atoms.copy() for atoms in structures[b:b+batch_size]]
+    results = model(converter(batch))
+    energies.append(results['energy'].detach().cpu().numpy().reshape(-1))
+    if Qforces == 1:
+      forces += split(results['forces'].detach().cpu().numpy(), cumsum([len(atoms) for atoms in batch])[:-1])
+  return concatenate(energies), forces
+
+def evaluate(Qforces,varsoutfile,nn_cutoff,clusters_df,method,Qmin,Qifcharges,nn_eval_batch = 100):
 
   from schnetpack.interfaces import SpkCalculator
   from torch import cuda
@@ -409,6 +437,18 @@ def evaluate(Qforces,varsoutfile,nn_cutoff,clusters_df,method,Qmin,Qifcharges):
   else:
       device = 'cpu'
 
+  if Qifcharges != 1 and nn_eval_batch > 0:
+    print("JKML(SchNetPack): Batched evaluation ("+str(nn_eval_batch)+" structures per batch)", flush=True)
+    energies, forces = evaluate_batched(varsoutfile,nn_cutoff,clusters_df["xyz"]["structure"].values,Qforces,device,nn_eval_batch)
+    Y_predicted = [0.0367493 * energies]  # Hartree
+    if Qforces == 1:
+      F_predicted = [[0.0367493 * F for F in forces]]  # Hartree/Ang
+    else:
+      F_predicted = []
+    if method == "min":
+      Y_predicted[0] += Qmin
+    return Y_predicted, F_predicted, []
+
   print("JKML(SchNetPack): Calculator loading", flush=True)
   if Qforces == 0:
       spk_calc = SpkCalculator(
@@ -230,6 +230,22 @@ def help_adv():
         "    -finishsplit <int>  (see -split) combines the splitted kernel and creates model",
         flush=True,
     )
+    print(
+        "    -ooc <int>          out-of-core KRR: kernel tiles of <int> structures in a memmap file [e.g. 2000]",
+        flush=True,
+    )
+    print(
+        "    -kernel-cache <dir> KRR: reuse cached kernels (new lambda/added structures) [FCHL/MBDF]",
+        flush=True,
+    )
+    print(
+        "    -eval_mem <float>   KRR: evaluate in chunks using at most ~<float> GB of kernel memory",
+        flush=True,
+    )
+    print(
+        "    -repr-cache <dir>   reuse representations of already seen structures [KRR/kNN/MLKR]",
+        flush=True,
+    )
     print("    -wolfram            prints {} instead of []", flush=True)
     print("", flush=True)
 
@@ -254,6 +270,10 @@ def help_nn():
         "    -batch_size,-bs <int>      batch size [def = 16], the same size is used for validation",
         flush=True,
     )
+    print(
+        "    -nn_eval_batch <int>       structures per batch in evaluation, 0 = one by one [def = 100] {SchNetPack}",
+        flush=True,
+    )
     print(
         "    -nn_train <float>          portion of training data (exlc. validation) [def = 0.9]",
         flush=True,
@@ -316,6 +336,7 @@ def arguments(argument_list=[]):
     Qsplit = 1  # 1=no split, how many splits to do; ONLY FOR TRAINING
     Qsplit_i = 1
     Qsplit_j = 1
+    Qooc = 0  # 0=in-memory KRR, >0 = tile size of out-of-core (memory-mapped) KRR
     Qeval = 0  # 0=nothing (possible), 1=validate, 2=eval
     Qopt = 0  # 0=nothing (possible), 1=optimize
     Qwolfram = 0  # 1 means that {} will be printed insead of []
@@ -357,6 +378,7 @@ def arguments(argument_list=[]):
     Qenergytradoff = 0.01  # if forces are trained on: [energy, force] = [X, 1]
     nw = 1
     Qbatch_size = 16
+    nn_eval_batch = 100  # structures per batch in NN evaluation, 0 = one by one (ASE calculator)
     Qcheckpoint = None
     Qtime = None
     parentdir = "./"
@@ -374,6 +396,9 @@ def arguments(argument_list=[]):
     # hyperparams
     Qhyper = False
     hyper_cache = None
+    kernel_cache = None
+    repr_cache = None
+    eval_memory = 0  # GB for chunked KRR evaluation, 0 = whole test kernel at once
 
     # Output files
     outfile = "predicted.pkl"
@@ -627,6 +652,18 @@ def arguments(argument_list=[]):
             Qsplit_j = int(arg) - 1
             continue
 
+        # Out-of-core KRR
+        if arg == "-ooc":
+            last = "-ooc"
+            continue
+        if last == "-ooc":
+            last = ""
+            try:
+                Qooc = int(arg)
+            except ValueError:
+                raise Exception(f"Tile size must be an integer. Got {arg}. [EXITING]")
+            continue
+
         # Sample each
         sample_each_arg_list = ["-sampleeach", "-se", "-categorize"]
         if arg in sample_each_arg_list:
@@ -661,7 +698,7 @@ def arguments(argument_list=[]):
             if Qeval == 0:
                 Qeval = 1
             try:
-                Qsampleeval = -int(arg)
+                Qsampleeach = -int(arg)
             except ValueError:
                 raise Exception(f"Similarity must be an integer. Got {arg}. [EXITING]")
             continue
@@ -819,6 +856,18 @@ def arguments(argument_list=[]):
             metric_only = True
             continue
 
+        # Evaluation batch
+        if arg == "-nn_eval_batch":
+            last = "-nn_eval_batch"
+            continue
+        if last == "-nn_eval_batch":
+            last = ""
+            try:
+                nn_eval_batch = int(arg)
+            except ValueError:
+                raise Exception(f"Batch size must be an integer. Got {arg}. [EXITING]")
+            continue
+
         # Epochs
         if arg == "-nn_epochs" or arg == "-epochs":
             last = "-nn_epochs"
@@ -1115,6 +1164,36 @@ def arguments(argument_list=[]):
             last = arg
             continue
 
+        # Memory-bounded KRR evaluation
+        if last == "-eval_mem":
+            last = ""
+            try:
+                eval_memory = float(arg)
+            except ValueError:
+                raise Exception(f"Memory must be a number. Got {arg}. [EXITING]")
+            continue
+        if arg == "-eval_mem":
+            last = arg
+            continue
+
+        # On-disk representation cache
+        if last == "-repr-cache":
+            repr_cache = arg
+            last = ""
+            continue
+        if arg == "-repr-cache":
+            last = arg
+            continue
+
+        # Persistent KRR kernel cache
+        if last == "-kernel-cache":
+            kernel_cache = arg
+            last = ""
+            continue
+        if arg == "-kernel-cache":
+            last = arg
+            continue
+
         if arg == "-subsample-mlkr":
             subsample_mlkr = True
             continue
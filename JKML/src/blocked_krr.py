@@ -0,0 +1,228 @@
+"""Out-of-core (blocked) kernel ridge regression.
+
+The training kernel is computed tile by tile (lower triangle only) by a local pool of
+processes directly into a memory-mapped .npy file of shape (n_sigmas, N, N). The kernel
+is then factorized in place by a blocked (right-looking) Cholesky decomposition and the
+regression coefficients are obtained by blocked forward and backward substitution, so
+only a few tiles have to be held in memory at once.
+"""
+
+from typing import List, Optional, Tuple, Callable, Sequence
+import os
+
+import numpy as np
+
+Bounds = Tuple[int, int]
+
+
+def tile_bounds(n: int, tile: int) -> List[Bounds]:
+    """Splits range(n) into consecutive blocks of (at most) tile elements."""
+    return [(i, min(i + tile, n)) for i in range(0, n, tile)]
+
+
+def lower_tiles(bounds: List[Bounds]) -> List[Tuple[Bounds, Bounds]]:
+    """All (row block, column block) pairs of the lower triangle (including diagonal)."""
+    return [(bounds[i], bounds[j]) for i in range(len(bounds)) for j in range(i + 1)]
+
+
+def num_cores() -> int:
+    try:
+        return int(os.environ["SLURM_JOB_CPUS_PER_NODE"])
+    except (KeyError, ValueError):
+        from multiprocessing import cpu_count
+
+        return cpu_count()
+
+
+def kernel_tile(
+    X_train,
+    X_atoms_train,
+    sigmas: Sequence[float],
+    Qrepresentation: str,
+    sym_kernel: Callable,
+    kernel: Callable,
+    I: Bounds,
+    J: Bounds,
+) -> np.ndarray:
+    """Kernel block K[:, I, J] for all sigmas (without the lambda correction)."""
+    (i0, i1), (j0, j1) = I, J
+    if (Qrepresentation == "fchl") or (Qrepresentation == "fchl18"):
+        if I == J:
+            return np.asarray(sym_kernel(X_train[i0:i1], kernel_args={"sigma": sigmas}))
+        return np.asarray(
+            kernel(X_train[i0:i1], X_train[j0:j1], kernel_args={"sigma": sigmas})
+        )
+    if I == J:
+        return np.asarray(
+            [sym_kernel(X_train[i0:i1], X_atoms_train[i0:i1], sigmas[0])]
+        )
+    # qmllib local kernels return the (second, first) block
+    return np.asarray(
+        [
+            kernel(
+                X_train[j0:j1],
+                X_train[i0:i1],
+                X_atoms_train[j0:j1],
+                X_atoms_train[i0:i1],
+                sigmas[0],
+            )
+        ]
+    )
+
+
+def write_kernel_tiles(
+    kernel_file: str,
+    tiles: List[Tuple[Bounds, Bounds]],
+    X_train,
+    X_atoms_train,
+    sigmas: Sequence[float],
+    lambdas: Sequence[float],
+    Qrepresentation: str,
+    sym_kernel: Callable,
+    kernel: Callable,
+) -> None:
+    """Worker: computes the given tiles and writes them (+ lambda on the diagonal) to the memmap."""
+    K = np.load(kernel_file, mmap_mode="r+")
+    for I, J in tiles:
+        Kt = kernel_tile(
+            X_train, X_atoms_train, sigmas, Qrepresentation, sym_kernel, kernel, I, J
+        )
+        for s in range(Kt.shape[0]):
+            if I == J:
+                Kt[s] += lambdas[s] * np.eye(Kt.shape[1])
+            K[s, I[0] : I[1], J[0] : J[1]] = Kt[s]
+    K.flush()
+    del K
+
+
+def compute_kernel(
+    kernel_file: str,
+    X_train,
+    X_atoms_train,
+    sigmas: Sequence[float],
+    lambdas: Sequence[float],
+    Qrepresentation: str,
+    sym_kernel: Callable,
+    kernel: Callable,
+    tile: int,
+    tiles: Optional[List[Tuple[Bounds, Bounds]]] = None,
+) -> np.ndarray:
+    """Fills (the lower triangle of) the memory-mapped kernel file tile by tile.
+
+    If tiles is None, the file is created and all lower tiles are computed; otherwise
+    only the given tiles of an existing file are (re)computed.
+    """
+    from joblib import Parallel, delayed
+
+    if Qrepresentation == "fchl" or Qrepresentation == "fchl18":
+        n_sigmas = len(sigmas)
+    else:
+        n_sigmas = 1
+    n = len(X_train)
+    if tiles is None:
+        K = np.lib.format.open_memmap(
+            kernel_file, mode="w+", dtype=np.float64, shape=(n_sigmas, n, n)
+        )
+        del K
+        tiles = lower_tiles(tile_bounds(n, tile))
+    cores = min(num_cores(), len(tiles))
+    print(
+        f"JKML(QML): Computing {len(tiles)} kernel tiles ({tile}x{tile}) on {cores} cores into {kernel_file}",
+        flush=True,
+    )
+    # round-robin distribution gives every worker a similar mix of diagonal/off-diagonal tiles
+    chunks = [tiles[c::cores] for c in range(cores)]
+    Parallel(n_jobs=cores)(
+        delayed(write_kernel_tiles)(
+            kernel_file,
+            chunk,
+            X_train,
+            X_atoms_train,
+            sigmas,
+            lambdas,
+            Qrepresentation,
+            sym_kernel,
+            kernel,
+        )
+        for chunk in chunks
+    )
+    return np.load(kernel_file, mmap_mode="r+")
+
+
+def blocked_cholesky(K: np.ndarray, bounds: List[Bounds]) -> np.ndarray:
+    """In-place lower Cholesky factorization of (the lower triangle of) K using tiles.
+
+    Only the lower tiles are read and overwritten; the strictly upper tiles are ignored.
+    """
+    from scipy.linalg import cholesky, solve_triangular
+
+    for k, (k0, k1) in enumerate(bounds):
+        Lkk = cholesky(np.array(K[k0:k1, k0:k1]), lower=True)
+        K[k0:k1, k0:k1] = Lkk
+        below = bounds[k + 1 :]
+        # panel: L_ik = K_ik L_kk^-T
+        for i0, i1 in below:
+            K[i0:i1, k0:k1] = solve_triangular(
+                Lkk, np.array(K[i0:i1, k0:k1]).T, lower=True
+            ).T
+        # trailing update of the lower triangle: K_ij -= L_ik L_jk^T
+        for i, (i0, i1) in enumerate(below):
+            Lik = np.array(K[i0:i1, k0:k1])
+            for j0, j1 in below[: i + 1]:
+                K[i0:i1, j0:j1] -= Lik @ np.array(K[j0:j1, k0:k1]).T
+    return K
+
+
+def blocked_cho_solve(L: np.ndarray, y: np.ndarray, bounds: List[Bounds]) -> np.ndarray:
+    """Solves (L L^T) x = y with L given as lower tiles of a (memory-mapped) array."""
+    from scipy.linalg import solve_triangular
+
+    x = np.array(y, dtype=np.float64)
+    # forward substitution L z = y
+    for k, (k0, k1) in enumerate(bounds):
+        for j0, j1 in bounds[:k]:
+            x[k0:k1] -= np.array(L[k0:k1, j0:j1]) @ x[j0:j1]
+        x[k0:k1] = solve_triangular(np.array(L[k0:k1, k0:k1]), x[k0:k1], lower=True)
+    # backward substitution L^T x = z
+    for k in range(len(bounds) - 1, -1, -1):
+        k0, k1 = bounds[k]
+        for i0, i1 in bounds[k + 1 :]:
+            x[k0:k1] -= np.array(L[i0:i1, k0:k1]).T @ x[i0:i1]
+        x[k0:k1] = solve_triangular(
+            np.array(L[k0:k1, k0:k1]), x[k0:k1], lower=True, trans="T"
+        )
+    return x
+
+
+def blocked_krr(
+    kernel_file: str,
+    X_train,
+    X_atoms_train,
+    Y_train,
+    sigmas: Sequence[float],
+    lambdas: Sequence[float],
+    Qrepresentation: str,
+    sym_kernel: Callable,
+    kernel: Callable,
+    tile: int,
+) -> List[np.ndarray]:
+    """Out-of-core KRR: regression coefficients alpha (one per sigma)."""
+    K = compute_kernel(
+        kernel_file,
+        X_train,
+        X_atoms_train,
+        sigmas,
+        lambdas,
+        Qrepresentation,
+        sym_kernel,
+        kernel,
+        tile,
+    )
+    bounds = tile_bounds(K.shape[1], tile)
+    alpha = []
+    for s in range(K.shape[0]):
+        L = blocked_cholesky(K[s], bounds)
+        alpha.append(blocked_cho_solve(L, Y_train, bounds))
+    K.flush()
+    del K
+    return alpha
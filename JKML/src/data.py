@@ -53,10 +53,14 @@ def prepare_data_for_training(train_high_database, monomers_high_database, train
   #clusters_df = train_high_database
   if Qsampleeach != 0:
     clusters_df = clusters_df.iloc[sampledist]
+  #rows of the monomers (-forcemonomers) in the training data
+  from numpy import zeros, ones, concatenate, array
+  monomer_rows = zeros(len(clusters_df), dtype=bool)
   if Qforcemonomers == 1:
     clusters_df0 = monomers_high_database
     from pandas import concat
     clusters_df = concat([clusters_df, clusters_df0.copy()], ignore_index=True)
+    monomer_rows = concatenate([monomer_rows, ones(len(clusters_df0), dtype=bool)])
     #clusters_df = clusters_df.append(clusters_df0, ignore_index=True)
   ## The low level of theory
   if method == "delta":
@@ -82,6 +86,7 @@ def prepare_data_for_training(train_high_database, monomers_high_database, train
         )
         if method == "delta":
             clusters_df2 = clusters_df2.iloc[idx]
+        monomer_rows = monomer_rows[array(idx)]
         size = "full"  # IT IS BECAUSE I DO NOT WANT TO MAKE MY TEST SET SMALLER
 
   ### ENERGIES = VARIABLES / STRUCTURES
@@ -206,6 +211,7 @@ def prepare_data_for_training(train_high_database, monomers_high_database, train
       D_dipole,
       Qdipole,
       size,
+      monomer_rows.nonzero()[0],
   )
 
 
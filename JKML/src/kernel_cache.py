@@ -0,0 +1,200 @@
+"""Persistent cache of KRR training kernels.
+
+For every (representation, representation hyperparameters, kernel, sigma) one raw kernel
+(without the lambda correction) is stored as <cache_dir>/<key>.npy together with the
+hashes of the structures it was computed for (<key>.pkl). Only the lower triangle is
+stored. A new lambda (or a reordered/sub-selected training set) thus needs only the
+Cholesky decomposition, and M appended structures need only the new N x M and M x M tiles.
+"""
+
+from typing import Any, Callable, Dict, List, Sequence
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+from src.blocked_krr import (
+    blocked_cho_solve,
+    blocked_cholesky,
+    compute_kernel,
+    tile_bounds,
+)
+from src.representation_cache import structure_hashes
+
+
+def cache_key(
+    Qrepresentation: str,
+    Qkernel: str,
+    representation_params: Dict[str, Any],
+    sigma: float,
+) -> str:
+    if Qrepresentation == "fchl18":
+        Qrepresentation = "fchl"
+    params = sorted((str(k), repr(v)) for k, v in representation_params.items())
+    return hashlib.sha1(
+        repr((Qrepresentation, Qkernel, params, float(sigma))).encode()
+    ).hexdigest()
+
+
+def update_kernel_cache(
+    cache_dir: str,
+    key: str,
+    hashes: List[str],
+    X_train,
+    X_atoms_train,
+    sigma: float,
+    Qrepresentation: str,
+    sym_kernel: Callable,
+    kernel: Callable,
+    tile: int,
+) -> np.ndarray:
+    """Makes sure that all structures are in the cached kernel <key>.
+
+    Returns the positions of the training structures in the cached kernel.
+    """
+    kernel_file = os.path.join(cache_dir, key + ".npy")
+    index_file = os.path.join(cache_dir, key + ".pkl")
+    cached = []
+    if os.path.exists(kernel_file) and os.path.exists(index_file):
+        with open(index_file, "rb") as f:
+            cached = pickle.load(f)
+    first = {}
+    for i, h in enumerate(hashes):
+        first.setdefault(h, i)
+    position = {h: i for i, h in enumerate(cached)}
+    new = [h for h in first if h not in position]
+    if len(new) > 0 and len(cached) > 0 and any(h not in first for h in cached):
+        # representations of some cached structures are not available -> start anew
+        print(
+            f"JKML(QML): Kernel cache {key[:8]} does not contain all training structures, recalculating.",
+            flush=True,
+        )
+        cached, position = [], {}
+        new = list(first)
+
+    if len(new) > 0:
+        old_n = len(cached)
+        order = [first[h] for h in cached + new]
+        X_cache = X_train[order]
+        X_atoms_cache = [X_atoms_train[i] for i in order]
+        n = len(order)
+        print(
+            f"JKML(QML): Kernel cache {key[:8]}: {old_n} cached + {len(new)} new structures.",
+            flush=True,
+        )
+        tmp_file = os.path.join(cache_dir, key + f".tmp{os.getpid()}.npy")
+        K = np.lib.format.open_memmap(
+            tmp_file, mode="w+", dtype=np.float64, shape=(1, n, n)
+        )
+        if old_n > 0:
+            K_old = np.load(kernel_file, mmap_mode="r")
+            for r0, r1 in tile_bounds(old_n, tile):
+                K[0, r0:r1, :r1] = K_old[0, r0:r1, :r1]
+            del K_old
+        K.flush()
+        del K
+        bounds = tile_bounds(old_n, tile) + [
+            (old_n + a, old_n + b) for a, b in tile_bounds(n - old_n, tile)
+        ]
+        n_old_bounds = len(tile_bounds(old_n, tile))
+        tiles = [
+            (bounds[i], bounds[j])
+            for i in range(n_old_bounds, len(bounds))
+            for j in range(i + 1)
+        ]
+        compute_kernel(
+            tmp_file,
+            X_cache,
+            X_atoms_cache,
+            [sigma],
+            [0.0],
+            Qrepresentation,
+            sym_kernel,
+            kernel,
+            tile,
+            tiles=tiles,
+        )
+        os.replace(tmp_file, kernel_file)
+        cached = cached + new
+        with open(index_file, "wb") as f:
+            pickle.dump(cached, f)
+        position = {h: i for i, h in enumerate(cached)}
+    else:
+        print(
+            f"JKML(QML): Kernel cache {key[:8]}: all {len(first)} structures cached.",
+            flush=True,
+        )
+
+    return np.array([position[h] for h in hashes], dtype=np.int64)
+
+
+def gather_block(K_cached: np.ndarray, idx_I: np.ndarray, idx_J: np.ndarray) -> np.ndarray:
+    """K[idx_I, idx_J] from a kernel with only the lower triangle stored."""
+    A = np.asarray(K_cached[np.ix_(idx_I, idx_J)])
+    B = np.asarray(K_cached[np.ix_(idx_J, idx_I)]).T
+    return np.where(idx_I[:, None] >= idx_J[None, :], A, B)
+
+
+def cached_krr(
+    cache_dir: str,
+    strs,
+    X_train,
+    X_atoms_train,
+    Y_train,
+    sigmas: Sequence[float],
+    lambdas: Sequence[float],
+    Qrepresentation: str,
+    Qkernel: str,
+    representation_params: Dict[str, Any],
+    sym_kernel: Callable,
+    kernel: Callable,
+    tile: int = 0,
+) -> List[np.ndarray]:
+    """KRR regression coefficients (one per sigma) using (and updating) the kernel cache.
+
+    With tile > 0 the training kernel is solved out-of-core (see blocked_krr).
+    """
+    from qmllib.solvers import cho_solve
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if not ((Qrepresentation == "fchl") or (Qrepresentation == "fchl18")):
+        sigmas = sigmas[:1]
+    hashes = structure_hashes(strs)
+    n = len(hashes)
+    cache_tile = tile if tile > 0 else 2000
+    alpha = []
+    for sigma, lam in zip(sigmas, lambdas):
+        key = cache_key(Qrepresentation, Qkernel, representation_params, sigma)
+        idx = update_kernel_cache(
+            cache_dir,
+            key,
+            hashes,
+            X_train,
+            X_atoms_train,
+            sigma,
+            Qrepresentation,
+            sym_kernel,
+            kernel,
+            cache_tile,
+        )
+        K_cached = np.load(os.path.join(cache_dir, key + ".npy"), mmap_mode="r")[0]
+        if tile > 0:
+            work_file = os.path.join(cache_dir, f"work{os.getpid()}.npy")
+            K = np.lib.format.open_memmap(
+                work_file, mode="w+", dtype=np.float64, shape=(n, n)
+            )
+            bounds = tile_bounds(n, tile)
+            for i, (i0, i1) in enumerate(bounds):
+                for j0, j1 in bounds[: i + 1]:
+                    K[i0:i1, j0:j1] = gather_block(K_cached, idx[i0:i1], idx[j0:j1])
+                K[i0:i1, i0:i1] += lam * np.eye(i1 - i0)
+            L = blocked_cholesky(K, bounds)
+            alpha.append(blocked_cho_solve(L, Y_train, bounds))
+            del K, L
+            os.remove(work_file)
+        else:
+            K = gather_block(K_cached, idx, idx)
+            alpha.append(cho_solve(K + lam * np.eye(n), Y_train))
+        del K_cached
+    return alpha
@@ -0,0 +1,138 @@
+"""On-disk cache of representations.
+
+Representations of single structures (FCHL18, FCHL19, Coulomb matrix, BoB) are stored
+row by row in memory-mapped .npy shards in the cache directory, keyed by the generator,
+its (resolved) keyword arguments and a hash of atomic numbers and positions of each
+structure. Only the structures that are not in the cache yet are generated. The
+representations that depend on the whole set of structures (e.g. MBDF, MBTR) are cached
+for the exact set of structures only.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Union
+from collections import defaultdict
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+# generators whose rows depend only on the structure (once padding etc. are fixed)
+ROWWISE = [
+    "generate_fchl18",
+    "generate_fchl19",
+    "generate_global_fchl19",
+    "generate_coulomb",
+    "generate_bob",
+]
+
+
+def structure_hashes(strs) -> List[str]:
+    """Structure identity: atomic numbers and (rounded) positions."""
+    hashes = []
+    for atoms in strs:
+        h = hashlib.sha1(np.asarray(atoms.get_atomic_numbers(), dtype=np.int64).tobytes())
+        h.update(np.round(atoms.get_positions(), 8).tobytes())
+        hashes.append(h.hexdigest())
+    return hashes
+
+
+def resolve_kwargs(name: str, strs, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Fixes the set-dependent defaults (padding, BoB bag sizes) so that they become part of the key."""
+    kwargs = dict(kwargs)
+    if kwargs.get("max_atoms") is None:
+        kwargs["max_atoms"] = max([len(s) for s in strs])
+    if name == "generate_bob" and kwargs.get("asize") is None:
+        asize = defaultdict(int)
+        for struct in strs:
+            elements, counts = np.unique(
+                struct.get_chemical_symbols(), return_counts=True
+            )
+            for e, c in zip(elements, counts):
+                if c > asize[e]:
+                    asize[e] = c
+        kwargs["asize"] = asize
+    return kwargs
+
+
+def representation_key(name: str, kwargs: Dict[str, Any]) -> str:
+    params = []
+    for k, v in sorted(kwargs.items()):
+        if k == "n_jobs":
+            continue
+        if isinstance(v, dict):
+            v = sorted(v.items())
+        params.append((str(k), repr(v)))
+    return hashlib.sha1(repr((name, params)).encode()).hexdigest()
+
+
+def load_index(index_file: str) -> Dict[str, Any]:
+    if os.path.exists(index_file):
+        with open(index_file, "rb") as f:
+            return pickle.load(f)
+    return {"rows": {}}
+
+
+def cached_representation(
+    generate: Callable,
+    strs,
+    repr_cache: Optional[Union[str, os.PathLike]] = None,
+    **kwargs,
+) -> np.ndarray:
+    """generate(strs, **kwargs) with the on-disk cache in directory repr_cache (if given)."""
+    if repr_cache is None or len(strs) == 0:
+        return generate(strs, **kwargs)
+    os.makedirs(repr_cache, exist_ok=True)
+    strs = list(strs)
+    name = generate.__name__
+    hashes = structure_hashes(strs)
+
+    if name not in ROWWISE:
+        key = representation_key(
+            name, dict(kwargs, structures=hashlib.sha1("".join(hashes).encode()).hexdigest())
+        )
+        store = os.path.join(repr_cache, key + ".npy")
+        if os.path.exists(store):
+            print(f"JKML: Representation loaded from cache {key[:8]}.", flush=True)
+            return np.load(store, mmap_mode="c")
+        X = generate(strs, **kwargs)
+        np.save(os.path.join(repr_cache, key + f".tmp{os.getpid()}.npy"), X)
+        os.replace(os.path.join(repr_cache, key + f".tmp{os.getpid()}.npy"), store)
+        return X
+
+    kwargs = resolve_kwargs(name, strs, kwargs)
+    key = representation_key(name, kwargs)
+    index_file = os.path.join(repr_cache, key + ".pkl")
+    index = load_index(index_file)
+    first = {}
+    for i, h in enumerate(hashes):
+        first.setdefault(h, i)
+    missing = [h for h in first if h not in index["rows"]]
+    if len(missing) > 0:
+        print(
+            f"JKML: Representation cache {key[:8]}: {len(first) - len(missing)} cached, {len(missing)} new structures.",
+            flush=True,
+        )
+        X_new = generate([strs[first[h]] for h in missing], **kwargs)
+        shard = f"{key}.{os.getpid()}_{len(index['rows'])}.npy"
+        np.save(os.path.join(repr_cache, shard), X_new)
+        # other jobs might have extended the index meanwhile
+        index = load_index(index_file)
+        index["rows"].update({h: (shard, r) for r, h in enumerate(missing)})
+        with open(index_file + f".tmp{os.getpid()}", "wb") as f:
+            pickle.dump(index, f)
+        os.replace(index_file + f".tmp{os.getpid()}", index_file)
+        row_shape, dtype = X_new.shape[1:], X_new.dtype
+    else:
+        shard = index["rows"][hashes[0]][0]
+        sample = np.load(os.path.join(repr_cache, shard), mmap_mode="r")
+        row_shape, dtype = sample.shape[1:], sample.dtype
+
+    X = np.empty((len(strs),) + row_shape, dtype=dtype)
+    by_shard = defaultdict(list)
+    for i, h in enumerate(hashes):
+        by_shard[index["rows"][h][0]].append((i, index["rows"][h][1]))
+    for shard, positions in by_shard.items():
+        rows = np.array(positions)
+        data = np.load(os.path.join(repr_cache, shard), mmap_mode="r")
+        X[rows[:, 0]] = data[rows[:, 1]]
+    return X
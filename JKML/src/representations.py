@@ -1,10 +1,90 @@
 """This module contains methods related to creating and manipulating chemical descriptors."""
 
 from ase import Atoms
-from typing import Iterable, Dict, Union
+from typing import Callable, Iterable, Dict, Optional, Union
 import numpy as np
+import os
+import time
 from collections import defaultdict
 
+# smallest number of structures worth sending to a worker process
+MIN_BATCH = 1000
+
+
+def get_num_cores() -> int:
+    try:
+        return int(os.environ["SLURM_JOB_CPUS_PER_NODE"])
+    except (KeyError, ValueError):
+        from multiprocessing import cpu_count
+
+        return cpu_count()
+
+
+def _fill_rows(out_file: str, start: int, strs, row_function: Callable, kwargs):
+    X = np.load(out_file, mmap_mode="r+")
+    for i, struct in enumerate(strs):
+        X[start + i] = row_function(struct, **kwargs)
+    X.flush()
+
+
+def generate_rows(
+    strs: Iterable[Atoms],
+    row_function: Callable,
+    n_jobs: Optional[int] = None,
+    name: str = "",
+    **kwargs,
+) -> np.ndarray:
+    """Stacks row_function(struct, **kwargs) of all structures.
+
+    Large sets are partitioned across a process pool; the workers write directly into a
+    preallocated output array (memory-mapped in /dev/shm if available).
+    """
+    strs = list(strs)
+    n = len(strs)
+    if n_jobs is None:
+        n_jobs = get_num_cores()
+    n_jobs = max(1, min(n_jobs, n // MIN_BATCH))
+    start = time.perf_counter()
+    first = np.asarray(row_function(strs[0], **kwargs))
+    if n_jobs == 1:
+        X = np.zeros((n,) + first.shape)
+        X[0] = first
+        for i in range(1, n):
+            X[i] = row_function(strs[i], **kwargs)
+    else:
+        import tempfile
+        from joblib import Parallel, delayed
+
+        folder = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+        fd, out_file = tempfile.mkstemp(suffix=".npy", dir=folder)
+        os.close(fd)
+        try:
+            X = np.lib.format.open_memmap(
+                out_file, mode="w+", dtype=np.float64, shape=(n,) + first.shape
+            )
+            X[0] = first
+            X.flush()
+            # several batches per worker for load balancing
+            batches = np.array_split(np.arange(1, n), min(4 * n_jobs, n - 1))
+            Parallel(n_jobs=n_jobs)(
+                delayed(_fill_rows)(
+                    out_file, b[0], strs[b[0] : b[-1] + 1], row_function, kwargs
+                )
+                for b in batches
+                if len(b) > 0
+            )
+            X = np.load(out_file, mmap_mode="r+").view(np.ndarray)
+        finally:
+            os.remove(out_file)
+    wall = time.perf_counter() - start
+    if n >= MIN_BATCH:
+        print(
+            f"JKML: {name} representation of {n} structures in {wall:.2f} s "
+            + f"({n / max(wall, 1e-9):.1f} structures/s, {n_jobs} processes)",
+            flush=True,
+        )
+    return X
+
 
 def generate_global_fchl19(
     strs: Iterable[Atoms], max_atoms=None, elements=None, rcut=8.0, acut=8.0, **kwargs
@@ -14,35 +94,42 @@ def generate_global_fchl19(
     return X
 
 
-def generate_fchl19(
-    strs: Iterable[Atoms], max_atoms=None, elements=None, rcut=8.0, acut=8.0, **kwargs
-) -> np.ndarray:
+def _fchl19_row(struct: Atoms, elements, rcut, acut, max_atoms) -> np.ndarray:
     from qmllib.representations import generate_fchl19 as generate_representation
 
+    return generate_representation(
+        struct.get_atomic_numbers(),
+        struct.get_positions(),
+        elements=elements,
+        rcut=rcut,
+        acut=acut,
+        pad=max_atoms,
+    )
+
+
+def generate_fchl19(
+    strs: Iterable[Atoms],
+    max_atoms=None,
+    elements=None,
+    rcut=8.0,
+    acut=8.0,
+    n_jobs=None,
+    **kwargs,
+) -> np.ndarray:
     if elements is None:
         elements = [1, 6, 7, 8, 16]
     if max_atoms is None:
         max_atoms = max([len(s.get_atomic_numbers()) for s in strs])
-    n = len(strs)
-    representation = generate_representation(
-        strs[0].get_atomic_numbers(),
-        strs[0].get_positions(),
+    X = generate_rows(
+        strs,
+        _fchl19_row,
+        n_jobs,
+        "FCHL19",
         elements=elements,
         rcut=rcut,
         acut=acut,
-        pad=max_atoms,
+        max_atoms=max_atoms,
     )
-    X = np.zeros((n, max_atoms, representation.shape[-1]))
-    X[0, :, :] = representation
-    for i in range(1, n):
-        X[i, :] = generate_representation(
-            strs[i].get_atomic_numbers(),
-            strs[i].get_positions(),
-            elements=elements,
-            rcut=rcut,
-            acut=acut,
-            pad=max_atoms,
-        )
     if np.isnan(X).any():
         raise ValueError("NaNs in FCHL representation!")
     return X
@@ -87,15 +174,26 @@ def generate_mbdf(strs: Iterable[Atoms], max_atoms=None, neighbors=None, cutoff=
     return X
 
 
+def _bob_row(struct: Atoms, max_atoms, asize) -> np.ndarray:
+    from qmllib.representations import generate_bob as generate_representation
+
+    return generate_representation(
+        struct.get_atomic_numbers(),
+        struct.get_positions(),
+        # this argument is not used for anything, but it's mandatory :) thanks QML!
+        atomtypes=None,
+        size=max_atoms,
+        asize=asize,
+    )
+
+
 def generate_bob(
     strs: Iterable[Atoms],
     max_atoms: int = None,
     asize: Dict[str, Union[np.int64, int]] = None,
+    n_jobs=None,
     **kwargs,
 ):
-    from qmllib.representations import generate_bob as generate_representation
-
-    n = len(strs)
     if max_atoms is None:
         max_atoms = max([len(x) for x in strs])
 
@@ -109,46 +207,32 @@ def generate_bob(
                 if c > asize[e]:
                     asize[e] = c
 
-    # get the first representation to find out the length
-    repres = generate_representation(
-        strs[0].get_atomic_numbers(),
-        strs[0].get_positions(),
-        atomtypes=None,
-        size=max_atoms,
-        asize=asize,
+    return generate_rows(
+        strs, _bob_row, n_jobs, "BoB", max_atoms=max_atoms, asize=dict(asize)
     )
-    X = np.zeros((n, repres.shape[0]))
-    X[0, :] = repres
-    for i in range(1, n):
-        X[i, :] = generate_representation(
-            strs[i].get_atomic_numbers(),
-            strs[i].get_positions(),
-            # this argument is not used for anything, but it's mandatory :) thanks QML!
-            atomtypes=None,
-            size=max_atoms,
-            asize=asize,
-        )
-    return X
 
 
-def generate_coulomb(strs: Iterable[Atoms], max_atoms: int = None, **kwargs):
+def _coulomb_row(struct: Atoms, max_atoms) -> np.ndarray:
     from qmllib.representations import (
         generate_coulomb_matrix as generate_representation,
     )
 
-    n = len(strs)
+    return generate_representation(
+        struct.get_atomic_numbers(),
+        struct.get_positions(),
+        size=max_atoms,
+    )
+
+
+def generate_coulomb(
+    strs: Iterable[Atoms], max_atoms: int = None, n_jobs=None, **kwargs
+):
     if max_atoms is None:
         max_atoms = max([len(x) for x in strs])
 
-    # get the first representation to find out the length
-    X = np.zeros((n, max_atoms * (max_atoms + 1) // 2))
-    for i, struct in enumerate(strs):
-        X[i, :] = generate_representation(
-            struct.get_atomic_numbers(),
-            struct.get_positions(),
-            size=max_atoms,
-        )
-    return X
+    return generate_rows(
+        strs, _coulomb_row, n_jobs, "Coulomb matrix", max_atoms=max_atoms
+    )
 
 
 def generate_global_mbtr(
@@ -187,24 +271,25 @@ def generate_global_mbtr(
     return X
 
 
-def generate_fchl18(strs: Iterable[Atoms], max_atoms=None, cutoff=8.0):
+def _fchl18_row(struct: Atoms, max_atoms, cutoff) -> np.ndarray:
     from qmllib.representations import generate_fchl18 as generate_representation
 
+    return generate_representation(
+        struct.get_atomic_numbers(),
+        struct.get_positions(),
+        max_size=max_atoms,
+        neighbors=max_atoms,
+        cut_distance=cutoff,
+    )
+
+
+def generate_fchl18(strs: Iterable[Atoms], max_atoms=None, cutoff=8.0, n_jobs=None):
     if max_atoms is None:
         max_atoms = max([len(s.get_atomic_numbers()) for s in strs])
 
-    representations = []
-    for struct in strs:
-        representations.append(
-            generate_representation(
-                struct.get_atomic_numbers(),
-                struct.get_positions(),
-                max_size=max_atoms,
-                neighbors=max_atoms,
-                cut_distance=cutoff,
-            )
-        )
-    return np.array(representations)
+    return generate_rows(
+        strs, _fchl18_row, n_jobs, "FCHL18", max_atoms=max_atoms, cutoff=cutoff
+    )
 
 
 def correct_fchl18_kernel_size(X_test: np.ndarray, X_train: np.ndarray):
@@ -140,3 +140,187 @@ def sampledist_fchl(sample_train, sample_test, sampleeach_i, Qsampleeach, Qkerne
   sampledist = dist.argsort()[:-Qsampleeach]
   return sampledist
 
+
+####################################################################################################
+# LOCAL KRR ENGINE FOR SAMPLEEACH/SIMILARITY
+# Instead of retraining the whole JKML pipeline for every test structure, the neighbor search is done
+# once for all test structures (MBTR distances or normalized FCHL similarities with cached self-kernel
+# norms), test structures with the same neighborhood share one local model, and the small local KRR
+# systems are solved in parallel.
+####################################################################################################
+
+def nearest_by_distance(D_train, D_test, k, batch = 1000):
+  '''
+  Indexes of the k nearest (squared Euclidean) training descriptors for each test descriptor.
+  The norms of the training descriptors are computed only once.
+  '''
+  from numpy import argpartition, argsort, take_along_axis, einsum, arange, empty
+  D_train, D_test = D_train.reshape(len(D_train),-1), D_test.reshape(len(D_test),-1)
+  k = min(k, len(D_train))
+  train_norms = einsum('ij,ij->i', D_train, D_train)
+  neighbors = empty((len(D_test), k), dtype = int)
+  for b in range(0, len(D_test), batch):
+    test = D_test[b:b+batch]
+    dist = train_norms[None,:] - 2*test @ D_train.T + einsum('ij,ij->i', test, test)[:,None]
+    part = argpartition(dist, k-1, axis = 1)[:,:k] if k < len(D_train) else arange(len(D_train))[None,:].repeat(len(test),0)
+    order = argsort(take_along_axis(dist, part, axis = 1), axis = 1, kind = "stable")
+    neighbors[b:b+batch] = take_along_axis(part, order, axis = 1)
+  return neighbors
+
+def self_kernel_norms(X, kernel_args, num_cores = 1):
+  '''sqrt(K(x,x)) of all FCHL18 representations (computed once)'''
+  from qmllib.representations.fchl import get_local_symmetric_kernels
+  from numpy import sqrt, array
+  from joblib import Parallel, delayed
+  def norms(chunk):
+    return [get_local_symmetric_kernels(chunk[i:i+1], kernel_args = kernel_args)[0][0][0] for i in range(len(chunk))]
+  if num_cores > 1 and len(X) > 1000:
+    from numpy import array_split
+    result = Parallel(n_jobs = num_cores)(delayed(norms)(chunk) for chunk in array_split(X, num_cores))
+    return sqrt(array(flatten(result)))
+  return sqrt(array(norms(X)))
+
+def nearest_by_similarity(X_train, X_test, k, kernel_args, num_cores = 1, batch = 1000):
+  '''
+  Indexes of the k most similar training structures, similarity = K(test,train)/sqrt(K(train,train))
+  (the FCHL18 similarity of -similarity).
+  '''
+  from qmllib.representations.fchl import get_local_kernels
+  from numpy import argsort, empty
+  k = min(k, len(X_train))
+  norms = self_kernel_norms(X_train, kernel_args, num_cores)
+  neighbors = empty((len(X_test), k), dtype = int)
+  for b in range(0, len(X_test), batch):
+    simil = get_local_kernels(X_test[b:b+batch], X_train, kernel_args = kernel_args)[0]/norms[None,:]
+    neighbors[b:b+batch] = argsort(-simil, axis = 1, kind = "stable")[:,:k]
+  return neighbors
+
+def group_neighborhoods(neighbors, forced = []):
+  '''test structures with the same set of neighbors (+ forced training structures) share one local model'''
+  groups = {}
+  for i, row in enumerate(neighbors):
+    key = tuple(sorted(set(row.tolist()) | set(forced)))
+    groups.setdefault(key, []).append(i)
+  return list(groups.items())
+
+def solve_local_models(groups, X_train, X_atoms_train, Y_train, X_test, X_atoms_test, Qrepresentation, sym_kernel, kernel, sigmas, lambdas):
+  '''local KRR model (trained on the neighborhood) -> predictions for the test structures of each group'''
+  from numpy import array, eye, dot
+  from qmllib.solvers import cho_solve
+  results = []
+  for train_idx, test_idx in groups:
+    train_idx, test_idx = list(train_idx), list(test_idx)
+    if Qrepresentation == "fchl" or Qrepresentation == "fchl18":
+      K = sym_kernel(X_train[train_idx], kernel_args = {"sigma": sigmas})
+      Ks = kernel(X_test[test_idx], X_train[train_idx], kernel_args = {"sigma": sigmas})
+    else:
+      K = [sym_kernel(X_train[train_idx], [X_atoms_train[i] for i in train_idx], sigmas[0])]
+      Ks = [kernel(X_train[train_idx], X_test[test_idx], [X_atoms_train[i] for i in train_idx], [X_atoms_test[i] for i in test_idx], sigmas[0])]
+    predictions = []
+    for s in range(len(K)):
+      alpha = cho_solve(K[s] + lambdas[s]*eye(len(train_idx)), Y_train[train_idx])
+      predictions.append(dot(Ks[s], alpha))
+    results.append((test_idx, predictions))
+  return results
+
+def local_krr(strs_train, Y_train, strs_test, Qlocal, Qrepresentation, Qkernel, krr_cutoff, sigmas, lambdas, forced = [], hyper_cache = None):
+  '''
+  Predictions of local KRR models for all test structures at once.
+  Qlocal > 0: Qlocal nearest training structures in MBTR (-sampleeach/-categorize)
+  Qlocal < 0: -Qlocal most similar training structures in FCHL18 (-similarity)
+  The training structures with indexes forced (-forcemonomers) are part of every local model.
+  Returns the same as QML.evaluate.
+  '''
+  import time
+  from numpy import array, zeros, sum, setdiff1d, arange
+  from joblib import Parallel, delayed
+  from os import environ
+  from src.QML import load_hyperparams
+  try:
+    num_cores = int(environ['SLURM_JOB_CPUS_PER_NODE'])
+  except:
+    import multiprocessing
+    num_cores = multiprocessing.cpu_count()
+
+  if (Qrepresentation == "fchl") or (Qrepresentation == "fchl18"):
+    from src.representations import generate_fchl18 as generate_representation
+  elif Qrepresentation == "fchl19":
+    from src.representations import generate_fchl19 as generate_representation
+  elif Qrepresentation == "mbdf":
+    from src.representations import generate_mbdf as generate_representation
+  else:
+    print("JKML(local KRR): Unknown representation: " + Qrepresentation)
+    exit()
+  if Qkernel == "Gaussian":
+    if Qrepresentation == "fchl" or Qrepresentation == "fchl18":
+      from qmllib.representations.fchl import get_local_symmetric_kernels as JKML_sym_kernel
+      from qmllib.representations.fchl import get_local_kernels as JKML_kernel
+    else:
+      from qmllib.kernels import get_local_symmetric_kernel as JKML_sym_kernel
+      from qmllib.kernels import get_local_kernel as JKML_kernel
+  else:
+    if Qrepresentation == "fchl" or Qrepresentation == "fchl18":
+      from qmllib.representations.fchl import laplacian_kernel_symmetric as JKML_sym_kernel
+      from qmllib.representations.fchl import laplacian_kernel as JKML_kernel
+    else:
+      raise ValueError(f"Laplace kernel is only supported with the FCHL'18 representation")
+
+  strs_train, strs_test = list(strs_train), list(strs_test)
+  Y_train = array(Y_train)
+  forced = [int(i) for i in forced]
+  candidates = setdiff1d(arange(len(strs_train)), forced)
+  n_candidates = len(candidates)
+
+  ### REPRESENTATIONS (ONCE FOR ALL LOCAL MODELS)
+  repr_wall_start = time.perf_counter()
+  repr_cpu_start = time.process_time()
+  hyperparams = load_hyperparams(hyper_cache, krr_cutoff)
+  representation_params = dict(hyperparams["representation"])
+  if Qrepresentation in ["fchl", "fchl18", "fchl19"]:
+    representation_params.setdefault("max_atoms", max([len(s) for s in strs_train + strs_test]))
+  X_train = generate_representation(strs_train, **representation_params)
+  X_test = generate_representation(strs_test, **representation_params)
+  X_atoms_train = [s.get_atomic_numbers() for s in strs_train]
+  X_atoms_test = [s.get_atomic_numbers() for s in strs_test]
+  repr_test_wall = time.perf_counter() - repr_wall_start
+  repr_test_cpu = time.process_time() - repr_cpu_start
+
+  test_wall_start = time.perf_counter()
+  test_cpu_start = time.process_time()
+  ### NEIGHBOR INDEX (ONCE FOR ALL TEST STRUCTURES)
+  if Qlocal > 0:
+    chemsyms_uniques = list(set(flatten([s.get_chemical_symbols() for s in strs_train + strs_test])))
+    mbtr = call_mbtr(chemsyms_uniques)
+    import warnings
+    warnings.filterwarnings("ignore", ".*Please use atoms.calc.*")
+    D_train = array(mbtr.create([strs_train[i] for i in candidates], n_jobs = num_cores)).reshape(n_candidates,-1)
+    D_test = array(mbtr.create(strs_test, n_jobs = num_cores)).reshape(len(strs_test),-1)
+    neighbors = candidates[nearest_by_distance(D_train, D_test, Qlocal)]
+  else:
+    if Qrepresentation == "fchl" or Qrepresentation == "fchl18":
+      F_train, F_test = X_train[candidates], X_test
+    else:
+      from src.representations import generate_fchl18
+      m = max([len(s) for s in strs_train + strs_test])
+      F_train = generate_fchl18([strs_train[i] for i in candidates], max_atoms = m, cutoff = krr_cutoff)
+      F_test = generate_fchl18(strs_test, max_atoms = m, cutoff = krr_cutoff)
+    neighbors = candidates[nearest_by_similarity(F_train, F_test, -Qlocal, {"sigma": [sigmas[0]]}, num_cores)]
+  groups = group_neighborhoods(neighbors, forced)
+  print("JKML(local KRR): "+str(len(strs_test))+" test structures share "+str(len(groups))+" local models.", flush = True)
+
+  ### LOCAL MODELS IN PARALLEL
+  n_sigmas = len(sigmas) if Qrepresentation == "fchl" or Qrepresentation == "fchl18" else 1
+  chunks = [groups[c::num_cores] for c in range(min(num_cores, len(groups)))]
+  if len(chunks) > 1:
+    results = Parallel(n_jobs = len(chunks))(delayed(solve_local_models)(chunk, X_train, X_atoms_train, Y_train, X_test, X_atoms_test, Qrepresentation, JKML_sym_kernel, JKML_kernel, sigmas, lambdas) for chunk in chunks)
+    results = flatten(results)
+  else:
+    results = solve_local_models(groups, X_train, X_atoms_train, Y_train, X_test, X_atoms_test, Qrepresentation, JKML_sym_kernel, JKML_kernel, sigmas, lambdas)
+  Y_predicted = [zeros(len(strs_test)) for s in range(n_sigmas)]
+  for test_idx, predictions in results:
+    for s in range(n_sigmas):
+      Y_predicted[s][test_idx] = predictions[s]
+  test_wall = time.perf_counter() - test_wall_start
+  test_cpu = time.process_time() - test_cpu_start
+  d_test = sum(X_test.shape[1:])
+  return Y_predicted, repr_test_wall, repr_test_cpu, test_wall, test_cpu, d_test
@@ -16,7 +16,12 @@ if Qout == 2:
 
 # Loading input pickles
 from load_pickles import load_pickles
-clusters_df = load_pickles(input_pkl,Qout,Qid)
+columns = None
+if len([i for i in input_pkl if i[-4:] == ".jkc"]) > 0:
+  from columnar import columnar_columns_needed
+  Qprocess = Qqha + len(Qtemps) + Qmodify + Qid + Qthreshold + Qreacted + Qaimnet_prep + len(files) + len(input_pkl_sp) + len(addcolumn) + int(Qarbalign > 0 or QMWarbalign > 0 or str(Quniq) != "0" or Qcomplement != 0)
+  columns = columnar_columns_needed(Pout,Qcolumn,Qsort,Qoutpkl,Qprocess)
+clusters_df = load_pickles(input_pkl,Qout,Qid,columns)
 if Qout == 2:
   print("DONE] Pickles loading done: "+str(time() - start));
 
@@ -37,7 +42,7 @@ if len(input_pkl_sp) > 0:
 #READ QC FILES
 if len(files) > 0:
   from read_files import read_files
-  clusters_df = read_files(clusters_df, files, orcaextname, orcaext, turbomoleext, Qclustername, Qforces, Qanharm, Qdisp_electronic_energy, Qdisp_forces)
+  clusters_df = read_files(clusters_df, files, orcaextname, orcaext, turbomoleext, Qclustername, Qforces, Qanharm, Qdisp_electronic_energy, Qdisp_forces, Qparallel, Qincremental, output_pkl, Qout)
   if Qout == 2:
     print("DONE] Files loaded: "+str(time() - start));
 
@@ -62,6 +67,13 @@ if Qextract > 0:
   if Qout == 2:
     print("DONE] Extraction done: "+str(time() - start));
 
+## PACK STRUCTURES ##
+if Qpack == 1:
+  from structures import pack_structures
+  clusters_df = pack_structures(clusters_df)
+  if Qout == 2:
+    print("DONE] Structures packed: "+str(time() - start));
+
 ## IN ORDER TO SAVE OUTPUT.pkl ##
 clusters_df = clusters_df.reset_index(drop=True)
 if Qoutpkl > 0:
@@ -70,6 +82,8 @@ if Qoutpkl > 0:
     print("DONE] Original copy done: "+str(time() - start));
 
 ## THERMODYNAMICS ##
+if len(Qtemps) > 0:
+  scan_clusters_df = clusters_df
 if Qqha == 1:
   from thermodynamics import thermodynamics
   clusters_df = thermodynamics(clusters_df, Qanh, Qafc, Qfc, Qt, Qdropimg, Qmakereal)
@@ -83,7 +97,20 @@ clusters_df = filter(clusters_df, Qsort, Qreverse, Qarbalign, QMWarbalign, Quniq
 ## SAVE OUTPUT.pkl ##
 if Qoutpkl > 0:
   from save_pickle import save_pickle
-  save_pickle(original_clusters_df.loc[clusters_df.index],output_pkl,Qsplit,Qout) 
+  save_pickle(original_clusters_df.loc[clusters_df.index],output_pkl,Qsplit,Qout,Qpack)
+  if Qincremental == 1 and Qsplit == 1 and len(files) > 0:
+    from read_files import save_index
+    save_index(output_pkl)
+
+## TEMPERATURE SCAN ##
+if len(Qtemps) > 0:
+  from temperature_scan import temperature_scan
+  temperature_scan(scan_clusters_df.loc[clusters_df.index],Qtemps,Qanh,Qafc,Qfc,Qdropimg,Qmakereal,Qoutpkl,input_pkl,output_pkl,Qsplit,Qclustername,Qcolumn,Qbonded,Qdistances,Pout,QUenergy,QUentropy,Qglob,Qbavg,Qformation,formation_input_file,Qp,Qconc,conc,CNTfactor,Qout)
+  if Qout == 2:
+    print("DONE] Temperature scan done: "+str(time() - start));
+  Pout = []
+  Qsolvation = "0"
+  Qformation = 0
 
 ## PREPARE DATA PRINT ##
 from numpy import array
@@ -6,6 +6,7 @@ def print_help():
   print("\nFILES:")
   print(" any .xyz .log .out files")
   print(" any .pkl (you can also use -in/-out)")
+  print(" any .jkc columnar database (loads only columns needed for printing)")
   print("\nARGUMENTS:")
   print(" -help       print this help")
   print(" -info       information about a database")
@@ -13,6 +14,9 @@ def print_help():
   print(" -out X.pkl  save data to XX.pkl (-noex = do not print example)")
   print(" -orcaext X  if ORCA has different extension than out")
   print(" -folder X   takes in all X/*.log files (use -R for resursive)")
+  print(" -par        parse QC files in parallel (all cores or SLURM_JOB_CPUS_PER_NODE; -cpu <int> to set)")
+  print(" -inc        parse only new/changed files, reuse the rest from -out X.pkl (uses X.pkl.index)")
+  print(" -pack       store structures as packed arrays (smaller/faster .pkl, readable only with JKQC)")
   print(" -noname     the file names are not analysed (e.g. 1000-10_1.xyz)")
   print(" -rename X Y renames e.g. 1X2sa to 1Y2sa")
   print(" -extract X  prints only selected clusters (e.g. 1sa1w,1sa3-4w or 1sa1w-1_0 or file.pkl)")
@@ -51,6 +55,7 @@ def print_help():
   print(" -fc [value in cm^-1] frequency cut-off for low-vibrational frequencies CITE: Grimme")
   print(" -antifc [value]      in ORCA6.0 deapply QHA and apply again. Useful for correct vib. scaling")
   print(" -temp [value in K]   recalculate for different temperature")
+  print(" -temps <list>        temperature scan, e.g. 250,270,298.15 or 200:300:10 (prints T x cluster table)")
   print(" -v,-as [value]       anharmonicity scaling factor CITE: Grimme")
   print(" -unit                converts units [Eh] -> [kcal/mol] (for entropy: [Eh/K] -> [cal/mol/K])")
   print("\nFILTERING:")
@@ -101,6 +106,9 @@ def arguments(argument_list = []):
   input_pkl_sp = []
   output_pkl = "mydatabase.pkl"
   Qforces = 0 #should I collect forces? 0/1
+  Qparallel = 0 #parse files in parallel? 0=no,-1=all available cores,N=N cores
+  Qincremental = 0 #reuse rows of unchanged files from the output pickle? 0/1
+  Qpack = 0 #store structures as packed arrays (StructureArray)? 0/1
   
   #global addcolumn,Qmodify,Qrename,QrenameWHAT,Qiamifo,Qrebasename,Qunderscore,Qchangeall,Qcomplement,QcolumnDO,Qcolumn
   addcolumn = []
@@ -136,6 +144,7 @@ def arguments(argument_list = []):
   #global Qqha,Qt,Qp,Qfc,Qanh,Qanharm
   Qqha = 0 #Run the QHA
   Qt = missing
+  Qtemps = [] #Temperature scan
   Qp = missing
   Qafc = 0 #Run antiQHA with vib. frequency cutoff
   Qfc = 0 #Run QHA with vib. frequency cutoff
@@ -221,6 +230,25 @@ def arguments(argument_list = []):
     if i == "-R":
       Qrecursive = True
       continue
+    #PARALLEL COLLECTION
+    if i == "-par" or i == "-parallel":
+      Qparallel = -1
+      continue
+    if i == "-cpu":
+      last = "-cpu"
+      continue
+    if last == "-cpu":
+      last = ""
+      Qparallel = int(i)
+      continue
+    #PACKED STRUCTURES
+    if i == "-pack":
+      Qpack = 1
+      continue
+    #INCREMENTAL COLLECTION
+    if i == "-incremental" or i == "-inc":
+      Qincremental = 1
+      continue
     #INPKL
     if i == "-in":
       last = "-in"
@@ -537,7 +565,7 @@ def arguments(argument_list = []):
         else:
           print("File "+i+" does not exist. Sorry [EXITING]")
           exit()
-      if ext == ".pkl":
+      if ext == ".pkl" or ext == ".jkc":
         if path.exists(i):
           input_pkl.append(i)
           continue
@@ -977,6 +1005,14 @@ def arguments(argument_list = []):
       last = ""
       Qt = float(i)
       continue
+    if i == "-temps" or i == "--temps":
+      last = "-temps"
+      continue
+    if last == "-temps":
+      last = ""
+      from temperature_scan import parse_temperatures
+      Qtemps = parse_temperatures(i)
+      continue
     if i == "-as" or i == "--as" or i == "-v" or i == "--v":
       Qqha = 1
       last = "-as"
@@ -1032,6 +1068,10 @@ def arguments(argument_list = []):
     print("Hey looser, the last argument is incomplete")
     exit()
 
+  if len(Qtemps) > 0 and Qsolvation != "0":
+    print("The temperature scan (-temps) cannot be combined with -solvation/-hydration. [EXITING]")
+    exit()
+
   # CHECK WHICH FILES SHOULD BE LOADED
   if len(files) == 0:
     if len(input_pkl) == 0 and len(formation_input_file) == 0:
@@ -0,0 +1,130 @@
+####################################################################################################
+# Columnar JKQC database (X.jkc folder)
+#
+# X.jkc/index.pkl     list of columns with their kind and file name
+# X.jkc/c<N>.npy      numeric columns (float/int/bool)
+# X.jkc/c<N>.pkl      scalar object columns (strings, lists of names, ...) or any other object column
+# X.jkc/c<N>_*.npy    ("xyz","structure") packed as atomic numbers, positions and per-structure offsets
+#                     (loaded directly as StructureArray, see structures.py)
+#
+# Numeric, scalar and ("info",*) columns are cheap and always loaded. Structures and per-row arrays (forces,
+# charges, frequencies, ...) are "heavy" and loaded only when some operation needs them.
+####################################################################################################
+
+COLUMNAR_VERSION = 1
+
+#PRINT FLAGS THAT NEED ONLY NUMERIC/SCALAR COLUMNS
+LIGHT_FLAGS = ["-info","-levels","-cite","-ct","-b","-nOUT","-nLOG","-nXYZ","-pOUT","-pLOG","-pXYZ","-ePKL",
+               "-elsp","-el","-elout","-elc","-elscf","-elcorr","-uc","-u","-uout","-zpec","-zpe","-zpeout",
+               "-g","-pop","-popEL","-gc","-gout","-h","-hc","-hout","-s","-level","-rot","-mult","-char",
+               "-dip","-templog","-preslog","-rsn","-t","-termination","-id1"]
+#PRINT FLAGS THAT NEED SOME HEAVY COLUMNS
+HEAVY_FLAGS = {"-xyz":[("xyz","structure")], "-movie":[("xyz","structure"),("log","electronic_energy")],
+               "-atoms":[("xyz","structure")], "-bonded":[("xyz","structure")], "-rg":[("xyz","structure")],
+               "-maxdist":[("xyz","structure")], "-distances":[("xyz","structure")],
+               "-maxdistances":[("xyz","structure")], "-mindistances":[("xyz","structure")],
+               "-errpa":[("xyz","structure")], "-radius":[("xyz","structure")], "-radius0.5":[("xyz","structure")],
+               "-mass":[("xyz","structure")], "-natoms":[("xyz","structure")], "-nel":[("xyz","structure")],
+               "-mi":[("xyz","structure")], "-ami":[("xyz","structure")], "-gif":[("xyz","structure")],
+               "-imos":[("xyz","structure"),("log","esp_charges")],
+               "-imos_xlsx":[("xyz","structure"),("log","esp_charges"),("extra","esp_charges"),("extra","chelpg")],
+               "-meanforce":[("extra","forces")], "-maxf":[("extra","forces")],
+               "-lf":[("log","vibrational_frequencies")], "-f":[("log","vibrational_frequencies")],
+               "-rots":[("log","rotational_constants")], "-mull":[("log","mulliken_charges")],
+               "-charges":[("log","mulliken_charges")], "-esp":[("log","esp_charges")],
+               "-chargesESP":[("log","esp_charges")], "-dips":[("log","dipole_moments")],
+               "-pol":[("log","polarizability")]}
+
+def columnar_columns_needed(Pout, Qcolumn, Qsort, Qoutpkl = 0, Qprocess = 0):
+  """Returns list of heavy columns required for printing or None if everything has to be loaded.
+  Qprocess = 1 if any non-printing operation (thermodynamics, filtering, modification, ...) is requested
+  """
+  if Qoutpkl > 0 or Qprocess > 0:
+    return None
+  if str(Qsort) not in ["0","no","g","gout","el","elout","b"]:
+    return None
+  needed = []
+  last = ""
+  for i in Pout:
+    if last == "-extra":
+      last = ""
+      needed.append(("extra",i))
+      continue
+    if i == "-extra":
+      last = "-extra"
+      continue
+    if i == "-column":
+      continue
+    if i in LIGHT_FLAGS:
+      continue
+    if i in HEAVY_FLAGS:
+      needed += HEAVY_FLAGS[i]
+      continue
+    return None
+  needed += [tuple(column) for column in Qcolumn]
+  return needed
+
+def is_scalar(value):
+  from numbers import Number
+  return value is None or isinstance(value, (str, Number))
+
+def save_columnar(tosave, output_jkc):
+  from os import path,makedirs,listdir,remove
+  from numpy import save
+  from pickle import dump
+  from pandas.api.types import is_numeric_dtype,is_bool_dtype
+
+  if not path.exists(output_jkc):
+    makedirs(output_jkc)
+  for oldfile in listdir(output_jkc):
+    if oldfile.endswith(".npy") or oldfile.endswith(".pkl"):
+      remove(output_jkc+"/"+oldfile)
+
+  columns = []
+  for column_i,column in enumerate(tosave.columns):
+    filename = "c"+str(column_i)
+    if is_numeric_dtype(tosave[column]) or is_bool_dtype(tosave[column]):
+      save(output_jkc+"/"+filename+".npy", tosave[column].to_numpy())
+      columns.append((column,"numeric",filename))
+      continue
+    if column == ("xyz","structure"):
+      from structures import StructureArray,pack_structures
+      packed = pack_structures(tosave[[column]])[column].array
+      if isinstance(packed, StructureArray):
+        for name,array in zip(["valid","numbers","positions","offsets"],[packed._valid,packed._numbers,packed._positions,packed._offsets]):
+          save(output_jkc+"/"+filename+"_"+name+".npy", array)
+        columns.append((column,"structure",filename))
+        continue
+    values = list(tosave[column])
+    with open(output_jkc+"/"+filename+".pkl", "wb") as f:
+      dump(values, f)
+    if all([is_scalar(value) for value in values]):
+      columns.append((column,"scalar",filename))
+    else:
+      columns.append((column,"object",filename))
+
+  with open(output_jkc+"/index.pkl", "wb") as f:
+    dump({"version":COLUMNAR_VERSION, "length":len(tosave), "columns":columns}, f)
+
+def load_columnar(input_jkc, columns = None):
+  """Loads the columnar database. columns = list of heavy columns to be loaded (None = all)"""
+  from numpy import load as npload
+  from pickle import load
+  from pandas import DataFrame,MultiIndex
+
+  with open(input_jkc+"/index.pkl", "rb") as f:
+    index = load(f)
+  data = {}
+  for column,kind,filename in index["columns"]:
+    if kind == "numeric":
+      data[column] = npload(input_jkc+"/"+filename+".npy", allow_pickle = False)
+    elif kind == "scalar" or (kind == "object" and (columns is None or column in columns or column[0] == "info")):
+      with open(input_jkc+"/"+filename+".pkl", "rb") as f:
+        data[column] = load(f)
+    elif kind == "structure" and (columns is None or column in columns):
+      from structures import StructureArray
+      data[column] = StructureArray(*[npload(input_jkc+"/"+filename+"_"+name+".npy", allow_pickle = False) for name in ["valid","numbers","positions","offsets"]])
+  clusters_df = DataFrame(data, index = range(index["length"]))
+  if len(data) > 0:
+    clusters_df.columns = MultiIndex.from_tuples(list(data.keys()))
+  return clusters_df
@@ -1,6 +1,36 @@
+####################################################################################################
+# ArbAlign duplicate removal
+#
+# The ArbAlign RMSD is (min over permutations, swaps/reflections and rotations of) the RMSD of two
+# structures centered at their centroids. As these operations keep the distances from the centroid,
+#   RMSD >= sqrt(mean((sorted r_A - sorted r_B)**2))      (r = distances of atoms from the centroid)
+# Only pairs with this lower bound below the threshold are sent to ArbAlign (for mass-weighted RMSD
+# the bound is scaled by sqrt(N*min(weight))). The result is the same as comparing all pairs.
+# Structures with different composition are never duplicates.
+####################################################################################################
+
+def radial_fingerprints(numbers, positions, offsets):
+  """sorted distances from centroid for each structure [list of arrays]"""
+  from numpy import sqrt, sort
+  fingerprints = []
+  for i in range(len(offsets)-1):
+    xyz = positions[offsets[i]:offsets[i+1]]
+    xyz = xyz - xyz.mean(axis = 0)
+    fingerprints.append(sort(sqrt((xyz**2).sum(axis = 1))))
+  return fingerprints
+
+def compare_pairs(numbers, positions, offsets, pairs, mass_weighted):
+  from ArbAlign import compare_batch
+  if mass_weighted > 0:
+    return list(compare_batch(numbers, positions, offsets, pairs, mass_weighted=1))
+  else:
+    return list(compare_batch(numbers, positions, offsets, pairs))
+
 def filter_arbalign(clusters_df,Qclustername,Qarbalign,QMWarbalign,Qout):
   from joblib import Parallel, delayed
   from os import environ
+  from numpy import array, sqrt, unique, array_split, sort
+  from structures import StructureArray
 
   missing = float("nan")
 
@@ -16,50 +46,66 @@ def filter_arbalign(clusters_df,Qclustername,Qarbalign,QMWarbalign,Qout):
     comparison_threshold = QMWarbalign
 
   if Qclustername != 0:
-    from numpy import unique
     uniqueclusters = unique(clusters_df.loc[:,("info","cluster_type")])
   else:
     uniqueclusters = "1"
 
   original_length = len(clusters_df)
-  myNaN = lambda x : missing if x == "NaN" else x
-  global preselected_df,comparepairs,allindexes
-
-  def compare_pair(arg):
-    from ArbAlign import compare
-    tobecompared = comparepairs[arg]
-    AAci = preselected_df.loc[allindexes[tobecompared[0]],("xyz","structure")]
-    AAcj = preselected_df.loc[allindexes[tobecompared[1]],("xyz","structure")]
-    if QMWarbalign > 0:
-      return compare(AAci,AAcj,mass_weighted=1)
-    else:
-      return compare(AAci,AAcj)
+  structures = clusters_df.loc[:,("xyz","structure")].array
+  if not isinstance(structures, StructureArray):
+    structures = StructureArray.from_structures(structures)
+  numbers, positions, offsets = structures._numbers, structures._positions, structures._offsets
+  fingerprints = radial_fingerprints(numbers, positions, offsets)
+  if QMWarbalign > 0:
+    from ase.data import atomic_masses
+    scale = []
+    for i in range(len(fingerprints)):
+      masses = atomic_masses[numbers[offsets[i]:offsets[i+1]]]
+      scale.append(sqrt(len(masses)*masses.min()/masses.sum()) if len(masses) > 0 else 0)
+  else:
+    scale = [1]*len(fingerprints)
+  compositions = [sort(numbers[offsets[i]:offsets[i+1]]).tobytes() for i in range(len(fingerprints))]
 
-  for i in uniqueclusters:
-     if Qclustername != 0:
-       preselected_df = clusters_df.loc[clusters_df.loc[:,("info","cluster_type")] == i]
-     else:
-       preselected_df = clusters_df
-     allindexes = preselected_df.index
-     removedindexes = []
-     for AAi in range(len(allindexes)):
-       if allindexes[AAi] in removedindexes:
-         continue
-       comparepairs = []
-       for AAj in range(AAi+1,len(allindexes)):
-         if allindexes[AAj] in removedindexes:
-           continue
-         pair = [AAi,AAj]
-         comparepairs.append(pair)
-       comparison = Parallel(n_jobs=num_cores)(delayed(compare_pair)(i) for i in range(len(comparepairs)))
-       for AAc in range(len(comparison)):
-         if comparison[AAc] < comparison_threshold:
-           removedindexes.append(allindexes[comparepairs[AAc][1]])
-     clusters_df = clusters_df.drop(removedindexes)
+  ncompared = 0
+  removedindexes = []
+  with Parallel(n_jobs=num_cores) as parallel:
+    for i in uniqueclusters:
+      if Qclustername != 0:
+        positions_i = (clusters_df.loc[:,("info","cluster_type")] == i).values.nonzero()[0]
+      else:
+        positions_i = array(range(len(clusters_df)))
+      #structures with the same composition can be duplicates
+      groups = {}
+      for position in positions_i:
+        groups.setdefault(compositions[position],[]).append(position)
+      removed = set()
+      for group in groups.values():
+        if len(group) < 2:
+          continue
+        F = array([fingerprints[position] for position in group])
+        for AAi in range(len(group)):
+          if group[AAi] in removed:
+            continue
+          lower_bounds = sqrt(((F[AAi+1:] - F[AAi])**2).mean(axis = 1))*scale[group[AAi]]
+          comparepairs = [(group[AAi],group[AAj]) for AAj in range(AAi+1,len(group)) if group[AAj] not in removed and lower_bounds[AAj-AAi-1] < comparison_threshold]
+          if len(comparepairs) == 0:
+            continue
+          ncompared += len(comparepairs)
+          if len(comparepairs) < 2*num_cores:
+            comparison = compare_pairs(numbers, positions, offsets, comparepairs, QMWarbalign)
+          else:
+            chunks = [chunk for chunk in array_split(array(comparepairs), num_cores) if len(chunk) > 0]
+            comparison = sum(parallel(delayed(compare_pairs)(numbers, positions, offsets, chunk, QMWarbalign) for chunk in chunks), [])
+          for AAc in range(len(comparison)):
+            if comparison[AAc] < comparison_threshold:
+              removed.add(comparepairs[AAc][1])
+      removedindexes += [clusters_df.index[position] for position in removed]
+  clusters_df = clusters_df.drop(removedindexes)
 
   if Qout >= 1:
     print("ArbAlign: "+str(original_length)+" --> "+str(len(clusters_df)))
+  if Qout == 2:
+    print("ArbAlign: "+str(ncompared)+" pairs compared after pre-screening")
 
   return clusters_df
 
-
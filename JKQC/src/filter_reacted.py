@@ -1,5 +1,5 @@
 def bonded(x,xA,xB, bonddistancethreshold = 2.0):
-  #Are two atoms bonded?
+  #Are two atoms bonded? (see bond_cutoffs() for the table used by filter_reacted)
   if xA == "C" and xB == "N" and x < 1.75:
     return 1
   elif xA == "N" and xB == "C" and x < 1.75:
@@ -24,6 +24,63 @@ def bonded(x,xA,xB, bonddistancethreshold = 2.0):
   else:
     return 0
 
+def bond_cutoffs(bonddistancethreshold = 2.0):
+  """table [Z1,Z2] of bond cutoffs equivalent to bonded() (atoms are bonded if distance < cutoff)"""
+  from numpy import full
+  from ase.data import atomic_numbers
+  cutoffs = full((119,119), bonddistancethreshold)
+  #the special pairs fall through to the general threshold in bonded()
+  for A,B,cutoff in [("C","N",1.75),("N","N",1.5),("S","O",1.9),("O","N",1.9)]:
+    cutoffs[atomic_numbers[A],atomic_numbers[B]] = max(cutoff, bonddistancethreshold)
+    cutoffs[atomic_numbers[B],atomic_numbers[A]] = max(cutoff, bonddistancethreshold)
+  cutoffs[atomic_numbers["H"],:] = 0
+  cutoffs[:,atomic_numbers["H"]] = 0
+  cutoffs[atomic_numbers["H"],atomic_numbers["H"]] = 0.8
+  check_bond_cutoffs(cutoffs, bonddistancethreshold)
+  return cutoffs
+
+def check_bond_cutoffs(cutoffs, bonddistancethreshold = 2.0):
+  """compares the table with bonded() just below and above every cutoff used by bonded()"""
+  from ase.data import atomic_numbers
+  elements = ["H","C","N","O","S","Cl"]
+  distances = [0.8,1.5,1.75,1.9,bonddistancethreshold]
+  distances = [d+e for d in distances for e in [-1e-6,0,1e-6]]
+  for A in elements:
+    for B in elements:
+      for x in distances:
+        if bonded(x,A,B,bonddistancethreshold) != int(x < cutoffs[atomic_numbers[A],atomic_numbers[B]]):
+          raise ValueError("Bond cutoff table differs from bonded() for "+A+"-"+B+" at "+str(x)+" A")
+
+def molecules_key(numbers, positions, cutoffs):
+  """sorted list of molecules (sorted elements of each bonded network) as string"""
+  from numpy import sort, array, dtype, nonzero
+  from scipy.sparse import coo_matrix
+  from scipy.sparse.csgraph import connected_components
+  from ase.data import chemical_symbols
+  natoms = len(numbers)
+  if natoms == 0:
+    return str(sort(array([],dtype = dtype(object))))
+  if natoms > 200:
+    from scipy.spatial import cKDTree
+    pairs = cKDTree(positions).query_pairs(cutoffs[numbers][:,numbers].max(), output_type = "ndarray")
+    i,j = pairs[:,0],pairs[:,1]
+    d = ((positions[i]-positions[j])**2).sum(axis = 1)**0.5
+  else:
+    from scipy.spatial.distance import pdist
+    from numpy import triu_indices
+    i,j = triu_indices(natoms, 1)
+    d = pdist(positions)
+  bondedpairs = nonzero(d < cutoffs[numbers[i],numbers[j]])[0]
+  graph = coo_matrix(([1]*len(bondedpairs),(i[bondedpairs],j[bondedpairs])), shape = (natoms,natoms))
+  nmolecules,labels = connected_components(graph, directed = False)
+  symbols = array(chemical_symbols)[numbers]
+  molecules = ["".join(sort(symbols[labels == molecule])) for molecule in range(nmolecules)]
+  return str(sort(array(sort(molecules),dtype = dtype(object))))
+
+def molecules_keys(valid, numbers, positions, offsets, cutoffs):
+  missing = float("nan")
+  return [molecules_key(numbers[offsets[i]:offsets[i+1]], positions[offsets[i]:offsets[i+1]], cutoffs) if valid[i] else str(missing) for i in range(len(valid))]
+
 def most_frequent(List):
   return max(set(List), key = List.count)
 
@@ -32,81 +89,48 @@ def filter_reacted(clusters_df, Qclustername = 0, Qreacted = 1, bonddistancethre
   """for removing reacting structures
   clusters_df = JKQC pandas dataframe
   """
-  from pandas import isna
-  from numpy import sort, array, unique, dtype, sqrt, sum, asarray
-  missing = float("nan")
-  
-  dt = dtype(object)
+  from numpy import unique, array, array_split, arange
+  from structures import StructureArray
+
   #Are there some cluster types which I should distinguish?
   if Qclustername != 0:
     unique_cluster_types = unique(clusters_df.loc[:,("info","cluster_type")])
     cluster_subsets = []
     for unique_cluster_type in unique_cluster_types:
-      indexes = clusters_df[clusters_df.loc[:,("info","cluster_type")]==unique_cluster_type].index.values
+      indexes = (clusters_df.loc[:,("info","cluster_type")]==unique_cluster_type).values.nonzero()[0]
       cluster_subsets.append(indexes)
   else:
-    cluster_subsets = []
-    indexes = clusters_df.index.values
-    cluster_subsets.append(indexes)   
-  
-  #Loop over all unique cluster subsets
-  dist = lambda p1, p2: sqrt(sum(((p1-p2)**2)))
-  for k0 in range(len(cluster_subsets)):
-    all_molecules = []
-    #Loop over the configuration of k0 subset
-    for k in range(len(cluster_subsets[k0])):
-      b = clusters_df.loc[cluster_subsets[k0][k],("xyz","structure")]
-      if isna(b):
-        all_molecules.append(str(missing))
-      else:
-        p = b.positions
-        symb = array(b.get_chemical_symbols())
-        ind = [i != 'test' for i in symb] 
-   
-        #distance matrix and bond matrix 
-        dm = asarray([[dist(p1, p2) for p2 in p[ind]] for p1 in p[ind]])
-        bm = array([[bonded(dm[i][j],symb[ind][i],symb[ind][j],bonddistancethreshold) for j in range(len(dm[i]))] for i in range(len(dm))])
+    cluster_subsets = [arange(len(clusters_df))]
+
+  #Bonded networks of all structures (in parallel for large databases)
+  structures = clusters_df.loc[:,("xyz","structure")].array
+  if not isinstance(structures, StructureArray):
+    structures = StructureArray.from_structures(structures)
+  cutoffs = bond_cutoffs(bonddistancethreshold)
+  if len(structures) > 1000:
+    from joblib import Parallel, delayed
+    from os import environ
+    try:
+      num_cores = int(environ['SLURM_JOB_CPUS_PER_NODE'])
+    except:
+      from multiprocessing import cpu_count
+      num_cores = cpu_count()
+    parts = [structures[chunk] for chunk in array_split(arange(len(structures)), num_cores) if len(chunk) > 0]
+    all_molecules = sum(Parallel(n_jobs = num_cores)(delayed(molecules_keys)(part._valid, part._numbers, part._positions, part._offsets, cutoffs) for part in parts), [])
+  else:
+    all_molecules = molecules_keys(structures._valid, structures._numbers, structures._positions, structures._offsets, cutoffs)
+  all_molecules = array(all_molecules, dtype = object)
 
-        test = 0
-        choosing_list = range(len(bm))
-        molecules=[]
-        if len(choosing_list) == 0:
-          test = 1
-        while test == 0:
-          selected = [choosing_list[0]]
-          test_chosen = 0
-          j = -1
-          while test_chosen == 0:
-            j += 1
-            chosen = selected[j]
-            for i in choosing_list:
-              if bm[chosen][i] == 1 and chosen != i and (not (i in selected)):
-                selected.append(i)
-            if len(selected)-1 == j:
-              test_chosen = 1
-          molecules.append("".join(sort([symb[ind][i] for i in selected])))
-          choosing_list = [i for i in choosing_list if i not in selected]
-          if len(choosing_list) == 0:
-            test = 1
-        all_molecules.append(str(sort(array(sort(molecules),dtype = dt))))
-  
-    
-    mf = most_frequent(all_molecules)
-    
+  #Loop over all unique cluster subsets
+  selected = []
+  for subset in cluster_subsets:
+    mf = most_frequent(list(all_molecules[subset]))
     if Qreacted != 2:
-      nind = [ i == mf for i in all_molecules ]
-    else:
-      nind = [ i != mf for i in all_molecules ]
-    if k0 == 0:
-      selclusters_df = clusters_df.loc[cluster_subsets[0][nind]].copy()
+      selected += list(subset[all_molecules[subset] == mf])
     else:
-      from pandas import concat
-      #selclusters_df = concat([selclusters_df, clusters_df.loc[cluster_subsets[k0][nind]].copy()], ignore_index=True)
-      selclusters_df = concat([selclusters_df, clusters_df.loc[cluster_subsets[k0][nind]].copy()])
-      #selclusters_df = selclusters_df.append(clusters_df.loc[cluster_subsets[k0][nind]].copy())
-  if Qout >= 1:
-    original_length = len(clusters_df)
-  clusters_df = selclusters_df.copy()
+      selected += list(subset[all_molecules[subset] != mf])
+  original_length = len(clusters_df)
+  clusters_df = clusters_df.iloc[selected].copy()
   if Qout >= 1:
     print("Removing reacted: "+str(original_length)+" --> "+str(len(clusters_df)))
   return clusters_df
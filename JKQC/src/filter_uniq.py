@@ -27,127 +27,128 @@ def seperate_string_number2(string):
             newword = ''
     return groups
 
-def filter_uniq(clusters_df,Quniq,Qclustername,Qsample,Qout):
-  from numpy import unique, transpose, sum, tile, floor
+def parse_uniq(Quniq):
+  """rg3,el2.4,g -> (["rg","electronic_energy","gibbs_free_energy"],[3,2.4,3])"""
+  compare_list = []
+  compare_list_num = []
+  for separated_input in seperate_string_number2(str(Quniq)):
+    if isinstance(separated_input,list):
+      if separated_input[0] == "el":
+        compare_list.append("electronic_energy")
+      elif separated_input[0] == "g":
+        compare_list.append("gibbs_free_energy")
+      elif separated_input[0] == "d" or separated_input[0] == "dip":
+        compare_list.append("dipole_moment")
+      else:
+        compare_list.append(separated_input[0])
+      compare_list_num.append(float(separated_input[1]))
+    else:
+      if separated_input == "rg":
+        compare_list.append("rg")
+        compare_list_num.append(2)
+      elif separated_input == "mass":
+        compare_list.append("mass")
+        compare_list_num.append(2)
+      elif separated_input == "el":
+        compare_list.append("electronic_energy")
+        compare_list_num.append(3)
+      elif separated_input == "g":
+        compare_list.append("gibbs_free_energy")
+        compare_list_num.append(3)
+      elif separated_input == "d" or separated_input == "dip":
+        compare_list.append("dipole_moment")
+        compare_list_num.append(1)
+      else:
+        compare_list.append(separated_input)
+        compare_list_num.append(1)
+  return compare_list, compare_list_num
+
+def uniq_descriptors(clusters_df, compare_list):
+  """matrix [Nclusters,Ndescriptors] of all compared values (evaluated once for all structures)"""
+  from numpy import array, full
+  from pandas import to_numeric
+  from structures import StructureArray
   missing = float("nan")
+  numeric = lambda column : to_numeric(clusters_df.loc[:,column], errors = "coerce").values.astype(float)
+  descriptors = []
+  structures = None
+  for j in compare_list:
+    if j == "rg" or j == "mass":
+      if structures is None:
+        structures = clusters_df.loc[:,("xyz","structure")].array
+        if not isinstance(structures, StructureArray):
+          structures = StructureArray.from_structures(structures)
+      descriptors.append(structures.rg() if j == "rg" else structures.masses())
+    elif j == "gout":
+      try:
+        descriptors.append(numeric(("log","gibbs_free_energy")) - numeric(("log","electronic_energy")) + numeric(("out","electronic_energy")))
+      except:
+        descriptors.append(full(len(clusters_df), missing))
+    else:
+      descriptors.append(numeric(("log",j)))
+  return array(descriptors).reshape(len(compare_list),len(clusters_df)).transpose()
+
+def unique_rows(descriptors, digits, scale):
+  """indexes of the first structure in each bin of size 10**-(digits+scale) (ordered as numpy.unique)"""
+  from numpy import floor, lexsort, concatenate, errstate, arange
+  with errstate(all = "ignore"):
+    keys = floor(descriptors*10.0**(digits+scale))
+  if keys.shape[0] == 0 or keys.shape[1] == 0:
+    return arange(0)
+  order = lexsort(keys.transpose()[::-1])
+  keys = keys[order]
+  return order[concatenate([[True],(keys[1:] != keys[:-1]).any(axis = 1)])]
+
+def sample_rows(descriptors, digits, Qsample):
+  """bins scaled such that the number of unique structures is (as close as possible to) Qsample"""
+  uniqueindexes = unique_rows(descriptors, digits, 0)
+  if Qsample <= 0 or len(uniqueindexes) == Qsample or (len(uniqueindexes) < Qsample and len(descriptors) < Qsample):
+    return uniqueindexes
+  #bracket the scale: count(low) <= Qsample <= count(high)
+  step = 1
+  if len(uniqueindexes) > Qsample:
+    high,high_indexes = 0,uniqueindexes
+    low,low_indexes = -step,unique_rows(descriptors, digits, -step)
+    while len(low_indexes) > Qsample and low > -30:
+      high,high_indexes = low,low_indexes
+      step *= 2
+      low,low_indexes = -step,unique_rows(descriptors, digits, -step)
+  else:
+    low,low_indexes = 0,uniqueindexes
+    high,high_indexes = step,unique_rows(descriptors, digits, step)
+    while len(high_indexes) < Qsample and high < 30:
+      low,low_indexes = high,high_indexes
+      step *= 2
+      high,high_indexes = step,unique_rows(descriptors, digits, step)
+  #bisection
+  while high - low > 10**-10 and len(low_indexes) != Qsample and len(high_indexes) != Qsample:
+    middle = (low + high)/2
+    middle_indexes = unique_rows(descriptors, digits, middle)
+    if len(middle_indexes) > Qsample:
+      high,high_indexes = middle,middle_indexes
+    else:
+      low,low_indexes = middle,middle_indexes
+  if abs(len(low_indexes) - Qsample) < abs(len(high_indexes) - Qsample):
+    return low_indexes
+  return high_indexes
+
+def filter_uniq(clusters_df,Quniq,Qclustername,Qsample,Qout):
+  from numpy import unique, array, arange, concatenate
 
   if Quniq == "dup":
     newclusters_df = clusters_df.copy()
     newclusters_df = newclusters_df.drop_duplicates(subset=[("info","file_basename")])
   else:
+    compare_list, compare_list_num = parse_uniq(Quniq)
+    descriptors = uniq_descriptors(clusters_df, compare_list)
+    digits = array(compare_list_num, dtype = float)
     if Qclustername != 0:
-      uniqueclusters = unique(clusters_df.loc[:,("info","cluster_type")].values)
+      cluster_types = clusters_df.loc[:,("info","cluster_type")].values
+      subsets = [(cluster_types == i).nonzero()[0] for i in unique(cluster_types)]
     else:
-      uniqueclusters = "1"
-    newclusters_df = []
-
-    myNaN = lambda x : missing if x == "NaN" else x
-    for i in uniqueclusters:
-       if Qclustername != 0:
-         preselected_df = clusters_df[clusters_df.loc[:,("info","cluster_type")] == i]
-       else:
-         preselected_df = clusters_df
-       separated_inputs = seperate_string_number2(str(Quniq))
-       compare_list = []
-       compare_list_num = []
-       for separated_input in separated_inputs:
-         if isinstance(separated_input,list):
-           if separated_input[0] == "rg":
-             import warnings
-             warnings.filterwarnings("ignore", category=RuntimeWarning)
-             compare_list.append("rg")
-           elif separated_input[0] == "el":
-             compare_list.append("electronic_energy")
-           elif separated_input[0] == "g":
-             compare_list.append("gibbs_free_energy")
-           elif separated_input[0] == "d" or separated_input[0] == "dip":
-             compare_list.append("dipole_moment")
-           else:
-             compare_list.append(separated_input[0])
-           compare_list_num.append(float(separated_input[1]))
-         else:
-           #compare_list.append(separated_input)
-           if separated_input == "rg":
-             import warnings
-             warnings.filterwarnings("ignore", category=RuntimeWarning)
-             compare_list.append("rg")
-             compare_list_num.append(2)
-           elif separated_input == "mass":
-             compare_list.append("mass")
-             compare_list_num.append(2)
-           elif separated_input == "el":
-             compare_list.append("electronic_energy")
-             compare_list_num.append(3)
-           elif separated_input == "g":
-             compare_list.append("gibbs_free_energy")
-             compare_list_num.append(3)
-           elif separated_input == "d" or separated_input == "dip":
-             compare_list.append("dipole_moment")
-             compare_list_num.append(1)
-           else:
-             compare_list.append(separated_input)
-             compare_list_num.append(1)
-       scale_test=1
-       scale=0
-       scale_scale = 0.1
-       scale_iter = 0
-       while scale_test == 1:
-         scale_iter = scale_iter + 1
-         tocompare = []
-         for compare_element_i in range(len(compare_list)):
-           j = compare_list[compare_element_i]
-           jj = scale+compare_list_num[compare_element_i]
-           if j == "rg":
-             rg = []
-             for aseCL in preselected_df["xyz"]["structure"]:
-               try:
-                 rg.append((sum(sum((aseCL.positions-tile(aseCL.get_center_of_mass().transpose(),(len(aseCL.positions),1)))**2,axis=-1)*aseCL.get_masses())/sum(aseCL.get_masses()))**0.5)
-               except:
-                 rg.append(missing)
-             values = [floor(myNaN(o)*10**jj) for o in rg]
-           elif j == "mass":
-             mass = []
-             for aseCL in preselected_df["xyz"]["structure"]:
-               try:
-                 mass.append(sum(aseCL.get_masses()))
-               except:
-                 mass.append(missing)
-             values = [floor(myNaN(o)*10**jj) for o in mass]
-           elif j == "gout":
-             gout = []
-             for Gouti in range(len(preselected_df)):
-               try:
-                 gout.append(preselected_df.loc[Gouti,("log","gibbs_free_energy")].values-preselected_df.loc[Gouti,("log","electronic_energy")].values+preselected_df.loc[Gouti,("out","electronic_energy")].values)
-               except:
-                 gout.append(missing)
-             values = [floor(myNaN(o)*10**jj) for o in gout]
-           else:
-             values = [floor(float(myNaN(o))*10**jj) for o in preselected_df.loc[:,("log",j)].values]
-           tocompare.append(values)
-         tocompare = transpose(tocompare)
-         uniqueindexes = unique(tocompare,axis = 0,return_index=True)[1]
-         if Qsample > 0 and len(uniqueindexes) > Qsample and scale_iter < 100:
-           if scale_scale > 0:
-             scale_scale = -0.9*scale_scale
-           else:
-             scale_scale = 1.1*scale_scale
-           scale = scale - abs(scale_scale)
-         elif Qsample > 0 and len(uniqueindexes) < Qsample and len(preselected_df) >= Qsample and scale_iter < 100:
-           if scale_scale < 0:
-             scale_scale = -0.9*scale_scale
-           else:
-             scale_scale = 1.1*scale_scale       
-           scale = scale + abs(scale_scale)
-         else:
-           scale_test = 0
-       selected_df = preselected_df.iloc[uniqueindexes]
-       if len(newclusters_df) == 0:
-         newclusters_df = selected_df
-       else:
-         from pandas import concat
-         #newclusters_df = concat([newclusters_df,selected_df.copy()], ignore_index=True)
-         newclusters_df = concat([newclusters_df,selected_df.copy()])
-         #newclusters_df = newclusters_df.append(selected_df)
+      subsets = [arange(len(clusters_df))]
+    selected = [subset[sample_rows(descriptors[subset], digits, Qsample)] for subset in subsets]
+    newclusters_df = clusters_df.iloc[concatenate(selected) if len(selected) > 0 else []]
   if Qout >= 1:
     if Qsample > 0:
       print("Sampled: "+str(len(clusters_df))+" --> "+str(len(newclusters_df)))
@@ -1,4 +1,4 @@
-def load_pickles(input_pkl,Qout,Qid):
+def load_pickles(input_pkl,Qout,Qid,columns = None):
   from pandas import DataFrame
   if len(input_pkl) == 0:
     clusters_df = DataFrame()
@@ -6,7 +6,11 @@ def load_pickles(input_pkl,Qout,Qid):
     from pandas import read_pickle
     import gc
     for i in range(len(input_pkl)):
-      newclusters_df = read_pickle(input_pkl[i])
+      if input_pkl[i][-4:] == ".jkc":
+        from columnar import load_columnar
+        newclusters_df = load_columnar(input_pkl[i],columns)
+      else:
+        newclusters_df = read_pickle(input_pkl[i])
       if not isinstance(newclusters_df, DataFrame):
         print("File "+input_pkl[i]+" is not JKQC-compatible Pandas.DataFrame. Try to use JKTS.")
         exit()
@@ -29,8 +33,8 @@ def load_pickles(input_pkl,Qout,Qid):
     if Qout >= 2:
       print("Adding id1...") 
     from functions import df_add_iter
-    from read_xyz import identify_1
-    variables = [ identify_1(ase_ID) for ase_ID in clusters_df.loc[:,("xyz","structure")] ]
+    from read_xyz import identify_1_all
+    variables = identify_1_all(clusters_df.loc[:,("xyz","structure")].values, Qout)
     clusters_df = df_add_iter(clusters_df,"xyz","id1", range(len(clusters_df)),variables) 
   if Qout >= 2:
     print("Sending back to the main file.")
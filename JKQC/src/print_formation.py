@@ -74,9 +74,10 @@ def myFunc(e):
 ##########################################################################################
 ##########################################################################################
 
-def print_formation(output, Qout=1, Qt = 298.15, Qp = 101325.0, Qconc = 0, conc = [], CNTfactor = 0, QUenergy = 1):
+def print_formation(output, Qout=1, Qt = 298.15, Qp = 101325.0, Qconc = 0, conc = [], CNTfactor = 0, QUenergy = 1, Qprint = 1):
   """print formation/binding properties
   output = np.array of output
+  Qprint = 0 only returns the formation output (e.g. for temperature scan)
   """
   from numpy import transpose,apply_along_axis,array,sum,dtype
   missing = float("nan") 
@@ -173,10 +174,12 @@ def print_formation(output, Qout=1, Qt = 298.15, Qp = 101325.0, Qconc = 0, conc
         line[1:] = missing 
     new_output.append(line)
   new_output = transpose(array(new_output))
+  if Qprint == 0:
+    return new_output
   toprint = list(zip(*new_output)) #[row for row in list(zip(*out))]
   if len(toprint) > 0:
     column_widths = [max(len(str(row[i])) for row in toprint) for i in range(len(toprint[0]))]
     for row in toprint:
       formatted_row = [str(row[i]).ljust(column_widths[i]) for i in range(len(row))]
       print(" ".join(formatted_row),flush = True)
-
+  return new_output
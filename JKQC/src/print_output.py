@@ -1,3 +1,9 @@
+def is_packed(clusters_df):
+  if ("xyz","structure") not in clusters_df.columns:
+    return False
+  from structures import StructureArray
+  return isinstance(clusters_df.loc[:,("xyz","structure")].array, StructureArray)
+
 def print_output(clusters_df, Qoutpkl, input_pkl, output_pkl, Qsplit, Qclustername, Qt, Qcolumn, Qbonded, Qdistances, Pout = [], QUenergy = 1, QUentropy = 1):
   """Print output from JKQC
   clusters_df = Pandas Dataframe
@@ -255,6 +261,9 @@ def print_output(clusters_df, Qoutpkl, input_pkl, output_pkl, Qsplit, Qclusterna
       from numpy import tile,sum
       import warnings
       warnings.filterwarnings("ignore", category=RuntimeWarning)
+      if is_packed(clusters_df):
+        output.append(list(clusters_df.loc[:,("xyz","structure")].array.rg()))
+        continue
       rg = []
       for ind in clusters_df.index:
         try:
@@ -442,6 +451,9 @@ def print_output(clusters_df, Qoutpkl, input_pkl, output_pkl, Qsplit, Qclusterna
       continue
     #MASS
     if i == "-mass":
+      if is_packed(clusters_df):
+        output.append([str(m) if m == m else missing for m in clusters_df.loc[:,("xyz","structure")].array.masses()])
+        continue
       masses = []  
       for ind in clusters_df.index:
         try:
@@ -454,6 +466,10 @@ def print_output(clusters_df, Qoutpkl, input_pkl, output_pkl, Qsplit, Qclusterna
       continue
     #Natoms
     if i == "-natoms":
+      if is_packed(clusters_df):
+        structures = clusters_df.loc[:,("xyz","structure")].array
+        output.append([str(n) if v else missing for n,v in zip(structures.natoms(),~structures.isna())])
+        continue
       natoms = []
       for ind in clusters_df.index:
         try:
@@ -463,6 +479,9 @@ def print_output(clusters_df, Qoutpkl, input_pkl, output_pkl, Qsplit, Qclusterna
       output.append(natoms)
       continue
     if i == "-nel":
+      if is_packed(clusters_df):
+        output.append([str(int(n)) if n == n else missing for n in clusters_df.loc[:,("xyz","structure")].array.nelectrons()])
+        continue
       nels = []
       for ind in clusters_df.index:
         try:
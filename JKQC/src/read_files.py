@@ -60,213 +60,329 @@ def is_nameable(input_array):
     nameable_test = False
   return nameable_test
 
-def read_files(clusters_df, files, orcaextname = "out", orcaext = "out", turbomoleext = "log", Qclustername = 1, Qforces = 0, Qanharm = 0, Qdisp_electronic_energy = 0, Qdisp_forces = 0):
+def collectDictionaries(dics):
+  #linear-time equivalent of folding mergeDictionary over all single-row dictionaries
+  missing = float("nan")
+  columns = {}
+  for dic in dics:
+    for key in dic:
+      columns[key] = None
+  clusters_dict = {key:len(dics)*[missing] for key in columns}
+  for row,dic in enumerate(reversed(dics)):
+    for key,value in dic.items():
+      clusters_dict[key][row] = value[0]
+  return clusters_dict
+
+initialized_parsers = set()
+
+def read_file(file_i, orcaextname = "out", orcaext = "out", turbomoleext = "log", Qclustername = 1, Qforces = 0, Qanharm = 0, Qdisp_electronic_energy = 0, Qdisp_forces = 0):
   from os import path
   from re import split
-  from pandas import DataFrame
   from mmap import mmap,ACCESS_READ
 
-  Q_ORCA_used = 0
-  Q_G16_used = 0
-  Q_XTB_used = 0
-  Q_ABC_CREST_used = 0
-  Q_TURBOMOLE_used = 0
-  Q_MRCC_used = 0
-
-  clusters_dict = {}
-  rem_orcaextname = orcaextname
-  for file_i in files:
-    #############################
-    ### FILE AND FOLDER NAMES ###
-    #############################
-    folder_path       = path.abspath(file_i)[::-1].split("/",1)[1][::-1]+"/"
-    file_basename     = file_i[:-4][::-1].split("/",1)[0][::-1]
-    file_i_ABC_CREST  = folder_path+file_basename+".log"
-    file_i_XTB        = folder_path+file_basename+".log"
-    file_i_engrad     = folder_path+file_basename+".engrad"
-    file_i_G16        = folder_path+file_basename+".log"
-    file_i_XYZ        = folder_path+file_basename+".xyz"
-    #ORCA && MRCC
-    file_i_MRCC       = folder_path+file_basename+".out"
-    orcaextname = rem_orcaextname
-    file_i_ORCA2 = folder_path+file_basename+"."+"bullshit"
-    if not path.exists(folder_path+file_basename+".log"):
+  #############################
+  ### FILE AND FOLDER NAMES ###
+  #############################
+  folder_path       = path.abspath(file_i)[::-1].split("/",1)[1][::-1]+"/"
+  file_basename     = file_i[:-4][::-1].split("/",1)[0][::-1]
+  file_i_ABC_CREST  = folder_path+file_basename+".log"
+  file_i_XTB        = folder_path+file_basename+".log"
+  file_i_engrad     = folder_path+file_basename+".engrad"
+  file_i_G16        = folder_path+file_basename+".log"
+  file_i_XYZ        = folder_path+file_basename+".xyz"
+  #ORCA && MRCC
+  file_i_MRCC       = folder_path+file_basename+".out"
+  file_i_ORCA2 = folder_path+file_basename+"."+"bullshit"
+  if not path.exists(folder_path+file_basename+".log"):
+    file_i_ORCA = folder_path+file_basename+"."+orcaext
+    orcaextname = "log"
+    mrccextname = "log"
+  else:
+    if orcaext == "out":
+      if not path.exists(folder_path+file_basename+"."+orcaext):
+        file_i_ORCA = folder_path+file_basename+".log"
+        orcaextname = "log"
+      else:
+        file_i_ORCA = folder_path+file_basename+"."+orcaext
+    else:
       file_i_ORCA = folder_path+file_basename+"."+orcaext
+      file_i_ORCA2 = folder_path+file_basename+"."+"out"
       orcaextname = "log"
-      mrccextname = "log"
+      orcaextname2 = "out"
+  ##
+  file_i_TURBOMOLE = folder_path+file_basename+"."+turbomoleext
+  file_i_INFO      = folder_path+"info.txt"
+
+  ###############
+  ### INFO ######
+  ###############
+  columns = ["folder_path","file_basename"]
+  if Qclustername == 1:
+    columns = columns + ["cluster_type","components","component_ratio"]
+    file_basename_split = file_basename.split("-")[0].split("_")[0]
+    split_numbers_letters = split('(\d+)',file_basename_split)[1:]
+    cluster_type_array = seperate_string_number(file_basename_split)
+    if is_nameable(cluster_type_array):
+      cluster_type_2array_sorted = sorted([cluster_type_array[i:i + 2] for i in range(0, len(cluster_type_array), 2)],key=lambda x: x[1])
+      cluster_type_array_sorted = [item for sublist in cluster_type_2array_sorted for item in sublist]
+      cluster_type = zeros(cluster_type_array_sorted)
+      components = split_numbers_letters[1::2]
+      component_ratio = [int(i) for i in split_numbers_letters[0::2]]
     else:
-      if orcaext == "out":
-        if not path.exists(folder_path+file_basename+"."+orcaext):
-          file_i_ORCA = folder_path+file_basename+".log"
-          orcaextname = "log"
-        else:
-          file_i_ORCA = folder_path+file_basename+"."+orcaext
-      else:
-        file_i_ORCA = folder_path+file_basename+"."+orcaext
-        file_i_ORCA2 = folder_path+file_basename+"."+"out"
-        orcaextname = "log"
-        orcaextname2 = "out"
-    ##
-    file_i_TURBOMOLE = folder_path+file_basename+"."+turbomoleext
-    file_i_INFO      = folder_path+"info.txt"
+      cluster_type = float("nan")
+      components = float("nan")
+      component_ratio = float("nan")
+  all_locals = locals()
+  dic = {("info",column):[all_locals.get(column)] for column in columns}
 
-    ###############
-    ### INFO ######
-    ###############
-    columns = ["folder_path","file_basename"]
-    if Qclustername == 1:
-      columns = columns + ["cluster_type","components","component_ratio"]
-      file_basename_split = file_basename.split("-")[0].split("_")[0]
-      split_numbers_letters = split('(\d+)',file_basename_split)[1:]
-      cluster_type_array = seperate_string_number(file_basename_split)
-      if is_nameable(cluster_type_array):
-        cluster_type_2array_sorted = sorted([cluster_type_array[i:i + 2] for i in range(0, len(cluster_type_array), 2)],key=lambda x: x[1])
-        cluster_type_array_sorted = [item for sublist in cluster_type_2array_sorted for item in sublist]
-        cluster_type = zeros(cluster_type_array_sorted)
-        components = split_numbers_letters[1::2]
-        component_ratio = [int(i) for i in split_numbers_letters[0::2]]
-      else:
-        cluster_type = float("nan")
-        components = float("nan")
-        component_ratio = float("nan")
-    all_locals = locals()
-    dic = {("info",column):[all_locals.get(column)] for column in columns}
-  
-    ### EXTRA INFO FILE ###
-    if path.exists(file_i_INFO):
-      file = open(file_i_INFO, "r")
-      for line in file:
-        #TODO not sure whether this still works
-        splitted_line = line.split(" ",1)
-        dic.update({("info",str(splitted_line[0])):[splitted_line[-1].strip()]})
-      file.close()    
+  ### EXTRA INFO FILE ###
+  if path.exists(file_i_INFO):
+    file = open(file_i_INFO, "r")
+    for line in file:
+      #TODO not sure whether this still works
+      splitted_line = line.split(" ",1)
+      dic.update({("info",str(splitted_line[0])):[splitted_line[-1].strip()]})
+    file.close()    
 
-    ################
-    #### XYZ #######
-    ################
-    if path.exists(file_i_XYZ):
-      from read_xyz import read_xyz,identify_1
-      out = read_xyz(file_i_XYZ)
-      dic.update({("xyz","structure"):[out]})
-      out = identify_1(out)
-      dic.update({("xyz","id1"):[out]})
+  ################
+  #### XYZ #######
+  ################
+  if path.exists(file_i_XYZ):
+    from read_xyz import read_xyz,identify_1
+    out = read_xyz(file_i_XYZ)
+    dic.update({("xyz","structure"):[out]})
+    out = identify_1(out)
+    dic.update({("xyz","id1"):[out]})
 
-    for file_test_ext in list(set(["log","out",turbomoleext,orcaext])):
-      file_test = folder_path+file_basename+"."+file_test_ext
-      if path.exists(file_test):
-        with open(file_test, "r", encoding="utf-8") as f:
-          mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+  for file_test_ext in list(set(["log","out",turbomoleext,orcaext])):
+    file_test = folder_path+file_basename+"."+file_test_ext
+    if path.exists(file_test):
+      with open(file_test, "r", encoding="utf-8") as f:
+        mm = mmap(f.fileno(), 0, access=ACCESS_READ)
 
-          ###############
-          #### G16 ######
-          ###############
-          if file_test == file_i_G16:
-            testG16 = mm.find(rb'Gaussian(R)')+1
-            if testG16 > 0:
-              if Q_G16_used == 0:
-                from read_g16 import read_g16,read_g16_init
-                read_g16_init(Qforces = Qforces, Qanharm = Qanharm)
-                Q_G16_used = 1
-              dic_g16 = read_g16(mm, Qforces = Qforces, Qanharm = Qanharm)
-              dic.update(dic_g16)
-              continue
+        ###############
+        #### G16 ######
+        ###############
+        if file_test == file_i_G16:
+          testG16 = mm.find(rb'Gaussian(R)')+1
+          if testG16 > 0:
+            from read_g16 import read_g16,read_g16_init
+            if ("G16",Qforces,Qanharm) not in initialized_parsers:
+              read_g16_init(Qforces = Qforces, Qanharm = Qanharm)
+              initialized_parsers.add(("G16",Qforces,Qanharm))
+            dic_g16 = read_g16(mm, Qforces = Qforces, Qanharm = Qanharm)
+            dic.update(dic_g16)
+            continue
 
-          ###############
-          ### ORCA ######
-          ###############
-          if file_test == file_i_ORCA:
-            testORCA = mm.find(rb'O   R   C   A')+mm.find(rb'ORCA')+mm.find(rb'SHARK')+3
-            if testORCA > 0:
-              if Q_ORCA_used == 0:
-                from read_orca import read_orca,read_orca_init
-                read_orca_init(Qforces = Qforces, Qanharm = Qanharm, Qdisp_forces = Qdisp_forces)
-                Q_ORCA_used = 1
-              dic_orca = read_orca(mm, orcaextname, Qforces = Qforces, Qanharm = Qanharm, Qdisp_electronic_energy = Qdisp_electronic_energy, Qdisp_forces = Qdisp_forces)
-              dic.update(dic_orca)
-              continue
-          ###############
-          ### ORCA ######
-          ###############
-          if file_test == file_i_ORCA2:
-            testORCA = mm.find(rb'O   R   C   A')+mm.find(rb'ORCA')+mm.find(rb'SHARK')+3
-            if testORCA > 0:
-              if Q_ORCA_used == 0:
-                from read_orca import read_orca,read_orca_init
-                read_orca_init(Qforces = Qforces, Qanharm = Qanharm, Qdisp_forces = Qdisp_forces)
-                Q_ORCA_used = 1
-              dic_orca = read_orca(mm, orcaextname2, Qforces = Qforces, Qanharm = Qanharm, Qdisp_electronic_energy = Qdisp_electronic_energy, Qdisp_forces = Qdisp_forces)
-              dic.update(dic_orca)
-              continue
+        ###############
+        ### ORCA ######
+        ###############
+        if file_test == file_i_ORCA:
+          testORCA = mm.find(rb'O   R   C   A')+mm.find(rb'ORCA')+mm.find(rb'SHARK')+3
+          if testORCA > 0:
+            from read_orca import read_orca,read_orca_init
+            if ("ORCA",Qforces,Qanharm,Qdisp_forces) not in initialized_parsers:
+              read_orca_init(Qforces = Qforces, Qanharm = Qanharm, Qdisp_forces = Qdisp_forces)
+              initialized_parsers.add(("ORCA",Qforces,Qanharm,Qdisp_forces))
+            dic_orca = read_orca(mm, orcaextname, Qforces = Qforces, Qanharm = Qanharm, Qdisp_electronic_energy = Qdisp_electronic_energy, Qdisp_forces = Qdisp_forces)
+            dic.update(dic_orca)
+            continue
+        ###############
+        ### ORCA ######
+        ###############
+        if file_test == file_i_ORCA2:
+          testORCA = mm.find(rb'O   R   C   A')+mm.find(rb'ORCA')+mm.find(rb'SHARK')+3
+          if testORCA > 0:
+            from read_orca import read_orca,read_orca_init
+            if ("ORCA",Qforces,Qanharm,Qdisp_forces) not in initialized_parsers:
+              read_orca_init(Qforces = Qforces, Qanharm = Qanharm, Qdisp_forces = Qdisp_forces)
+              initialized_parsers.add(("ORCA",Qforces,Qanharm,Qdisp_forces))
+            dic_orca = read_orca(mm, orcaextname2, Qforces = Qforces, Qanharm = Qanharm, Qdisp_electronic_energy = Qdisp_electronic_energy, Qdisp_forces = Qdisp_forces)
+            dic.update(dic_orca)
+            continue
 
-          ###############
-          ### XTB ######
-          ###############
-          if file_test == file_i_XTB:
-            testXTB = mm.find(rb'|                           x T B                           |')+1
-            if testXTB > 0:
-              if Q_XTB_used == 0:
-                from read_xtb import read_xtb,read_xtb_init
-                read_xtb_init()
-                Q_xtb_used = 1
-              dic_xtb = read_xtb(mm)
-              dic.update(dic_xtb)
-              continue
+        ###############
+        ### XTB ######
+        ###############
+        if file_test == file_i_XTB:
+          testXTB = mm.find(rb'|                           x T B                           |')+1
+          if testXTB > 0:
+            from read_xtb import read_xtb,read_xtb_init
+            if "XTB" not in initialized_parsers:
+              read_xtb_init()
+              initialized_parsers.add("XTB")
+            dic_xtb = read_xtb(mm)
+            dic.update(dic_xtb)
+            continue
  
-          ######################
-          #### ABC/CREST #######
-          ######################
-          if file_test == file_i_ABC_CREST:
-            testABC_CREST = mm.find(rb'ABC')+mm.find(rb'JXYZ')+2
-            if testABC_CREST > 0:
-              if Q_ABC_CREST_used == 0:
-                from read_abc_crest import read_abc_crest,read_abc_crest_init
-                read_abc_crest_init()
-                Q_ABC_CREST_used = 1
-              dic_abc_crest = read_abc_crest(mm)
-              dic.update(dic_abc_crest)
-              continue
-  
-          ######################
-          ####### MRCC #########
-          ######################
-          if file_test == file_i_MRCC:
-            testMRCC = mm.find(rb'MRCC program system')+1
-            if testMRCC > 0:
-              if Q_MRCC_used == 0:
-                from read_mrcc import read_mrcc,read_mrcc_init
-                read_mrcc_init()
-                Q_MRCC_used = 1
-              dic_mrcc = read_mrcc(mm)
-              dic.update(dic_mrcc)
-              continue         
-  
-    ###############
-    ### ENGRAD ####
-    ###############
-    ### This part is not needed and is turned off
-    if path.exists(file_i_engrad) and Qforces == 1:
-      from numpy import array
-      if path.exists(file_i_engrad):
-        file = open(file_i_engrad, "r")
-        for gradi in range(3):
-          file.readline()
-        out_NAtoms = int(file.readline())
-        for gradi in range(7):
-          file.readline()
-        try:
-          save_forces = []
-          for gradi in range(3*out_NAtoms):
-            save_forces.append(-float(file.readline())/0.529177)
-          out_forces = [array([save_forces[i],save_forces[i+1],save_forces[i+2]]) for i in range(0,len(save_forces),3)]
-        except:
-          out_forces = float("nan")
-        dic.update({("extra","forces"):[out_forces]})
-        file.close()
+        ######################
+        #### ABC/CREST #######
+        ######################
+        if file_test == file_i_ABC_CREST:
+          testABC_CREST = mm.find(rb'ABC')+mm.find(rb'JXYZ')+2
+          if testABC_CREST > 0:
+            from read_abc_crest import read_abc_crest,read_abc_crest_init
+            if "ABC_CREST" not in initialized_parsers:
+              read_abc_crest_init()
+              initialized_parsers.add("ABC_CREST")
+            dic_abc_crest = read_abc_crest(mm)
+            dic.update(dic_abc_crest)
+            continue
 
-    #combine into large dictionary
-    clusters_dict = mergeDictionary(clusters_dict,dic)
+        ######################
+        ####### MRCC #########
+        ######################
+        if file_test == file_i_MRCC:
+          testMRCC = mm.find(rb'MRCC program system')+1
+          if testMRCC > 0:
+            from read_mrcc import read_mrcc,read_mrcc_init
+            if "MRCC" not in initialized_parsers:
+              read_mrcc_init()
+              initialized_parsers.add("MRCC")
+            dic_mrcc = read_mrcc(mm)
+            dic.update(dic_mrcc)
+            continue         
 
+  ###############
+  ### ENGRAD ####
+  ###############
+  ### This part is not needed and is turned off
+  if path.exists(file_i_engrad) and Qforces == 1:
+    from numpy import array
+    if path.exists(file_i_engrad):
+      file = open(file_i_engrad, "r")
+      for gradi in range(3):
+        file.readline()
+      out_NAtoms = int(file.readline())
+      for gradi in range(7):
+        file.readline()
+      try:
+        save_forces = []
+        for gradi in range(3*out_NAtoms):
+          save_forces.append(-float(file.readline())/0.529177)
+        out_forces = [array([save_forces[i],save_forces[i+1],save_forces[i+2]]) for i in range(0,len(save_forces),3)]
+      except:
+        out_forces = float("nan")
+      dic.update({("extra","forces"):[out_forces]})
+      file.close()
+
+  return dic
+
+def read_files_chunk(files, orcaextname = "out", orcaext = "out", turbomoleext = "log", Qclustername = 1, Qforces = 0, Qanharm = 0, Qdisp_electronic_energy = 0, Qdisp_forces = 0):
+  return [read_file(file_i, orcaextname, orcaext, turbomoleext, Qclustername, Qforces, Qanharm, Qdisp_electronic_energy, Qdisp_forces) for file_i in files]
+
+#bump whenever the parsers change what they extract so that cached rows are re-parsed
+READ_FILES_VERSION = 1
+collected_index = None
+
+def file_signature(file_i, orcaext = "out", turbomoleext = "log"):
+  from os import path, stat
+  folder_path   = path.abspath(file_i)[::-1].split("/",1)[1][::-1]+"/"
+  file_basename = file_i[:-4][::-1].split("/",1)[0][::-1]
+  signature = []
+  for file_test in [folder_path+file_basename+"."+ext for ext in sorted(set(["log","out","xyz","engrad",orcaext,turbomoleext]))]+[folder_path+"info.txt"]:
+    if path.exists(file_test):
+      file_stat = stat(file_test)
+      signature.append((file_test,file_stat.st_size,file_stat.st_mtime_ns))
+  return (folder_path,file_basename), tuple(signature)
+
+def save_index(output_pkl):
+  from pickle import dump
+  if collected_index is None:
+    return
+  try:
+    with open(output_pkl+".index", "wb") as f:
+      dump(collected_index, f)
+  except:
+    print("Index "+output_pkl+".index was not written down due to an error.")
+
+def read_files(clusters_df, files, orcaextname = "out", orcaext = "out", turbomoleext = "log", Qclustername = 1, Qforces = 0, Qanharm = 0, Qdisp_electronic_energy = 0, Qdisp_forces = 0, Qparallel = 0, Qincremental = 0, output_pkl = "mydatabase.pkl", Qout = 1):
+  from pandas import DataFrame
+
+  ###################
+  ### INCREMENTAL ###
+  ###################
+  allfiles = files
+  if Qincremental == 1:
+    from os import path
+    from pickle import load
+    from pandas import read_pickle
+    global collected_index
+    options = (READ_FILES_VERSION,orcaextname,orcaext,turbomoleext,Qclustername,Qforces,Qanharm,Qdisp_electronic_energy,Qdisp_forces)
+    keys_signatures = [file_signature(file_i, orcaext, turbomoleext) for file_i in files]
+    collected_index = {"options":options, "files":dict(keys_signatures)}
+    cached_df = DataFrame()
+    if path.exists(output_pkl+".index") and path.exists(output_pkl):
+      try:
+        with open(output_pkl+".index", "rb") as f:
+          index = load(f)
+        if index["options"] == options:
+          if output_pkl[-4:] == ".jkc":
+            from columnar import load_columnar
+            cached_df = load_columnar(output_pkl)
+          else:
+            cached_df = read_pickle(output_pkl)
+      except:
+        cached_df = DataFrame()
+    cached = {}
+    if ("info","folder_path") in cached_df.columns and ("info","file_basename") in cached_df.columns:
+      for cached_i,key in zip(cached_df.index,zip(cached_df.loc[:,("info","folder_path")],cached_df.loc[:,("info","file_basename")])):
+        if key in index["files"]:
+          cached[key] = cached_i
+    counts = {}
+    for key,signature in keys_signatures:
+      counts[key] = counts.get(key,0) + 1
+    reuse = [key in cached and counts[key] == 1 and index["files"][key] == signature for key,signature in keys_signatures]
+    files = [file_i for file_i,reuse_i in zip(files,reuse) if not reuse_i]
+    if Qout >= 1:
+      print("Incremental collection: "+str(len(allfiles)-len(files))+" reused, "+str(len(files))+" (re)parsed")
+
+  if len(files) == 0:
+    dics = []
+  elif Qparallel == 0 or len(files) == 1:
+    dics = read_files_chunk(files, orcaextname, orcaext, turbomoleext, Qclustername, Qforces, Qanharm, Qdisp_electronic_energy, Qdisp_forces)
+  else:
+    from joblib import Parallel, delayed
+    from os import environ
+    if Qparallel > 0:
+      num_cores = Qparallel
+    else:
+      try:
+        num_cores = int(environ['SLURM_JOB_CPUS_PER_NODE'])
+      except:
+        from multiprocessing import cpu_count
+        num_cores = cpu_count()
+    #few chunks per core keep the load balanced while amortizing the pickling
+    chunksize = min(1000,-(-len(files)//(4*num_cores)))
+    chunks = [files[i:i+chunksize] for i in range(0,len(files),chunksize)]
+    results = Parallel(n_jobs=num_cores)(delayed(read_files_chunk)(chunk, orcaextname, orcaext, turbomoleext, Qclustername, Qforces, Qanharm, Qdisp_electronic_energy, Qdisp_forces) for chunk in chunks)
+    dics = [dic for result in results for dic in result]
+
+  #combine into large dictionary
+  clusters_dict = collectDictionaries(dics)
   newclusters_df = DataFrame(clusters_dict,index=range(len(clusters_df),len(clusters_df)+len(files)))
+
+  #put reused and newly parsed rows back into the order of a full collection (newest file first)
+  if Qincremental == 1 and len(files) < len(allfiles):
+    from pandas import concat
+    reused_indexes = [cached[key] for (key,signature),reuse_i in zip(keys_signatures,reuse) if reuse_i]
+    if len(files) > 0:
+      pieces_df = concat([cached_df.loc[reused_indexes],newclusters_df], ignore_index=True)
+    else:
+      pieces_df = cached_df.loc[reused_indexes].reset_index(drop=True)
+    order = []
+    n_reused = len(reused_indexes)
+    n_parsed = len(files)
+    for reuse_i in reversed(reuse):
+      if reuse_i:
+        n_reused -= 1
+        order.append(n_reused)
+      else:
+        order.append(len(reused_indexes)+len(files)-n_parsed)
+        n_parsed -= 1
+    newclusters_df = pieces_df.iloc[order]
+    newclusters_df.index = range(len(clusters_df),len(clusters_df)+len(allfiles))
+
   if len(clusters_df) > 0:
     from pandas import concat
     clusters_df = concat([clusters_df,newclusters_df.copy()], ignore_index=True)
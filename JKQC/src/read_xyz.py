@@ -1,19 +1,14 @@
 def infer_bonds(atomic_numbers, positions, scale_factor=1.2):
   """Infer bonds based on interatomic distances and covalent radii."""
-  from numpy import linalg
+  from numpy import triu_indices, asarray
+  from scipy.spatial.distance import pdist
   from ase.data import covalent_radii
-  bonds = []
-  num_atoms = len(atomic_numbers)
-  # Loop over all atom pairs
-  for i in range(num_atoms):
-      for j in range(i + 1, num_atoms):
-          dist = linalg.norm(positions[i] - positions[j])  # Interatomic distance
-          r_i = covalent_radii[atomic_numbers[i]]  # Covalent radius of atom i
-          r_j = covalent_radii[atomic_numbers[j]]  # Covalent radius of atom j
-          # If dist. is less than the sum of the covalent radii (with a scale factor)
-          if dist < scale_factor * (r_i + r_j):
-              bonds.append((i, j))  # Bond exists between atoms i and j
-  return bonds
+  atomic_numbers = asarray(atomic_numbers)
+  # All atom pairs (i < j) at once
+  i, j = triu_indices(len(atomic_numbers), 1)
+  # If dist. is less than the sum of the covalent radii (with a scale factor)
+  bonded = pdist(asarray(positions, dtype = float)) < scale_factor * (covalent_radii[atomic_numbers[i]] + covalent_radii[atomic_numbers[j]])
+  return list(zip(i[bonded].tolist(), j[bonded].tolist()))
 
 def read_xyz(file_i_XYZ):
   from ase.io import read
@@ -23,24 +18,26 @@ def read_xyz(file_i_XYZ):
     out = float("nan")
   return out 
 
-def identify_1(out):
-  from numpy import isnan
-  if type(out) == type(float(0)):
-    if isnan(out):
-      return out
-  
+#SMILES of already seen connectivities (atomic numbers + bonds)
+id1_cache = {}
+
+def connectivity_1(out):
+  """heavy-atom connectivity used by identify_1: (atomic numbers, bonds) as hashable key"""
+  atomic_numbers = out.get_atomic_numbers()
+  positions = out.get_positions()[atomic_numbers != 1]
+  atomic_numbers = atomic_numbers[atomic_numbers != 1]
+  return (tuple(atomic_numbers.tolist()), tuple(infer_bonds(atomic_numbers, positions)))
+
+def smiles_from_connectivity(connectivity):
   try:
     from rdkit import Chem
+    atomic_numbers, bonds = connectivity
     rdkit_mol = Chem.RWMol()
-    atomic_numbers = out.get_atomic_numbers()
-    positions = out.get_positions()[atomic_numbers != 1]
-    atomic_numbers = atomic_numbers[atomic_numbers != 1]
     atom_map = {}  # To store ASE atom index to RDKit atom index mapping
     for i, atomic_num in enumerate(atomic_numbers):
       idx = rdkit_mol.AddAtom(Chem.Atom(int(atomic_num)))
       atom_map[i] = idx
     # Add bonds to the RDKit molecule
-    bonds = infer_bonds(atomic_numbers, positions)
     for i, j in bonds:
       rdkit_mol.AddBond(atom_map[i], atom_map[j], Chem.BondType.SINGLE)
     rdkit_mol = rdkit_mol.GetMol()
@@ -48,6 +45,47 @@ def identify_1(out):
   except:
     return float("nan")
 
+def identify_1(out):
+  from numpy import isnan
+  if type(out) == type(float(0)):
+    if isnan(out):
+      return out
+
+  try:
+    connectivity = connectivity_1(out)
+  except:
+    return float("nan")
+  if connectivity not in id1_cache:
+    id1_cache[connectivity] = smiles_from_connectivity(connectivity)
+  return id1_cache[connectivity]
+
+def identify_1_all(structures, Qout = 1):
+  """identify_1 for many structures: the same connectivities are converted to SMILES only once
+  and the (RDKit) SMILES generation of new connectivities runs in parallel
+  """
+  connectivities = []
+  for out in structures:
+    try:
+      connectivities.append(connectivity_1(out))
+    except:
+      connectivities.append(None)
+  new = list(set([connectivity for connectivity in connectivities if connectivity is not None and connectivity not in id1_cache]))
+  if Qout >= 2:
+    print("id1: "+str(len(new))+" new connectivities for "+str(len(structures))+" structures")
+  if len(new) > 100:
+    from joblib import Parallel, delayed
+    from os import environ
+    try:
+      num_cores = int(environ['SLURM_JOB_CPUS_PER_NODE'])
+    except:
+      from multiprocessing import cpu_count
+      num_cores = cpu_count()
+    smiles = Parallel(n_jobs = num_cores, batch_size = 64)(delayed(smiles_from_connectivity)(connectivity) for connectivity in new)
+  else:
+    smiles = [smiles_from_connectivity(connectivity) for connectivity in new]
+  id1_cache.update(zip(new, smiles))
+  return [float("nan") if connectivity is None else id1_cache[connectivity] for connectivity in connectivities]
+
 def identify_2(out):
   from numpy import isnan
   if type(out) == type(float(0)):
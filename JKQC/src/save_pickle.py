@@ -1,8 +1,19 @@
-def save_pickle(tosave,output_pkl,Qsplit,Qout):
+def to_file(tosave,output_pkl):
+  if output_pkl[-4:] == ".jkc":
+    from columnar import save_columnar
+    save_columnar(tosave.reset_index(drop=True),output_pkl)
+  else:
+    tosave.to_pickle(output_pkl)
+
+def save_pickle(tosave,output_pkl,Qsplit,Qout,Qpack = 0):
   tosave = tosave.reset_index(drop=True)
+  #packed structures are kept in .pkl only if asked (-pack), other programs expect ase.Atoms
+  if Qpack == 0 and output_pkl[-4:] != ".jkc":
+    from structures import unpack_structures
+    tosave = unpack_structures(tosave)
   if Qsplit == 1:
     try:
-      tosave.to_pickle(output_pkl)
+      to_file(tosave,output_pkl)
     except:
       print("Pickle was not written down due to an error.")
     if Qout >= 1:
@@ -21,11 +32,11 @@ def save_pickle(tosave,output_pkl,Qsplit,Qout):
     else:
       lengths = -(-len(tosave)//Qsplit)
       for split in range(Qsplit):
-        output_pkl_split = output_pkl[:-4]+"_s"+str(split+1)+".pkl"
+        output_pkl_split = output_pkl[:-4]+"_s"+str(split+1)+output_pkl[-4:]
         start=split*lengths
         end=(split+1)*lengths
         if end > len(tosave):
           end = len(tosave)
-        tosave.loc[start:end].to_pickle(output_pkl_split)
+        to_file(tosave.loc[start:end],output_pkl_split)
         if Qout >= 1:
           print("Number of files in "+output_pkl_split+": "+str(len(tosave.loc[start:end])))
@@ -0,0 +1,232 @@
+####################################################################################################
+# Packed ("xyz","structure") column
+#
+# StructureArray is a pandas extension array storing all structures of a database in 4 arrays:
+#   valid     [N]    False for missing structures (NaN)
+#   numbers   [M]    atomic numbers of all atoms of all structures (uint8)
+#   positions [M,3]  positions of all atoms of all structures
+#   offsets   [N+1]  atoms of structure i are numbers[offsets[i]:offsets[i+1]]
+# It behaves as the usual column of ase.Atoms: clusters_df.loc[i,("xyz","structure")] returns
+# a (newly created) ase.Atoms object. Changing that object does NOT change the database.
+# Geometry properties (natoms, masses, rg, ...) can be evaluated for all structures at once.
+####################################################################################################
+
+from numpy import array,zeros,cumsum,concatenate,arange,repeat,bincount,sqrt,full,asarray,ndarray,integer,errstate,where
+from pandas.api.extensions import ExtensionArray,ExtensionDtype,register_extension_dtype
+from ase import Atoms
+
+@register_extension_dtype
+class StructureDtype(ExtensionDtype):
+  name = "structure"
+  type = Atoms
+  kind = "O"
+  na_value = float("nan")
+
+  @classmethod
+  def construct_array_type(cls):
+    return StructureArray
+
+def is_packable(structure):
+  """Only atomic numbers and positions are stored. Anything else (cell, pbc, calculator, extra arrays, ...) would be lost."""
+  if isinstance(structure, Atoms):
+    return not (structure.cell.any() or structure.pbc.any() or structure.calc is not None or len(structure.constraints) > 0 or len(structure.info) > 0 or set(structure.arrays.keys()) != set(["numbers","positions"]))
+  return isinstance(structure, float) and structure != structure
+
+class StructureArray(ExtensionArray):
+
+  def __init__(self, valid, numbers, positions, offsets):
+    self._valid = asarray(valid, dtype = bool)
+    self._numbers = asarray(numbers, dtype = "uint8")
+    self._positions = asarray(positions, dtype = float).reshape(-1,3)
+    self._offsets = asarray(offsets, dtype = "int64")
+
+  ### CONSTRUCTION ###
+  @classmethod
+  def from_structures(cls, structures):
+    valid = []
+    numbers = []
+    positions = []
+    for structure in structures:
+      if isinstance(structure, Atoms):
+        valid.append(True)
+        numbers.append(structure.numbers)
+        positions.append(structure.positions)
+      elif structure is None or (isinstance(structure, float) and structure != structure):
+        valid.append(False)
+      else:
+        raise TypeError("StructureArray can store only ase.Atoms or NaN, not "+str(type(structure)))
+    offsets = zeros(len(valid)+1, dtype = "int64")
+    offsets[1:][array(valid, dtype = bool)] = [len(n) for n in numbers]
+    offsets = cumsum(offsets)
+    if len(numbers) > 0:
+      return cls(valid, concatenate(numbers), concatenate(positions), offsets)
+    return cls(valid, zeros(0), zeros((0,3)), offsets)
+
+  @classmethod
+  def _from_sequence(cls, scalars, dtype = None, copy = False):
+    if isinstance(scalars, StructureArray):
+      return scalars.copy() if copy else scalars
+    return cls.from_structures(scalars)
+
+  @classmethod
+  def _from_factorized(cls, values, original):
+    return cls.from_structures(values)
+
+  @classmethod
+  def _concat_same_type(cls, to_concat):
+    to_concat = list(to_concat)
+    offsets = [array([0], dtype = "int64")]
+    shift = 0
+    for arr in to_concat:
+      offsets.append(arr._offsets[1:] + shift)
+      shift += arr._offsets[-1]
+    return cls(concatenate([arr._valid for arr in to_concat]), concatenate([arr._numbers for arr in to_concat]), concatenate([arr._positions for arr in to_concat]), concatenate(offsets))
+
+  ### ACCESS ###
+  @property
+  def dtype(self):
+    return StructureDtype()
+
+  def __len__(self):
+    return len(self._valid)
+
+  @property
+  def nbytes(self):
+    return self._valid.nbytes + self._numbers.nbytes + self._positions.nbytes + self._offsets.nbytes
+
+  def natoms(self):
+    return self._offsets[1:] - self._offsets[:-1]
+
+  def atoms(self, i):
+    if not self._valid[i]:
+      return self.dtype.na_value
+    return Atoms(numbers = self._numbers[self._offsets[i]:self._offsets[i+1]], positions = self._positions[self._offsets[i]:self._offsets[i+1]])
+
+  def __getitem__(self, item):
+    if isinstance(item, (int, integer)):
+      if item < 0:
+        item += len(self)
+      return self.atoms(item)
+    if isinstance(item, slice):
+      return self.take(arange(len(self))[item])
+    item = asarray(item)
+    if item.dtype == bool:
+      return self.take(arange(len(self))[item])
+    return self.take(item)
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self.atoms(i)
+
+  def __array__(self, dtype = None, copy = None):
+    out = ndarray(len(self), dtype = object)
+    for i in range(len(self)):
+      out[i] = self.atoms(i)
+    return out
+
+  def __setitem__(self, key, value):
+    structures = list(self)
+    if isinstance(key, (int, integer)):
+      structures[key] = value
+    else:
+      indexes = arange(len(self))[key]
+      if isinstance(value, Atoms) or not hasattr(value, "__len__"):
+        value = [value]*len(indexes)
+      for i,v in zip(indexes, value):
+        structures[i] = v
+    new = StructureArray.from_structures(structures)
+    self._valid, self._numbers, self._positions, self._offsets = new._valid, new._numbers, new._positions, new._offsets
+
+  def isna(self):
+    return ~self._valid
+
+  def copy(self):
+    return StructureArray(self._valid.copy(), self._numbers.copy(), self._positions.copy(), self._offsets.copy())
+
+  def take(self, indices, allow_fill = False, fill_value = None):
+    indices = asarray(indices, dtype = "int64")
+    if allow_fill:
+      fill = indices == -1
+      indices = indices.copy()
+      indices[fill] = 0
+    elif len(indices) > 0:
+      indices = where(indices < 0, indices + len(self), indices)
+    if len(self) == 0:
+      lengths = zeros(len(indices), dtype = "int64")
+      starts = lengths
+      valid = zeros(len(indices), dtype = bool)
+    else:
+      lengths = self.natoms()[indices]
+      starts = self._offsets[:-1][indices]
+      valid = self._valid[indices]
+    if allow_fill:
+      lengths[fill] = 0
+      valid[fill] = False
+    offsets = zeros(len(indices)+1, dtype = "int64")
+    offsets[1:] = cumsum(lengths)
+    atom_indexes = arange(offsets[-1]) + repeat(starts - offsets[:-1], lengths)
+    return StructureArray(valid, self._numbers[atom_indexes], self._positions[atom_indexes], offsets)
+
+  def __eq__(self, other):
+    if isinstance(other, StructureArray) and len(other) == len(self):
+      return array([self._valid[i] and other._valid[i] and (self._numbers[self._offsets[i]:self._offsets[i+1]].tolist() == other._numbers[other._offsets[i]:other._offsets[i+1]].tolist()) and (self._positions[self._offsets[i]:self._offsets[i+1]] == other._positions[other._offsets[i]:other._offsets[i+1]]).all() for i in range(len(self))], dtype = bool)
+    return zeros(len(self), dtype = bool)
+
+  ### VECTORIZED GEOMETRY ###
+  def atom_owners(self):
+    return repeat(arange(len(self)), self.natoms())
+
+  def atomic_masses(self):
+    from ase.data import atomic_masses
+    return atomic_masses[self._numbers]
+
+  def masses(self):
+    """total mass of each structure (NaN for missing structures)"""
+    out = bincount(self.atom_owners(), weights = self.atomic_masses(), minlength = len(self))
+    out[~self._valid] = float("nan")
+    return out
+
+  def nelectrons(self):
+    out = bincount(self.atom_owners(), weights = self._numbers, minlength = len(self))
+    out[~self._valid] = float("nan")
+    return out
+
+  def centers_of_mass(self):
+    owners = self.atom_owners()
+    m = self.atomic_masses()
+    total = bincount(owners, weights = m, minlength = len(self))
+    com = full((len(self),3), float("nan"))
+    with errstate(invalid = "ignore", divide = "ignore"):
+      for k in range(3):
+        com[:,k] = bincount(owners, weights = m*self._positions[:,k], minlength = len(self))/total
+    return com
+
+  def rg(self):
+    """mass-weighted radius of gyration of each structure [Angstrom]"""
+    owners = self.atom_owners()
+    m = self.atomic_masses()
+    d2 = ((self._positions - self.centers_of_mass()[owners])**2).sum(axis = 1)
+    with errstate(invalid = "ignore", divide = "ignore"):
+      out = sqrt(bincount(owners, weights = m*d2, minlength = len(self))/bincount(owners, weights = m, minlength = len(self)))
+    out[~self._valid] = float("nan")
+    return out
+
+def pack_structures(clusters_df):
+  """Replaces the ("xyz","structure") column of ase.Atoms by StructureArray (if nothing would be lost)."""
+  if ("xyz","structure") not in clusters_df.columns or isinstance(clusters_df[("xyz","structure")].array, StructureArray):
+    return clusters_df
+  structures = clusters_df.loc[:,("xyz","structure")].values
+  if not all([is_packable(structure) for structure in structures]):
+    print("Some structures contain more than atoms and positions (cell, calculator, ...). Not packing.")
+    return clusters_df
+  clusters_df = clusters_df.copy()
+  clusters_df[("xyz","structure")] = StructureArray.from_structures(structures)
+  return clusters_df
+
+def unpack_structures(clusters_df):
+  """Replaces StructureArray by the usual column of ase.Atoms objects."""
+  if ("xyz","structure") not in clusters_df.columns or not isinstance(clusters_df[("xyz","structure")].array, StructureArray):
+    return clusters_df
+  clusters_df = clusters_df.copy()
+  clusters_df[("xyz","structure")] = array(clusters_df[("xyz","structure")].array, dtype = object)
+  return clusters_df
@@ -0,0 +1,89 @@
+def parse_temperatures(string):
+  """ "250,270,298.15" -> [250.0,270.0,298.15] and "200:300:25" -> [200.0,225.0,250.0,275.0,300.0] """
+  from numpy import arange
+  temperatures = []
+  for part in string.split(","):
+    try:
+      if ":" in part:
+        start,end,step = [float(j) for j in part.split(":")]
+        if not step > 0 or not end >= start:
+          print("-temps "+string+": the range "+part+" needs <start> <= <end> and <step> > 0. [EXITING]")
+          exit()
+        temperatures += [float(j) for j in arange(start, end + step/2, step)]
+      else:
+        temperatures.append(float(part))
+    except ValueError:
+      print("-temps "+string+": I do not understand "+part+" (use e.g. 250,270,298.15 or 200:300:25). [EXITING]")
+      exit()
+  if len(temperatures) == 0 or not all(T > 0 for T in temperatures):
+    print("-temps "+string+": temperatures have to be positive. [EXITING]")
+    exit()
+  return temperatures
+
+def scan_table(outputs, temperatures, Pout, Qout = 1):
+  """prints temperature x cluster table for each printed property (rows = temperatures, columns = clusters)"""
+  from numpy import array
+  for l in range(1,outputs[0].shape[0]):
+    names = []
+    values = {}
+    for T,output in zip(temperatures,outputs):
+      seen = {}
+      for name,value in zip(output[0],output[l]):
+        seen[name] = seen.get(name,-1) + 1
+        if (name,seen[name]) not in values:
+          values[(name,seen[name])] = {}
+          names.append((name,seen[name]))
+        values[(name,seen[name])][T] = value
+    if Qout >= 1:
+      try:
+        print("# "+Pout[l],flush = True)
+      except:
+        print("# column "+str(l),flush = True)
+    toprint = [["T[K]"]+[name for name,_ in names]]
+    for T in temperatures:
+      toprint.append([T]+[values[name].get(T,float("nan")) for name in names])
+    column_widths = [max(len(str(row[i])) for row in toprint) for i in range(len(toprint[0]))]
+    for row in toprint:
+      formatted_row = [str(row[i]).ljust(column_widths[i]) for i in range(len(row))]
+      print(" ".join(formatted_row),flush = True)
+
+def temperature_scan(clusters_df, Qtemps, Qanh, Qafc, Qfc, Qdropimg, Qmakereal, Qoutpkl, input_pkl, output_pkl, Qsplit, Qclustername, Qcolumn, Qbonded, Qdistances, Pout, QUenergy, QUentropy, Qglob, Qbavg, Qformation, formation_input_file, Qp, Qconc, conc, CNTfactor, Qout = 1):
+  """Thermodynamics, -glob/-bavg and -formation for all temperatures in Qtemps.
+  The database is loaded (and filtered) only once and the temperature-independent part of the
+  thermodynamics (frequency modifications, packed frequencies, moments of inertia) is prepared
+  only once. Returns list of outputs (one per temperature).
+  """
+  from numpy import array
+  from math import isnan
+  from thermodynamics import prepare_thermodynamics, thermodynamics_at
+  from print_output import print_output
+  if isnan(Qp):
+    Qp = 101325
+  if len(Pout) == 0 or Pout[0] != "-ct":
+    Pout.insert(0,"-ct")
+  prepared = prepare_thermodynamics(clusters_df, Qanh, Qafc, Qfc, Qdropimg, Qmakereal)
+  outputs = []
+  for T in Qtemps:
+    clusters_df_T = thermodynamics_at(prepared, T)
+    output = array(print_output(clusters_df_T,Qoutpkl,input_pkl,output_pkl,Qsplit,Qclustername,T,Qcolumn,Qbonded,Qdistances,Pout,QUenergy,QUentropy))
+    if (Qglob == 1 or Qglob == 2) and (len(clusters_df_T)>1):
+      from take_glob import take_glob
+      output = take_glob(output, clusters_df_T, Qglob)
+    if Qbavg == 1 or Qbavg == 2:
+      from take_bavg import take_bavg
+      output = take_bavg(output, clusters_df_T, Qbavg, T, QUenergy, Pout, Qclustername)
+    if Qformation == 1:
+      if len(formation_input_file) > 0:
+        from load_txt import load_txt
+        output = load_txt(output,formation_input_file,QUentropy,QUenergy,Pout)
+      from print_formation import print_formation
+      output = print_formation(output,0,T,Qp,Qconc,conc,CNTfactor,QUenergy,Qprint = 0)
+    outputs.append(output)
+    if Qout == 2:
+      print("DONE] Temperature "+str(T)+" K done.",flush = True)
+  if Qout >= 1 and Qformation == 1:
+    print("#####################################",flush = True)
+    print("##########  FORMATION  ##############",flush = True)
+    print("#####################################",flush = True)
+  scan_table(outputs, Qtemps, Pout, Qout)
+  return outputs
@@ -1,3 +1,16 @@
+####################################################################################################
+# All vibrational frequencies are packed into one padded array [Nclusters,Nmodes] (+mask)
+# and the RRHO/quasi-harmonic corrections are evaluated for all clusters at once.
+# prepare_thermodynamics() does the temperature-independent part once (e.g. for -temps),
+# thermodynamics_at() evaluates it at one temperature.
+####################################################################################################
+
+missing = float("nan")
+h = 6.626176*10**-34 #m^2 kg s^-1
+R = 1.987 #cal/mol/K #=8.31441
+k = 1.380662*10**-23 #m^2 kg s^-2 K^-1
+c = 2.99793*10**10 #cm/s
+
 def replace_by_nonnegative(new, orig, q):
   from numpy import array
   if q == 0:
@@ -9,330 +22,372 @@ def replace_by_nonnegative(new, orig, q):
   orig[mask] = new[mask]
   return list(orig)
 
-def thermodynamics(clusters_df, Qanh, Qafc, Qfc, Qt, Qdropimg, Qmakereal):
-  from numpy import array, sum, log, exp, isnan, mean, pi
+def binned_scaling(x, scaling):
+  """scaling factor taken from 100 cm^-1 wide bins (0-4000 cm^-1) and the last one for >4000 cm^-1, otherwise 0"""
+  from numpy import array, floor, where, zeros, isnan
+  scaling = array(scaling)
+  out = zeros(x.shape)
+  inbins = (x >= 0) & (x < 4000)
+  out[inbins] = scaling[floor(x[inbins]/100).astype(int)]
+  out[x > 4000] = scaling[40]
+  return out*x
+
+B97_3c_mult = [1.00058, 0.999846, 0.935579, 0.967753, 0.964498, 0.964641, 0.948904, 0.96143, 0.962068, 0.965688, 0.972093, 0.971545, 0.971685, 0.973273, 0.971551, 0.969923, 0.968905, 0.962642, 0.974881, 0.326225, 0.325892, 0.41384, 0.441502, 0.526397, 0.687563, 0.758214, 0.803279, 0.806293, 0.844447, 0.941828, 0.961305, 0.95736, 0.955739, 0.919227, 0.947026, 0.951936, 0.950952, 0.945497, 0.951473, 0.954571, 0.954571]
+r2SCAN_mult = [0.993869, 0.929885, 0.940778, 0.962749, 0.970478, 0.967294, 0.953732, 0.964591, 0.966077, 0.973015, 0.976342, 0.972922, 0.972205, 0.974236, 0.973522, 0.97198, 0.972194, 0.970429, 0.946279, 0.450775, 0.429606, 0.533808, 0.593157, 0.657998, 0.747984, 0.78632, 0.802993, 0.852336, 0.879202, 0.947577, 0.961449, 0.954227, 0.91328, 0.925493, 0.956013, 0.953386, 0.949111, 0.951456, 0.954239, 0.956302, 0.956302]
+wB97X_3c_mult = [0.938768, 0.905829, 0.921018, 0.942186, 0.959706, 0.964414, 0.950646, 0.955143, 0.964944, 0.968226, 0.979111, 0.976256, 0.974098, 0.97433, 0.975238, 0.973679, 0.970807, 0.968801, 0.974567, 0.978848, 0.30976, 0.342098, 0.420479, 0.553954, 0.693097, 0.733632, 0.76931, 0.804974, 0.83931, 0.876033, 0.950491, 0.962892, 0.958473, 0.915792, 0.946232, 0.956013, 0.955388, 0.9524, 0.952433, 0.955203, 0.955203]
+wB97X_D_mult = B97_3c_mult
+
+#vectorized vibrational frequency scalings (x = array of frequencies)
+def anh_corrections():
+  from numpy import where
+  return {
+    "B97-3c_1":     lambda x: 0.944*x,
+    "B97-3c_2":     lambda x: where(x < 2000, 0.967*x, 0.937*x),
+    "B97-3c_sf":    lambda x: (0.969507 - 8.55527*10**-6*x + 1.99602/(-0.0447777 + x))*x,
+    "B97-3c_mult":  lambda x: binned_scaling(x, B97_3c_mult),
+    "r2SCAN-3c_1":  lambda x: 0.950*x,
+    "r2SCAN_2":     lambda x: where(x < 2000, 0.969*x, 0.944*x),
+    "r2SCAN_sf":    lambda x: (1.0211 - 1.59745*10**-5*x - 102.482/(1517.15 + x))*x,
+    "r2SCAN_mult":  lambda x: binned_scaling(x, r2SCAN_mult),
+    "wB97X-3c_1":   lambda x: 0.954*x,
+    "wB97X-3c_2":   lambda x: where(x < 2000, 0.971*x, 0.949*x),
+    "wB97X-3c_sf":  lambda x: (1.07555 - 2.42816*10**-5*x - 188.46/(1179.03 + x))*x,
+    "wB97X-3c_mult":lambda x: binned_scaling(x, wB97X_3c_mult),
+    "wB97X-D_1":    lambda x: 0.950*x,
+    "wB97X-D_2":    lambda x: where(x < 2000, 0.967*x, 0.945*x),
+    "wB97X-D_sf":   lambda x: (0.961752 - 3.89697*10**-6*x + 2.814/(5.5432 + x))*x,
+    "wB97X-D_mult": lambda x: binned_scaling(x, wB97X_D_mult),
+  }
+
+#names accepted as "special" scalings by -as/-v (the others are treated as a float factor)
+ANH_NAMES = {"anh","anh2","B97-3c_1","B97-3c_2","B97-3c_sf","B97-3c_mult","r2SCAN-3c_1","r2SCAN-3c_2","r2SCAN-3c_sf","r2SCAN-3c_mult","wb97-3c_1","wb97-3c_2","wb97-3c_sf","wb97-3c_mult","wB97X-D_1", "wB97X-D_2","wB97X-D_sf","wB97X-D_mult"}
+
+####################################################################################################
+
+def pack_frequencies(vibs):
+  """padded array of frequencies [N,maxmodes] (NaN padded) and mask of the real modes"""
+  from numpy import full, zeros
+  lengths = []
+  for vib in vibs:
+    try:
+      lengths.append(len(vib))
+    except:
+      lengths.append(0)
+  F = full((len(vibs), max(lengths+[1])), missing)
+  mask = zeros(F.shape, dtype = bool)
+  for i,vib in enumerate(vibs):
+    if lengths[i] > 0:
+      try:
+        F[i,:lengths[i]] = vib
+        mask[i,:lengths[i]] = True
+      except:
+        F[i,:lengths[i]] = missing
+        mask[i,:lengths[i]] = True
+  return F, mask
+
+def first_frequency(vibs):
+  """the first (= lowest) frequency or 0 if not available"""
+  from numpy import array
+  lf = []
+  for vib in vibs:
+    try:
+      lf.append(float(vib[0]))
+    except:
+      lf.append(0)
+  return array(lf)
+
+def vibrational_entropy(F, mask, T):
+  """sum over modes of the harmonic vibrational entropy [cal/mol/K]; T = array [N]"""
+  from numpy import exp, log, where, errstate
+  T = T[:,None]
+  with errstate(all = "ignore"):
+    Sv = R*h*F*c/k/T/(exp(h*F*c/k/T)-1)-R*log(1-exp(-h*F*c/k/T))
+  return where(mask, Sv, 0).sum(axis = 1)
+
+def vibrational_energy(F, mask, T):
+  """sum over modes of the harmonic vibrational energy incl. ZPE [cal/mol]; T = array [N]"""
+  from numpy import exp, where, errstate
+  T = T[:,None]
+  with errstate(all = "ignore"):
+    Ev = R*h*F*c/k/(exp(h*F*c/k/T)-1)+R*h*F*c/k*0.5
+  return where(mask, Ev, 0).sum(axis = 1)
+
+def qha_entropy_correction(F, mask, T, mi, fc):
+  """Grimme's quasi-RRHO correction to entropy: sum(w*Sv+(1-w)*Sr) - sum(Sv) [cal/mol/K]"""
+  from numpy import exp, log, pi, where, errstate
+  T = T[:,None]
+  mi = mi[:,None]
+  with errstate(all = "ignore"):
+    mu = h/(8*pi**2*c*F)
+    Sr = R*(0.5+log((8*pi**2.99793*(mu*mi/(mu+mi))*k*T/h**2)**0.5))
+    Sv = R*h*F*c/k/T/(exp(h*F*c/k/T)-1)-R*log(1-exp(-h*F*c/k/T))
+    w = 1/(1+(fc/F)**4)
+    corr = w*Sv+(1-w)*Sr - Sv
+  return where(mask, corr, 0).sum(axis = 1)
+
+def propagate_temperature(Qt, temperatures, eligible):
+  """If Qt is not given, the temperature of the first eligible cluster is used for all following clusters."""
+  from numpy import full, isnan
+  T = full(len(temperatures), Qt, dtype = float)
+  if isnan(Qt):
+    for i in range(len(temperatures)):
+      if eligible[i]:
+        Qt = temperatures[i]
+        T[i] = Qt
+        if not isnan(Qt):
+          T[i+1:] = Qt
+          break
+  return T, Qt
+
+def mean_moments_of_inertia(structures, rows):
+  from numpy import full, mean
+  mi = full(len(structures), missing)
+  for i in rows:
+    try:
+      mi[i] = mean(structures[i].get_moments_of_inertia())
+    except:
+      mi[i] = missing
+  return mi
+
+def get_column(clusters_df, column, default = missing):
+  from numpy import full
+  from pandas import to_numeric
+  if ("log",column) in clusters_df.columns:
+    return to_numeric(clusters_df.loc[:,("log",column)], errors = "coerce").values.astype(float)
+  return full(len(clusters_df), default)
+
+####################################################################################################
+
+def prepare_thermodynamics(clusters_df, Qanh, Qafc, Qfc, Qdropimg, Qmakereal):
+  """Temperature-independent part of thermodynamics(): frequency modifications (-dropimg, -makereal,
+  -as/-v at the temperature of the log), packed frequencies, harmonic terms at the original temperature
+  and moments of inertia. thermodynamics_at() evaluates the result for any temperature.
+  """
+  from numpy import array, where, errstate, empty
   from pandas import isna
-  missing = float("nan")
 
-  h = 6.626176*10**-34 #m^2 kg s^-1
-  R = 1.987 #cal/mol/K #=8.31441
-  k = 1.380662*10**-23 #m^2 kg s^-2 K^-1
+  N = len(clusters_df)
+  if ("log","vibrational_frequencies") in clusters_df.columns:
+    vibs = list(clusters_df.loc[:,("log","vibrational_frequencies")].values)
+  else:
+    vibs = [missing]*N
+  if ("xyz","structure") in clusters_df.columns:
+    structures = clusters_df.loc[:,("xyz","structure")].values
+  else:
+    structures = [missing]*N
+  p = {"N":N, "has_temperature":("log","temperature") in clusters_df.columns, "zpe_columns_changed":False, "Qafc":Qafc, "Qfc":Qfc}
+  temperature = get_column(clusters_df, "temperature", 298.15)
+  entropy = get_column(clusters_df, "entropy")
+  enthalpy_energy = get_column(clusters_df, "enthalpy_energy")
+  enthalpy_thermal_correction = get_column(clusters_df, "enthalpy_thermal_correction")
+  internal_energy = get_column(clusters_df, "internal_energy")
+  energy_thermal_correction = get_column(clusters_df, "energy_thermal_correction")
+  electronic_energy = get_column(clusters_df, "electronic_energy")
 
   if Qdropimg != 0:
-    for i in range(len(clusters_df)):
-      vib = clusters_df.at[i,("log","vibrational_frequencies")]
-      if type(vib) == type(missing):
-        continue
-      clusters_df.at[i,("log","vibrational_frequencies")] = [item for item in vib if item >= 0]
+    vibs = [vib if type(vib) == type(missing) else [item for item in vib if item >= 0] for vib in vibs]
 
   if Qmakereal != 0:
-    for i in range(len(clusters_df)):
-      vib = clusters_df.at[i,("log","vibrational_frequencies")]
-      if type(vib) == type(missing):
-        continue
-      clusters_df.at[i,("log","vibrational_frequencies")] = [abs(item) for item in vib]
+    vibs = [vib if type(vib) == type(missing) else [abs(item) for item in vib] for vib in vibs]
 
   ########################################################
   # LOW VIBRATIONAL FREQUNECY ANTITREATMENT (S // G,Gc) ##
   ########################################################
   if Qafc > 0:
-    for i in range(len(clusters_df)):
-      try:
-        lf = float(clusters_df.at[i,("log","vibrational_frequencies")][0])
-      except:
-        lf = 0
-      if lf <= 0:
-        clusters_df.at[i,("log","entropy")] = missing
-        continue
-      if isnan(Qt):
-        try:
-          Qt = clusters_df.at[i,("log","temperature")]
-        except:
-          Qt = 298.15
-      vibs = clusters_df.at[i,("log","vibrational_frequencies")]
-      structure = clusters_df.at[i,("xyz","structure")]
+    lf = first_frequency(vibs)
+    eligible = ~(lf <= 0)
+    entropy[~eligible] = missing
+    F, mask = pack_frequencies(vibs)
+    p["afc"] = (eligible, F, mask, mean_moments_of_inertia(structures, eligible.nonzero()[0]))
 
-      mu = [float(h/(8*pi**2*2.99793*10**10*vib)) for vib in vibs]
-      try:
-        mi = mean(structure.get_moments_of_inertia())
-        Sr = [R*(0.5+log((8*pi**2.99793*(mu[j]*mi/(mu[j]+mi))*k*Qt/h**2)**0.5)) for j in range(len(mu))]  #cal/mol/K
-        Sv = [R*h*vib*2.99793*10**10/k/Qt/(exp(h*vib*2.99793*10**10/k/Qt)-1)-R*log(1-exp(-h*vib*2.99793*10**10/k/Qt)) for vib in vibs] #cal/mol/K
-        w = [1/(1+(Qafc/vib)**4) for vib in vibs]
-        Sv_corr = sum([w[j]*Sv[j]+(1-w[j])*Sr[j] for j in range(len(w))])
-        Sv_each = sum(Sv)  #cal/mol/K
-        clusters_df.at[i,("log","entropy")] = clusters_df.at[i,("log","entropy")]-(Sv_corr-Sv_each)
-      except:
-        mi = missing
-        clusters_df.at[i,("log","entropy")] = missing
-    ###
- 
   #########################
   ## VIBRATIONAL SCALING ##
   #########################
   if Qanh != "1":
     # VIBRATIONAL FREQ MODIFICATION e.g. anharmonicity (vib.freq.,ZPE,ZPEc,U,Uc,H,Hc,S // G,Gc)
-    for i in range(len(clusters_df)):
+    natoms = []
+    for structure in structures:
       try:
-        structure = clusters_df.at[i,("xyz","structure")]
-        if isna(structure): 
+        if isna(structure):
           print("Structure is missing.")
-        test = len(structure.get_atomic_numbers())
+        natoms.append(len(structure.get_atomic_numbers()))
       except:
-        test = 0
-        lf = 0
-      if test != 1:
-        if test != 0:
-          try:
-            QtOLD = clusters_df.at[i,("log","temperature")]
-          except:
-            QtOLD = 298.15
-          try:
-            lf = float(clusters_df.at[i,("log","vibrational_frequencies")][0])
-          except:
-            lf = 0
-          try: 
-            if isna(clusters_df.at[i,("log","vibrational_frequencies")]).any():
-              lf = 0
-          except:
-            lf = 0
-        if lf <= 0:
-          clusters_df.at[i,("log","entropy")] = missing
-          clusters_df.at[i,("log","enthalpy_energy")] = missing
-          clusters_df.at[i,("log","enthalpy_thermal_correction")] = missing
-          clusters_df.at[i,("log","internal_energy")] = missing
-          clusters_df.at[i,("log","energy_thermal_correction")] = missing
-          clusters_df.at[i,("log","zero_point_correction")] = missing
-          clusters_df.at[i,("log","zero_point_energy")] = missing
-          continue
-        try:
-          Sv_OLD = sum([R*h*vib*2.99793*10**10/k/QtOLD/(exp(h*vib*2.99793*10**10/k/QtOLD)-1)-R*log(1-exp(-h*vib*2.99793*10**10/k/QtOLD)) for vib in clusters_df.at[i,("log","vibrational_frequencies")]]) #cal/mol/K
-          Ev_OLD = sum([R*h*vib*2.99793*10**10/k/(exp(h*vib*2.99793*10**10/k/QtOLD)-1)+R*h*vib*2.99793*10**10/k*0.5 for vib in clusters_df.at[i,("log","vibrational_frequencies")]])
-        except:
-          Sv_OLD = missing
-          Ev_OLD = missing
-        #
-        if str(Qanh) not in {"anh","anh2","B97-3c_1","B97-3c_2","B97-3c_sf","B97-3c_mult","r2SCAN-3c_1","r2SCAN-3c_2","r2SCAN-3c_sf","r2SCAN-3c_mult","wb97-3c_1","wb97-3c_2","wb97-3c_sf","wb97-3c_mult","wB97X-D_1", "wB97X-D_2","wB97X-D_sf","wB97X-D_mult"}:
-          try:
-            clusters_df.at[i,("log","vibrational_frequencies")] = [float(Qanh) * j for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-          except:
-            clusters_df.at[i,("log","vibrational_frequencies")] = [missing]
-        else:
-          try:
-            if Qanh == "anh":
-              clusters_df.at[i,("log","vibrational_frequencies")] = replace_by_nonnegative(clusters_df.at[i,("extra","anharm")],clusters_df.at[i,("log","vibrational_frequencies")],0)
-            ########################################################
-            elif Qanh == "B97-3c_1":
-              def anh_corr(x):
-                return 0.944*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "B97-3c_2":
-              def anh_corr(x):
-                if x < 2000:
-                  return 0.967*x
-                else:
-                  return 0.937*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "B97-3c_sf":
-              def anh_corr(x):
-                return (0.969507 - 8.55527*10**-6*x + 1.99602/(-0.0447777 + x))*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "B97-3c_mult":
-              from numpy import piecewise
-              def anh_corr(x):
-                scaling = [1.00058, 0.999846, 0.935579, 0.967753, 0.964498, 0.964641, 0.948904, 0.96143, 0.962068, 0.965688, 0.972093, 0.971545, 0.971685, 0.973273, 0.971551, 0.969923, 0.968905, 0.962642, 0.974881, 0.326225, 0.325892, 0.41384, 0.441502, 0.526397, 0.687563, 0.758214, 0.803279, 0.806293, 0.844447, 0.941828, 0.961305, 0.95736, 0.955739, 0.919227, 0.947026, 0.951936, 0.950952, 0.945497, 0.951473, 0.954571, 0.954571]
-                return piecewise(x,[(x>=0)&(x<100), (x>=100)&(x<200), (x>=200)&(x<300), (x>=300)&(x<400), (x>=400)&(x<500), (x>=500)&(x<600), (x>=600)&(x<700), (x>=700)&(x<800), (x>=800)&(x<900), (x>=900)&(x<1000), (x>=1000)&(x<1100), (x>=1100)&(x<1200), (x>=1200)&(x<1300), (x>=1300)&(x<1400), (x>=1400)&(x<1500), (x>=1500)&(x<1600), (x>=1600)&(x<1700), (x>=1700)&(x<1800), (x>=1800)&(x<1900), (x>=1900)&(x<2000), (x>=2000)&(x<2100), (x>=2100)&(x<2200), (x>=2200)&(x<2300), (x>=2300)&(x<2400), (x>=2400)&(x<2500), (x>=2500)&(x<2600), (x>=2600)&(x<2700), (x>=2700)&(x<2800), (x>=2800)&(x<2900), (x>=2900)&(x<3000), (x>=3000)&(x<3100), (x>=3100)&(x<3200), (x>=3200)&(x<3300), (x>=3300)&(x<3400), (x>=3400)&(x<3500), (x>=3500)&(x<3600), (x>=3600)&(x<3700), (x>=3700)&(x<3800), (x>=3800)&(x<3900), (x>=3900)&(x<4000),x>4000],scaling)*x
-               
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            ########################################################
-            elif Qanh == "r2SCAN-3c_1":
-              def anh_corr(x):
-                return 0.950*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "r2SCAN_2":
-              def anh_corr(x):
-                if x < 2000:
-                  return 0.969*x
-                else:
-                  return 0.944*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "r2SCAN_sf":
-              def anh_corr(x):
-                return (1.0211 - 1.59745*10**-5*x - 102.482/(1517.15 + x))*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "r2SCAN_mult":
-              from numpy import piecewise
-              def anh_corr(x):
-                scaling = [0.993869, 0.929885, 0.940778, 0.962749, 0.970478, 0.967294, 0.953732, 0.964591, 0.966077, 0.973015, 0.976342, 0.972922, 0.972205, 0.974236, 0.973522, 0.97198, 0.972194, 0.970429, 0.946279, 0.450775, 0.429606, 0.533808, 0.593157, 0.657998, 0.747984, 0.78632, 0.802993, 0.852336, 0.879202, 0.947577, 0.961449, 0.954227, 0.91328, 0.925493, 0.956013, 0.953386, 0.949111, 0.951456, 0.954239, 0.956302, 0.956302]
-                return piecewise(x,[(x>=0)&(x<100), (x>=100)&(x<200), (x>=200)&(x<300), (x>=300)&(x<400), (x>=400)&(x<500), (x>=500)&(x<600), (x>=600)&(x<700), (x>=700)&(x<800), (x>=800)&(x<900), (x>=900)&(x<1000), (x>=1000)&(x<1100), (x>=1100)&(x<1200), (x>=1200)&(x<1300), (x>=1300)&(x<1400), (x>=1400)&(x<1500), (x>=1500)&(x<1600), (x>=1600)&(x<1700), (x>=1700)&(x<1800), (x>=1800)&(x<1900), (x>=1900)&(x<2000), (x>=2000)&(x<2100), (x>=2100)&(x<2200), (x>=2200)&(x<2300), (x>=2300)&(x<2400), (x>=2400)&(x<2500), (x>=2500)&(x<2600), (x>=2600)&(x<2700), (x>=2700)&(x<2800), (x>=2800)&(x<2900), (x>=2900)&(x<3000), (x>=3000)&(x<3100), (x>=3100)&(x<3200), (x>=3200)&(x<3300), (x>=3300)&(x<3400), (x>=3400)&(x<3500), (x>=3500)&(x<3600), (x>=3600)&(x<3700), (x>=3700)&(x<3800), (x>=3800)&(x<3900), (x>=3900)&(x<4000),x>4000],scaling)*x
-
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            ########################################################
-            elif Qanh == "wB97X-3c_1":
-              def anh_corr(x):
-                return 0.954*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "wB97X-3c_2":
-              def anh_corr(x):
-                if x < 2000:
-                  return 0.971*x
-                else:
-                  return 0.949*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "wB97X-3c_sf":
-              def anh_corr(x):
-                return (1.07555 - 2.42816*10**-5*x - 188.46/(1179.03 + x))*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "wB97X-3c_mult":
-              from numpy import piecewise
-              def anh_corr(x):
-                scaling = [0.938768, 0.905829, 0.921018, 0.942186, 0.959706, 0.964414, 0.950646, 0.955143, 0.964944, 0.968226, 0.979111, 0.976256, 0.974098, 0.97433, 0.975238, 0.973679, 0.970807, 0.968801, 0.974567, 0.978848, 0.30976, 0.342098, 0.420479, 0.553954, 0.693097, 0.733632, 0.76931, 0.804974, 0.83931, 0.876033, 0.950491, 0.962892, 0.958473, 0.915792, 0.946232, 0.956013, 0.955388, 0.9524, 0.952433, 0.955203, 0.955203]
-                return piecewise(x,[(x>=0)&(x<100), (x>=100)&(x<200), (x>=200)&(x<300), (x>=300)&(x<400), (x>=400)&(x<500), (x>=500)&(x<600), (x>=600)&(x<700), (x>=700)&(x<800), (x>=800)&(x<900), (x>=900)&(x<1000), (x>=1000)&(x<1100), (x>=1100)&(x<1200), (x>=1200)&(x<1300), (x>=1300)&(x<1400), (x>=1400)&(x<1500), (x>=1500)&(x<1600), (x>=1600)&(x<1700), (x>=1700)&(x<1800), (x>=1800)&(x<1900), (x>=1900)&(x<2000), (x>=2000)&(x<2100), (x>=2100)&(x<2200), (x>=2200)&(x<2300), (x>=2300)&(x<2400), (x>=2400)&(x<2500), (x>=2500)&(x<2600), (x>=2600)&(x<2700), (x>=2700)&(x<2800), (x>=2800)&(x<2900), (x>=2900)&(x<3000), (x>=3000)&(x<3100), (x>=3100)&(x<3200), (x>=3200)&(x<3300), (x>=3300)&(x<3400), (x>=3400)&(x<3500), (x>=3500)&(x<3600), (x>=3600)&(x<3700), (x>=3700)&(x<3800), (x>=3800)&(x<3900), (x>=3900)&(x<4000),x>4000],scaling)*x
-
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            ########################################################
-            elif Qanh == "wB97X-D_1":
-              def anh_corr(x):
-                return 0.950*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "wB97X-D_2":
-              def anh_corr(x):
-                if x < 2000:
-                  return 0.967*x
-                else:
-                  return 0.945*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "wB97X-D_sf":
-              def anh_corr(x):
-                return (0.961752 - 3.89697*10**-6*x + 2.814/(5.5432 + x))*x
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            elif Qanh == "wB97X-D_mult":
-              from numpy import piecewise
-              def anh_corr(x):
-                scaling = [1.00058, 0.999846, 0.935579, 0.967753, 0.964498, 0.964641, 0.948904, 0.96143, 0.962068, 0.965688, 0.972093, 0.971545, 0.971685, 0.973273, 0.971551, 0.969923, 0.968905, 0.962642, 0.974881, 0.326225, 0.325892, 0.41384, 0.441502, 0.526397, 0.687563, 0.758214, 0.803279, 0.806293, 0.844447, 0.941828, 0.961305, 0.95736, 0.955739, 0.919227, 0.947026, 0.951936, 0.950952, 0.945497, 0.951473, 0.954571, 0.954571]
-                return piecewise(x,[(x>=0)&(x<100), (x>=100)&(x<200), (x>=200)&(x<300), (x>=300)&(x<400), (x>=400)&(x<500), (x>=500)&(x<600), (x>=600)&(x<700), (x>=700)&(x<800), (x>=800)&(x<900), (x>=900)&(x<1000), (x>=1000)&(x<1100), (x>=1100)&(x<1200), (x>=1200)&(x<1300), (x>=1300)&(x<1400), (x>=1400)&(x<1500), (x>=1500)&(x<1600), (x>=1600)&(x<1700), (x>=1700)&(x<1800), (x>=1800)&(x<1900), (x>=1900)&(x<2000), (x>=2000)&(x<2100), (x>=2100)&(x<2200), (x>=2200)&(x<2300), (x>=2300)&(x<2400), (x>=2400)&(x<2500), (x>=2500)&(x<2600), (x>=2600)&(x<2700), (x>=2700)&(x<2800), (x>=2800)&(x<2900), (x>=2900)&(x<3000), (x>=3000)&(x<3100), (x>=3100)&(x<3200), (x>=3200)&(x<3300), (x>=3300)&(x<3400), (x>=3400)&(x<3500), (x>=3500)&(x<3600), (x>=3600)&(x<3700), (x>=3700)&(x<3800), (x>=3800)&(x<3900), (x>=3900)&(x<4000),x>4000],scaling)*x
-
-              clusters_df.at[i,("log","vibrational_frequencies")] = [anh_corr(float(j)) for j in clusters_df.at[i,("log","vibrational_frequencies")]]
-            ########################################################
-            else:
-              clusters_df.at[i,("log","vibrational_frequencies")] = replace_by_nonnegative(clusters_df.at[i,("extra","anharm")],clusters_df.at[i,("log","vibrational_frequencies")],1)
-          except:
-            clusters_df.at[i,("log","vibrational_frequencies")] = [missing]
-        #
+        natoms.append(0)
+    natoms = array(natoms)
+    lf = first_frequency(vibs)
+    for i in range(N):
+      try:
+        if isna(vibs[i]).any():
+          lf[i] = 0
+      except:
+        lf[i] = 0
+    lf[natoms == 0] = 0
+    touched = natoms != 1
+    eligible = touched & ~(lf <= 0)
+    dropped = touched & ~eligible
+    zero_point_correction = get_column(clusters_df, "zero_point_correction")
+    zero_point_energy = get_column(clusters_df, "zero_point_energy")
+    p["zpe_columns_changed"] = True
+    for column in [entropy,enthalpy_energy,enthalpy_thermal_correction,internal_energy,energy_thermal_correction,zero_point_correction,zero_point_energy]:
+      column[dropped] = missing
+    QtOLD = temperature
+    F, mask = pack_frequencies(vibs)
+    Sv_OLD = vibrational_entropy(F, mask, QtOLD)
+    Ev_OLD = vibrational_energy(F, mask, QtOLD)
+    #
+    rows = eligible.nonzero()[0]
+    corrections = anh_corrections()
+    if str(Qanh) not in ANH_NAMES:
+      try:
+        F = float(Qanh) * F
+      except:
+        F[rows] = missing
+        mask[rows] = False
+        mask[rows,0] = True
+    elif Qanh in corrections:
+      with errstate(all = "ignore"):
+        F = where(mask, corrections[Qanh](F), missing)
+    else:
+      for i in rows:
         try:
-          Sv = sum([R*h*vib*2.99793*10**10/k/QtOLD/(exp(h*vib*2.99793*10**10/k/QtOLD)-1)-R*log(1-exp(-h*vib*2.99793*10**10/k/QtOLD)) for vib in clusters_df.at[i,("log","vibrational_frequencies")]]) #cal/mol/K  
-          Ev = sum([R*h*vib*2.99793*10**10/k/(exp(h*vib*2.99793*10**10/k/QtOLD)-1)+R*h*vib*2.99793*10**10/k*0.5 for vib in clusters_df.at[i,("log","vibrational_frequencies")]])
+          if Qanh == "anh":
+            new = replace_by_nonnegative(clusters_df.iloc[i][("extra","anharm")],vibs[i],0)
+          else:
+            new = replace_by_nonnegative(clusters_df.iloc[i][("extra","anharm")],vibs[i],1)
         except:
-          Sv = missing
-          Ev = missing
-        ###
-        clusters_df.at[i,("log","zero_point_correction")] = sum([0.5*h*vib*2.99793*10**10 for vib in clusters_df.at[i,("log","vibrational_frequencies")]])*0.00038088*6.022*10**23/1000
-        clusters_df.at[i,("log","zero_point_energy")] = clusters_df.at[i,("log","electronic_energy")] + clusters_df.at[i,("log","zero_point_correction")]  
-        clusters_df.at[i,("log","internal_energy")] += (Ev - Ev_OLD)/1000/627.503    
-        clusters_df.at[i,("log","energy_thermal_correction")] += (Ev - Ev_OLD)/1000/627.503    
-        clusters_df.at[i,("log","enthalpy_energy")] += (Ev - Ev_OLD)/1000/627.503
-        clusters_df.at[i,("log","enthalpy_thermal_correction")] += (Ev - Ev_OLD)/1000/627.503
-        clusters_df.at[i,("log","entropy")] += Sv - Sv_OLD      
-        ###
-  
+          new = [missing]
+        F[i] = missing
+        mask[i] = False
+        F[i,:len(new)] = new
+        mask[i,:len(new)] = True
+    for i in rows:
+      vibs[i] = F[i,mask[i]].tolist()
+    #
+    Sv = vibrational_entropy(F, mask, QtOLD)
+    Ev = vibrational_energy(F, mask, QtOLD)
+    ###
+    zero_point_correction[rows] = where(mask, 0.5*h*F*c, 0).sum(axis = 1)[rows]*0.00038088*6.022*10**23/1000
+    zero_point_energy[rows] = electronic_energy[rows] + zero_point_correction[rows]
+    dE = ((Ev - Ev_OLD)/1000/627.503)[rows]
+    internal_energy[rows] += dE
+    energy_thermal_correction[rows] += dE
+    enthalpy_energy[rows] += dE
+    enthalpy_thermal_correction[rows] += dE
+    #the entropy is corrected after the (temperature-dependent) antitreatment
+    p["anh_entropy"] = (rows, (Sv - Sv_OLD)[rows])
+    p["zero_point_correction"] = zero_point_correction
+    p["zero_point_energy"] = zero_point_energy
+    ###
+
+  #final frequencies for the new temperature and the low frequency treatment
+  lf = first_frequency(vibs)
+  F, mask = pack_frequencies(vibs)
+  p["final"] = (lf, F, mask, vibrational_entropy(F, mask, temperature), vibrational_energy(F, mask, temperature))
+  if Qfc > 0:
+    skipped = []
+    for vib in vibs:
+      try:
+        skipped.append(bool(isna(vib)))
+      except:
+        skipped.append(False)
+    skipped = array(skipped, dtype = bool)
+    eligible = ~skipped & ~(lf <= 0)
+    p["fc"] = (skipped, eligible, mean_moments_of_inertia(structures, eligible.nonzero()[0]))
+
+  p.update({"temperature":temperature, "entropy":entropy, "enthalpy_energy":enthalpy_energy, "enthalpy_thermal_correction":enthalpy_thermal_correction, "internal_energy":internal_energy, "energy_thermal_correction":energy_thermal_correction, "electronic_energy":electronic_energy})
+
+  clusters_df = clusters_df.copy()
+  if ("log","vibrational_frequencies") in clusters_df.columns:
+    column = empty(N, dtype = object)
+    for i,vib in enumerate(vibs):
+      column[i] = vib
+    clusters_df[("log","vibrational_frequencies")] = column
+  p["clusters_df"] = clusters_df
+  return p
+
+def thermodynamics_at(p, Qt):
+  """thermodynamics() at temperature Qt (nan = temperature of the log) from prepare_thermodynamics()"""
+  from numpy import log, isnan, errstate
+
+  N = p["N"]
+  has_temperature = p["has_temperature"]
+  temperature = p["temperature"].copy()
+  entropy = p["entropy"].copy()
+  enthalpy_energy = p["enthalpy_energy"].copy()
+  enthalpy_thermal_correction = p["enthalpy_thermal_correction"].copy()
+  internal_energy = p["internal_energy"].copy()
+  energy_thermal_correction = p["energy_thermal_correction"].copy()
+  electronic_energy = p["electronic_energy"]
+
+  ########################################################
+  # LOW VIBRATIONAL FREQUNECY ANTITREATMENT (S // G,Gc) ##
+  ########################################################
+  if p["Qafc"] > 0:
+    eligible, F, mask, mi = p["afc"]
+    T, Qt = propagate_temperature(Qt, temperature, eligible)
+    corr = qha_entropy_correction(F, mask, T, mi, p["Qafc"])
+    entropy[eligible] = entropy[eligible] - corr[eligible]
+
+  #########################
+  ## VIBRATIONAL SCALING ##
+  #########################
+  if "anh_entropy" in p:
+    rows, dS = p["anh_entropy"]
+    entropy[rows] += dS
+
   #################################################
   #### NEW TEMPERATURE (T,S,H,Hc,U,Uc // G,Gc) ####
   #################################################
+  lf, F, mask, Sv_OLD, Ev_OLD = p["final"]
   if ~isnan(Qt):
-    for i in range(len(clusters_df)):
-      #try:
-      #  if isna(clusters_df.at[i,("log","vibrational_frequencies")]).any():
-      #    lf = 0
-      #  try:
-      #    if isna(clusters_df.at[i,("log","vibrational_frequencies")]):
-      #      lf = 0
-      #  except:
-      #    lf = 0 #
-      #except:
-      #  lf = 0
-      try:
-        QtOLD = clusters_df.at[i,("log","temperature")]
-        clusters_df.at[i,("log","temperature")] = Qt
-      except: 
-        QtOLD = 298.15
-      if Qt != QtOLD:
-        try:
-          lf = float(clusters_df.at[i,("log","vibrational_frequencies")][0])
-        except:
-          lf = 0
-        if lf <= 0:
-          clusters_df.at[i,("log","temperature")] = Qt
-          clusters_df.at[i,("log","entropy")] = missing
-          clusters_df.at[i,("log","enthalpy_energy")] = missing
-          clusters_df.at[i,("log","enthalpy_thermal_correction")] = missing
-          clusters_df.at[i,("log","internal_energy")] = missing
-          clusters_df.at[i,("log","energy_thermal_correction")] = missing
-          continue
-        Sv_OLD = sum([R*h*vib*2.99793*10**10/k/QtOLD/(exp(h*vib*2.99793*10**10/k/QtOLD)-1)-R*log(1-exp(-h*vib*2.99793*10**10/k/QtOLD)) for vib in clusters_df.at[i,("log","vibrational_frequencies")]]) #cal/mol/K
-        Sv = sum([R*h*vib*2.99793*10**10/k/Qt/(exp(h*vib*2.99793*10**10/k/Qt)-1)-R*log(1-exp(-h*vib*2.99793*10**10/k/Qt)) for vib in clusters_df.at[i,("log","vibrational_frequencies")]]) #cal/mol/K
-        Ev_OLD = sum([R*h*vib*2.99793*10**10/k/(exp(h*vib*2.99793*10**10/k/QtOLD)-1)+R*h*vib*2.99793*10**10/k*0.5 for vib in clusters_df.at[i,("log","vibrational_frequencies")]])
-        Ev = sum([R*h*vib*2.99793*10**10/k/(exp(h*vib*2.99793*10**10/k/Qt)-1)+R*h*vib*2.99793*10**10/k*0.5 for vib in clusters_df.at[i,("log","vibrational_frequencies")]])
-        ###
-        clusters_df.at[i,("log","temperature")] = Qt
-        clusters_df.at[i,("log","entropy")] += Sv - Sv_OLD + 4*R*log(Qt/QtOLD)
-        clusters_df.at[i,("log","enthalpy_energy")] += (Ev - Ev_OLD + 4*R*(Qt-QtOLD))/1000/627.503
-        clusters_df.at[i,("log","enthalpy_thermal_correction")] += (Ev - Ev_OLD + 4*R*(Qt-QtOLD))/1000/627.503
-        clusters_df.at[i,("log","internal_energy")] += (Ev - Ev_OLD + 3*R*(Qt-QtOLD))/1000/627.503
-        clusters_df.at[i,("log","energy_thermal_correction")] += (Ev - Ev_OLD + 3*R*(Qt-QtOLD))/1000/627.503
-        ###
-  
+    QtOLD = temperature.copy()
+    changed = Qt != QtOLD
+    temperature[:] = Qt
+    has_temperature = True
+    dropped = changed & (lf <= 0)
+    rows = changed & ~(lf <= 0)
+    for column in [entropy,enthalpy_energy,enthalpy_thermal_correction,internal_energy,energy_thermal_correction]:
+      column[dropped] = missing
+    T = temperature
+    with errstate(all = "ignore"):
+      dS = vibrational_entropy(F, mask, T) - Sv_OLD + 4*R*log(Qt/QtOLD)
+      dEv = vibrational_energy(F, mask, T) - Ev_OLD
+    ###
+    entropy[rows] += dS[rows]
+    enthalpy_energy[rows] += ((dEv + 4*R*(Qt-QtOLD))/1000/627.503)[rows]
+    enthalpy_thermal_correction[rows] += ((dEv + 4*R*(Qt-QtOLD))/1000/627.503)[rows]
+    internal_energy[rows] += ((dEv + 3*R*(Qt-QtOLD))/1000/627.503)[rows]
+    energy_thermal_correction[rows] += ((dEv + 3*R*(Qt-QtOLD))/1000/627.503)[rows]
+    ###
+
   ####################################################
   # LOW VIBRATIONAL FREQUNECY TREATMENT (S // G,Gc) ##
   ####################################################
-  if Qfc > 0:
-    for i in range(len(clusters_df)):
-      try:
-        if isna(clusters_df.at[i,("log","vibrational_frequencies")]):
-          continue
-      except:
-        lf = 0
-      try:
-        lf = float(clusters_df.at[i,("log","vibrational_frequencies")][0])
-      except:
-        lf = 0
-      if lf <= 0:
-        clusters_df.at[i,("log","entropy")] = missing
-        continue
-      if isnan(Qt):
-        try:
-          Qt = clusters_df.at[i,("log","temperature")]
-        except:
-          Qt = 298.15
-      vibs = clusters_df.at[i,("log","vibrational_frequencies")]
-      structure = clusters_df.at[i,("xyz","structure")]
-      
-      mu = [float(h/(8*pi**2*2.99793*10**10*vib)) for vib in vibs]
-      try:
-        mi = mean(structure.get_moments_of_inertia())
-        Sr = [R*(0.5+log((8*pi**2.99793*(mu[j]*mi/(mu[j]+mi))*k*Qt/h**2)**0.5)) for j in range(len(mu))]  #cal/mol/K
-        Sv = [R*h*vib*2.99793*10**10/k/Qt/(exp(h*vib*2.99793*10**10/k/Qt)-1)-R*log(1-exp(-h*vib*2.99793*10**10/k/Qt)) for vib in vibs] #cal/mol/K
-        w = [1/(1+(Qfc/vib)**4) for vib in vibs]
-        Sv_corr = sum([w[j]*Sv[j]+(1-w[j])*Sr[j] for j in range(len(w))])
-        Sv_each = sum(Sv)  #cal/mol/K
-        clusters_df.at[i,("log","entropy")] = clusters_df.at[i,("log","entropy")]+(Sv_corr-Sv_each)
-      except:
-        mi = missing
-        clusters_df.at[i,("log","entropy")] = missing
+  if p["Qfc"] > 0:
+    skipped, eligible, mi = p["fc"]
+    entropy[~skipped & (lf <= 0)] = missing
+    T, Qt = propagate_temperature(Qt, temperature, eligible)
+    corr = qha_entropy_correction(F, mask, T, mi, p["Qfc"])
+    entropy[eligible] = entropy[eligible] + corr[eligible]
     ###
 
   ## CORRECTIONS FOR GIBBS FREE ENERGY
-  for i in range(len(clusters_df)):
-    try:
-      if isnan(Qt):
-        try:
-          Qt = clusters_df.at[i,("log","temperature")]
-        except:
-          Qt = 298.15
-      clusters_df.at[i,("log","gibbs_free_energy")] = clusters_df.at[i,("log","enthalpy_energy")] - clusters_df.at[i,("log","entropy")]/1000/627.503 * Qt
-    except:
-      clusters_df.at[i,("log","gibbs_free_energy")] = missing
-    try:
-      clusters_df.at[i,("log","gibbs_free_energy_thermal_correction")] = clusters_df.at[i,("log","gibbs_free_energy")] - clusters_df.at[i,("log","electronic_energy")]
-    except:
-      clusters_df.at[i,("log","gibbs_free_energy_thermal_correction")] = missing
+  T, Qt = propagate_temperature(Qt, temperature, [True]*N)
+  gibbs_free_energy = enthalpy_energy - entropy/1000/627.503 * T
+  gibbs_free_energy_thermal_correction = gibbs_free_energy - electronic_energy
+
+  ## WRITE EVERYTHING BACK AT ONCE
+  clusters_df = p["clusters_df"].copy()
+  towrite = {"entropy":entropy, "enthalpy_energy":enthalpy_energy, "enthalpy_thermal_correction":enthalpy_thermal_correction, "internal_energy":internal_energy, "energy_thermal_correction":energy_thermal_correction, "gibbs_free_energy":gibbs_free_energy, "gibbs_free_energy_thermal_correction":gibbs_free_energy_thermal_correction}
+  if has_temperature:
+    towrite["temperature"] = temperature
+  if p["zpe_columns_changed"]:
+    towrite["zero_point_correction"] = p["zero_point_correction"]
+    towrite["zero_point_energy"] = p["zero_point_energy"]
+  for column,values in towrite.items():
+    clusters_df[("log",column)] = values
 
   return clusters_df
+
+def thermodynamics(clusters_df, Qanh, Qafc, Qfc, Qt, Qdropimg, Qmakereal):
+  return thermodynamics_at(prepare_thermodynamics(clusters_df, Qanh, Qafc, Qfc, Qdropimg, Qmakereal), Qt)
@@ -3,12 +3,14 @@
 ###############################LIBRARIES#####################################
 import argparse
 from copy import deepcopy
+from functools import lru_cache
 import os
 import re
 import time
 from threading import Thread
 from classes import Molecule, Logger
 from slurm_submit import submit_array_job, submit_job, update_molecules_status
+from job_monitor import get_monitor, set_backend
 import plotting
 
 global_molecules = []
@@ -338,13 +340,80 @@ def check_transition_state(molecule, threshold=0.5):
             return False, msg
 
 
+def rmsd_structures(molecules, excluded_indexes=()):
+    # ASE Atoms (without the excluded atoms) for ArbAlign, built once per molecule
+    from ase import Atoms
+    structures = []
+    for molecule in molecules:
+        keep = [idx for idx in range(len(molecule.atoms)) if idx not in excluded_indexes]
+        structures.append(Atoms([molecule.atoms[idx] for idx in keep], positions=[molecule.coordinates[idx] for idx in keep]))
+    return structures
+
+
+def compare_pairs(structures_a, structures_b, pairs):
+    from ArbAlign import pack_structures, compare_batch
+    numbers, positions, offsets = pack_structures(list(structures_a) + list(structures_b))
+    return list(compare_batch(numbers, positions, offsets, [(i, len(structures_a) + j) for i, j in pairs]))
+
+
+def pair_rmsds(structures_a, structures_b, pairs, min_parallel=50):
+    # ArbAlign RMSDs {(i, j): rmsd} of the given pairs, distributed over a pool of processes
+    if len(pairs) < min_parallel:
+        return dict(zip(pairs, compare_pairs(structures_a, structures_b, pairs)))
+    from joblib import Parallel, delayed
+    from job_monitor import num_cores
+    cores = min(num_cores(), len(pairs))
+    chunks = [pairs[c::cores] for c in range(cores)]
+    results = Parallel(n_jobs=cores)(delayed(compare_pairs)(structures_a, structures_b, chunk) for chunk in chunks)
+    return {pair: rmsd for chunk, chunk_rmsds in zip(chunks, results) for pair, rmsd in zip(chunk, chunk_rmsds)}
+
+
+def candidate_pairs(molecules, structures, RMSD_threshold, Energy_threshold, Dipole_threshold):
+    # Pairs (i < j) which can be identical: within the energy window (found from the energy-sorted
+    # list), within the dipole window and with the RMSD lower bound below the threshold.
+    # ArbAlign only permutes, swaps/reflects and rotates centered structures, so the distances from
+    # the centroid are kept and RMSD >= sqrt(mean((sorted r_i - sorted r_j)**2)).
+    from numpy import sort, sqrt, mean
+    n = len(molecules)
+    energies = [m.electronic_energy for m in molecules]
+    dipoles = [m.dipole_moment for m in molecules]
+    with_energy = sorted([i for i in range(n) if energies[i] is not None], key=lambda i: energies[i])
+    pairs = set()
+    for a, i in enumerate(with_energy):
+        for j in with_energy[a+1:]:
+            if energies[j] - energies[i] > Energy_threshold:
+                break
+            pairs.add((min(i, j), max(i, j)))
+    for i in range(n):
+        if energies[i] is None: # If we can't compare energy, consider it as passing the check
+            pairs.update((min(i, j), max(i, j)) for j in range(n) if j != i)
+
+    radii = []
+    for structure in structures:
+        xyz = structure.get_positions()
+        radii.append(sort(sqrt(((xyz - xyz.mean(axis=0))**2).sum(axis=1))))
+    candidates = []
+    for i, j in sorted(pairs):
+        if dipoles[i] is not None and dipoles[j] is not None and abs(dipoles[i] - dipoles[j]) > Dipole_threshold:
+            continue
+        if len(radii[i]) != len(radii[j]) or sqrt(mean((radii[i] - radii[j])**2)) > RMSD_threshold + 1e-8:
+            continue
+        candidates.append((i, j))
+    return candidates
+
+
 def filter_molecules(molecules, logger=None, pickle=False, RMSD_threshold=0.34, Energy_threshold=1e-4, Dipole_threshold=1e-1):
-    from ArbAlign import compare
     initial_len = len(molecules)
     unique_molecules = []
     energy_difference = 0
     dipole_difference = 0
 
+    # ArbAlign is run only for the pairs that can be identical (in parallel). Other pairs fail
+    # the energy, dipole or RMSD check anyway.
+    position = {id(molecule): i for i, molecule in enumerate(molecules)}
+    structures = rmsd_structures(molecules)
+    rmsds = pair_rmsds(structures, structures, candidate_pairs(molecules, structures, RMSD_threshold, Energy_threshold, Dipole_threshold))
+
     while molecules:
         reference = molecules.pop(0) # Take first molecule and assume its unique for now
         unique_molecules.append(reference)
@@ -356,9 +425,10 @@ def filter_molecules(molecules, logger=None, pickle=False, RMSD_threshold=0.34,
             energy_check = False
             dipole_check = False
 
-            # Calculate RMSD and check against threshold
-            rmsd_value = compare(reference, molecule)
-            if rmsd_value <= RMSD_threshold:
+            # RMSD (if it was calculated) and check against threshold
+            i, j = position[id(reference)], position[id(molecule)]
+            rmsd_value = rmsds.get((min(i, j), max(i, j)))
+            if rmsd_value is not None and rmsd_value <= RMSD_threshold:
                 rmsd_check = True
 
             # Calculate energy and dipole moment difference if applicable
@@ -376,7 +446,7 @@ def filter_molecules(molecules, logger=None, pickle=False, RMSD_threshold=0.34,
             else:
                 dipole_check = True # Same for dipole
 
-            if not logger:
+            if not logger and rmsd_value is not None:
                 m_num = re.search(r'conf(\d+)', molecule.name).group(1)
                 r_num = re.search(r'conf(\d+)', reference.name).group(1)
                 print(f"R: conf{r_num:<3}  M: conf{m_num:<3} RMSD: {rmsd_value:.4f} E_diff: {energy_difference:.3e} D_diff: {dipole_difference:.3e} Identical: {all(i for i in [rmsd_check, energy_check, dipole_check])}")
@@ -402,9 +472,6 @@ def filter_molecules(molecules, logger=None, pickle=False, RMSD_threshold=0.34,
 
 
 def ArbAlign_pair(TS_conformers, reactants, products=None, threshold=0.8):
-    from copy import deepcopy
-    from ArbAlign import compare
-
     results = []  # This will store tuples of (TS, best reactant, best product)
 
     try:
@@ -419,36 +486,31 @@ def ArbAlign_pair(TS_conformers, reactants, products=None, threshold=0.8):
     excluded_indexes_TS = {H_index, len(TS_conformers[0].atoms) - 1, len(TS_conformers[0].atoms) - 2}
     excluded_indexes_reactant = {H_index}
 
-    for TS in TS_conformers:
-        TS_copy = deepcopy(TS)
-        TS_copy.atoms = [atom for idx, atom in enumerate(TS_copy.atoms) if idx not in excluded_indexes_TS]
-        TS_copy.coordinates = [coord for idx, coord in enumerate(TS_copy.coordinates) if idx not in excluded_indexes_TS]
+    # stripped structures are built once and all pairs are compared in parallel
+    reactants = reactants if reactants else []
+    products = products if products else []
+    TS_structures = rmsd_structures(TS_conformers, excluded_indexes_TS)
+    reactant_rmsds = pair_rmsds(TS_structures, rmsd_structures(reactants, excluded_indexes_reactant), [(t, r) for t in range(len(TS_conformers)) for r in range(len(reactants))])
+    product_rmsds = pair_rmsds(TS_structures, rmsd_structures(products), [(t, p) for t in range(len(TS_conformers)) for p in range(len(products))])
 
+    for t, TS in enumerate(TS_conformers):
         best_match_reactant = None
         min_rmsd_reactant = float('inf')
 
-        if reactants:
-            for reactant in reactants:
-                reactant_copy = deepcopy(reactant)
-                reactant_copy.atoms = [atom for idx, atom in enumerate(reactant_copy.atoms) if idx not in excluded_indexes_reactant]
-                reactant_copy.coordinates = [coord for idx, coord in enumerate(reactant_copy.coordinates) if idx not in excluded_indexes_reactant]
-
-                rmsd = compare(TS_copy, reactant_copy)
-                if rmsd < min_rmsd_reactant:
-                    min_rmsd_reactant = rmsd
-                    best_match_reactant = reactant
+        for r, reactant in enumerate(reactants):
+            rmsd = reactant_rmsds[(t, r)]
+            if rmsd < min_rmsd_reactant:
+                min_rmsd_reactant = rmsd
+                best_match_reactant = reactant
 
         best_match_product = None
         min_rmsd_product = float('inf')
 
-        if products:
-            for product in products:
-                product_copy = deepcopy(product)
-
-                rmsd = compare(TS_copy, product_copy)
-                if rmsd < min_rmsd_product:
-                    min_rmsd_product = rmsd
-                    best_match_product = product
+        for p, product in enumerate(products):
+            rmsd = product_rmsds[(t, p)]
+            if rmsd < min_rmsd_product:
+                min_rmsd_product = rmsd
+                best_match_product = product
 
         # Append the TS, reactant, and product tuple if both matches are found and within the threshold
         if best_match_reactant and min_rmsd_reactant and best_match_product and min_rmsd_product:
@@ -677,6 +739,13 @@ def read_last_lines(filename, num_lines, interval=200):
     return []
 
 
+def log_last_lines(molecule, num_lines=30):
+    last_lines = get_monitor().last_lines(molecule.log_file_path, num_lines)
+    if last_lines is None:
+        return read_last_lines(molecule.log_file_path, num_lines)
+    return last_lines
+
+
 def resubmit_job(molecule, logger, error=None):
     molecule.move_failed()
     job_type = molecule.current_step
@@ -705,9 +774,11 @@ def check_convergence(molecules, logger, threads, interval, max_attempts, all_co
     interval = args.interval if args.interval else int(interval)
     attempts = 0
     sleeping = False
+    woken = False
     max_terminations_allowed = 2
     pending, running = [], []
     job_type = molecules[0].current_step
+    monitor = get_monitor()
 
     for m in molecules:  # Initialize with all molecules not being converged and no terminations counted
         m.converged = False
@@ -715,7 +786,7 @@ def check_convergence(molecules, logger, threads, interval, max_attempts, all_co
         m.log_file_path = os.path.join(m.directory, f"{m.name}{m.output}")
 
     logger.log(f"Waiting {initial_delay} seconds before first check")
-    time.sleep(initial_delay)
+    monitor.wait(molecules, initial_delay)
 
     while attempts < max_attempts and not all_converged:
         i = 0
@@ -753,6 +824,10 @@ def check_convergence(molecules, logger, threads, interval, max_attempts, all_co
                 if molecule.job_id in pending:
                     pending.remove(molecule.job_id)
 
+                # a running job needs to be checked only if its log file has grown
+                if molecule.status == 'running' and not monitor.log_grew(molecule.log_file_path):
+                    continue
+
                 normal_termination_detected, termination_string = termination_status(molecule, logger)
 
                 if normal_termination_detected:
@@ -770,8 +845,7 @@ def check_convergence(molecules, logger, threads, interval, max_attempts, all_co
             else:
                 logger.log(f"Status {molecule} could not be determined. Ensure it is running. Job id: {molecule.job_id}")
                 continue
-            time.sleep(10)
-                
+
         if all(m.converged for m in molecules):
             all_converged = True
             break
@@ -785,14 +859,16 @@ def check_convergence(molecules, logger, threads, interval, max_attempts, all_co
                 sleep_time = interval
             if not sleeping:
                 logger.log(msg)
-                time.sleep(sleep_time)
+                monitor.wait(molecules, sleep_time)
                 sleeping = True
-            time.sleep(interval)
+            woken = monitor.wait(molecules, interval)
         else:
-            attempts += 1
+            # checks triggered by a job changing its state do not count as attempts
+            if not woken:
+                attempts += 1
             if attempts % 10 == 0 or attempts == 1:
                 logger.log(f"Log files of the {len(molecules)} conformers have been checked. Checking every {interval} seconds. Attempt: {attempts}/{max_attempts}")
-            time.sleep(interval)
+            woken = monitor.wait(molecules, interval)
 
     if all_converged:
         if molecules: # Check if not all molecules from list has been dropped
@@ -840,7 +916,7 @@ def handle_error_termination(molecule, logger, error_termination_string):
         convergence_errors = ["l9999", "l508"]
         intervention_errors = ["l301"]
         G16_common_errors = "https://wongzit.github.io/gaussian-common-errors-and-solutions/"
-        last_lines = read_last_lines(molecule.log_file_path, 30)
+        last_lines = log_last_lines(molecule, 30)
 
         if last_lines:
             detected_convergence_errors = [error for error in convergence_errors if any(error in line for line in last_lines)]
@@ -893,9 +969,10 @@ def check_crest(molecules, logger, threads, interval, max_attempts):
     current_step = molecules[0].current_step
     dir = molecules[0].directory
     method = molecules[0].method
+    monitor = get_monitor()
     
     logger.log(f"Waiting {initial_delay} seconds before first check")
-    time.sleep(initial_delay)
+    monitor.wait(molecules, initial_delay)
 
     while attempts < max_attempts:
         update_molecules_status(molecules)
@@ -917,16 +994,16 @@ def check_crest(molecules, logger, threads, interval, max_attempts):
                 sleep_time = interval
             if not sleeping:
                 logger.log(msg)
-                time.sleep(sleep_time)
+                monitor.wait(molecules, sleep_time)
                 sleeping = True
-            time.sleep(interval)
+            monitor.wait(molecules, interval)
             continue
 
         try:
             files_in_directory = set(os.listdir(molecules[0].directory))
         except FileNotFoundError:
             logger.log(f"Pickle file(s) not generated yet. Retrying in {interval} seconds.")
-            time.sleep(interval)
+            monitor.wait(molecules, interval)
             attempts += 1
             continue
 
@@ -955,7 +1032,7 @@ def check_crest(molecules, logger, threads, interval, max_attempts):
         else:
             if attempts == 1:
                 logger.log(f"Not all files found. Retrying every {interval} seconds.")
-            time.sleep(interval)
+            monitor.wait(molecules, interval)
 
         attempts += 1
 
@@ -1077,7 +1154,7 @@ def handle_termination(molecules, logger, threads, converged):
 
 
 def termination_status(molecule, logger):
-    last_lines = read_last_lines(molecule.log_file_path, 30)
+    last_lines = log_last_lines(molecule, 30)
     if not last_lines:
         molecule.error_termination_count += 1
         return False, 'Could not read molecule log file'
@@ -1310,105 +1387,97 @@ def log2vib(molecule):
     return vibrations
         
 
-def eckart(SP_TS, SP_reactant, SP_product, imag, T=[298.15]):
-    from numpy import pi, sqrt, arange, exp, max, cosh
-    def Gcalc(Emin,GSize,V,A,B,L,h,kB,m,T,v1):
-        E=arange(Emin,2*max(V),GSize)
-        K=[0 for x in range(len(E))]
-        EK=[0 for x in range(len(E))]
-        EKa=[0 for x in range(len(E))]
-        for i in range(len(E)):
-            C=(h**2)/(8*m*(L**2))     # calculation of C factor
-            a=0.5*sqrt(E[i]/C)
-            b=0.5*sqrt((E[i]-A)/C)
-            d=0.5*sqrt((B-C)/C)
-            K[i]=1-((cosh(2*pi*(a-b))+cosh(2*pi*d))/(cosh(2*pi*(a+b))+cosh(2*pi*d)))
-            EK[i]=E[i]
-            EKa[i]=E[i]*627.509
-        
-        G=[0 for x in range(len(T))]
-        for q in range(len(T)):                                # Temperature dependent operations begin
-            GK=[0 for x in range(len(K))]                                              # Clean variable
-            for j in range(len(K)):                            
-                GK[j]=K[j]*exp(-EK[j]/(kB*T[q]))           # Calculate integrand
-            GI=[0 for x in range(len(K))]
-            for l in range(len(EK)-1):
-                GI[l]=(0.5*(GK[l]+GK[l+1])*abs(EK[l]-EK[l+1])) # Numerical integration by using the area of squares
-            
-            GI=sum(GI)
-            GI=GI*(exp(v1/(kB*T[q]))/(kB*T[q]))                     # multiplying integral with prefactor
-            
-            # For energies above the interval where transmission is less than 1, we use
-            # analytical integration to obtain the final result
-            
-            G[q]=GI+exp(v1/(kB*T[q]))*exp(-EK[len(EK)-1]/(kB*T[q]))
-            
-        return G, EKa, K, GK
+def eckart_parameters(E1, E2, imag):
+    """Eckart barrier (atomic units) from the forward/backward barriers E1, E2 (kcal/mol) and the imaginary frequency (cm-1).
+
+    Returns v1, A, B, C and the energy window [Emin, Emax] of the transmission integral.
+    """
+    from numpy import pi, sqrt, arange, exp, max
+    c=2.99792458e+8          # Speed of light (m s-1)
+    h=2*pi
+    Na=6.0221409e+23         # Avogadro's number (mol-1)
+    mu = 1
+    v1=((E1*4184)/Na)/4.3597447222071e-18
+    v2=((E2*4184)/Na)/4.3597447222071e-18
+    wau=(imag*100)*c*2.418884326509e-17
+    m=mu*1822.888479
+
+    # Calculate force constant, A, B and L
+    F=-4*(pi**2)*(wau**2)*m
+    A=v1-v2
+    B=(sqrt(v2)+sqrt(v1))**2
+    L=-pi*(A-B)*(B+A)/(sqrt(-2*F*B)*B)
+    C=(h**2)/(8*m*(L**2))
+
+    # Potential along the reaction coordinate
+    x = arange(-3, 3, 0.01)/sqrt(mu)
+    y = -exp((2*pi*x)/L)
+    V = -(y*A)/(1-y) - (y*B)/((1-y)**2)
+    Emin = max([V[0], V[-1]])                              # minimum energy at which tunnelling can occur
+    Emax = 2*max(V)                                        # above, the transmission is taken as 1
+    return v1, A, B, C, Emin, Emax
+
+
+def eckart_transmission(E, A, B, C):
+    """Transmission probability K(E) of the Eckart barrier for an array of energies (atomic units)."""
+    from numpy import pi, sqrt, cosh
+    a=0.5*sqrt(E/C)
+    b=0.5*sqrt((E-A)/C)
+    d=0.5*sqrt((B-C)/C)
+    return 1-((cosh(2*pi*(a-b))+cosh(2*pi*d))/(cosh(2*pi*(a+b))+cosh(2*pi*d)))
+
+
+def eckart_factors(E1, E2, imag, T, rtol=1e-8):
+    """Eckart tunneling coefficients for all temperatures T at once.
+
+    The transmission integral is evaluated by composite Gauss-Legendre quadrature (for all T
+    at once) and the number of panels is doubled until converged.
+    Results are memoized on (barriers, imaginary frequency, temperatures).
+    """
+    from numpy import atleast_1d, isfinite
+    if not (E1 > 0 and E2 > 0):
+        raise ValueError(f"Eckart barrier requires positive barriers (E1 = {E1}, E2 = {E2})")
+    T = tuple(float(t) for t in atleast_1d(T))
+    kappa = eckart_cached(round(E1, 8), round(E2, 8), round(abs(imag), 6), T, rtol).copy()
+    if not isfinite(kappa).all():
+        raise ValueError("Eckart tunneling coefficient is not finite")
+    return kappa
+
+
+@lru_cache(maxsize=4096)
+def eckart_cached(E1, E2, imag, T, rtol):
+    from numpy import array, exp, abs, max, polynomial, linspace, isfinite
+    kB=3.1668152e-6
+    v1, A, B, C, Emin, Emax = eckart_parameters(E1, E2, imag)
+    kT = kB*array(T)[:, None]
+    nodes, weights = polynomial.legendre.leggauss(16)
+
+    # E = Emin + (Emax-Emin)*s^2 removes the square-root behaviour of K(E) at Emin
+    def integral(panels):
+        edges = linspace(0, 1, panels+1)
+        half = 0.5*(edges[1:]-edges[:-1])
+        s = (((edges[:-1]+edges[1:])/2)[:, None] + half[:, None]*nodes[None, :]).ravel()
+        W = (half[:, None]*weights[None, :]).ravel()*2*(Emax-Emin)*s
+        E = Emin + (Emax-Emin)*s**2
+        K = eckart_transmission(E, A, B, C)
+        return ((K*exp((v1-E)/kT))/kT) @ W
+
+    panels = 8
+    G_old = integral(panels)
+    while True:
+        panels *= 2
+        G_new = integral(panels)
+        if not isfinite(G_new).all() or max(abs(G_new-G_old)/abs(G_new)) < rtol or panels > 2**14:
+            break
+        G_old = G_new
+    # For energies above the interval where transmission is less than 1, we use
+    # analytical integration to obtain the final result
+    return G_new + exp((v1-Emax)/kT[:, 0])
 
+
+def eckart(SP_TS, SP_reactant, SP_product, imag, T=[298.15]):
     try:
-        c=2.99792458e+8          # Speed of light (m s-1)
-        kB=3.1668152e-6
-        h=2*pi
-        Na=6.0221409e+23         # Avogadro's number (mol-1)
-
-        E1 = SP_TS - SP_reactant
-        E2 = SP_TS - SP_product
-        mu = 1
-        v1=((E1*4184)/Na)/4.3597447222071e-18
-        v2=((E2*4184)/Na)/4.3597447222071e-18
-        wau=(imag*100)*c*2.418884326509e-17
-        m=mu*1822.888479
-
-        # Calculate force constant, A, B and L
-        F=-4*(pi**2)*(wau**2)*m;
-        F2=-4*(pi**2)*(wau**2)*1;
-        A=v1-v2;
-        B=(sqrt(v2)+sqrt(v1))**2;
-        L=-pi*(A-B)*(B+A)/(sqrt(-2*F*B)*B);
-
-        # Defining reaction coordinate
-        x = arange(-3, 3, 0.01)
-        x = x/(sqrt(mu))      # Removing reduced mass from reaction coordinate in order to get a well defined potential
-
-        # Calculating potential
-        y=[0 for i in range(len(x))]
-        V=[0 for i in range(len(x))]
-        xa=[0 for i in range(len(x))]
-        Va=[0 for i in range(len(x))]
-
-        for i in range(len(x)):
-            y[i]=-exp( (2*pi*x[i])/L )
-            V[i]=( (-(y[i]*A)/(1-y[i]) ) - ( (y[i]*B)/((1-y[i])**2)) )
-            xa[i]=0.529177*x[i]*sqrt(mu)         # reduced mass re-inserted for plotting
-            Va[i]=V[i]*627.509                        # potential converted to kcal/mol for plotting
-
-        # Calculating the correction factors for all T's
-        VB=[0,0]
-        VB[0]=V[0]                                                # value of potential at reactants
-        VB[1]=V[len(x)-1]                                           # value of potential at products
-        Emin=max(VB)                                           # minimum energy at which tunnelling can occur
-        Gdiff=1                                                   # initial convergence control set to 1
-        GSize=max(V)/50                                        # initial integration stepsize 
-        [Gold,EKa,K,GK]=Gcalc(Emin,GSize,V,A,B,L,h,kB,m,T,v1)                      # calculate G
-        GSize=GSize/10                                            # reduce integration stepsize
-        runs=0                                                    # initial number of runs
-        while Gdiff >= 0.001:                                        # convergence criteria
-            [Gnew,EKa,K,GK]=Gcalc(Emin,GSize,V,A,B,L,h,kB,m,T,v1)  # new G
-        #    print("Tunneling Factor", Gnew)                                         # display new correction factor
-            GSize=GSize/10                                        # reduce integration stepsize
-            Gdiffcalc=[0 for x in range(len(T))]
-            for j in range(len(T)):
-                Gdiffcalc[j]=abs(Gnew[j]-Gold[j])/Gold[j]         # calculate convergence
-            Gdiff=max(Gdiffcalc)                                  # max convergence control value
-        #    print("convergence control value", Gdiff)                                        # display convergence control value
-            Gold=Gnew                                             # replace old correction factor with new
-            runs=runs+1                                           # a run completed
-        #    print("runs done", runs)                                         # display run number
-
-        [G,EKa,K,GK]=Gcalc(Emin,GSize,V,A,B,L,h,kB,m,T,v1)        #final G
-
-        kappa = G[0]
-        return kappa
+        return eckart_factors(SP_TS - SP_reactant, SP_TS - SP_product, imag, T)[0]
     except Exception as e:
         print("Error in calculating the eckart tunneling. Returning tunneling coefficient 1")
         return 1
@@ -1449,7 +1518,7 @@ def rate_constant_pair(TS_conformers, reactant_conformers, product_conformers, T
             TS_energy = TS.electronic_energy * Htokcalmol
             reactant_energy = reactant.electronic_energy * Htokcalmol
             product_energy = product.electronic_energy * Htokcalmol
-            k = eckart(TS_energy, reactant_energy, product_energy, imag)
+            k = eckart(TS_energy, reactant_energy, product_energy, imag, T=[T])
             kappa.append(k)
             sum_TS += k * exp(-(lowest_TS_E - TS.zero_point_corrected*HtoJ)/(k_b*T)) * TS.Q
             sum_R += exp(-(lowest_R_E - reactant.zero_point_corrected*HtoJ)/(k_b*T)) * reactant.Q
@@ -1511,7 +1580,7 @@ def rate_constant(TS_conformers, reactant_conformers, product_conformers, T=298.
                 lowest_EE_reactant_kcalmol = (lowest_reactant.electronic_energy + OH.electronic_energy) * Htokcalmol
 
                 imag = abs(lowest_TS.vibrational_frequencies[0])
-                kappa = eckart(lowest_EE_TS_kcalmol, lowest_EE_reactant_kcalmol, lowest_EE_product_kcalmol, imag)
+                kappa = eckart(lowest_EE_TS_kcalmol, lowest_EE_reactant_kcalmol, lowest_EE_product_kcalmol, imag, T=[T])
                 k = kappa * (k_b*T)/(h*p_ref) * (Q_TS/Q_reactant) * exp(-(lowest_ZP_TS_J - sum_reactant_ZP_J) / (k_b * T))
                 # k_G = kappa * (k_b*T)/(h*p_ref) * exp(-(lowest_TS.free_energy - (lowest_reactant.free_energy+OH.free_energy))*HtoJ / (k_b * T))
                 # k_G = kappa * (k_b*T)/(h*p_ref) * exp(-((lowest_reactant.free_energy + OH.free_energy - lowest_TS.free_energy)*HtoJ) / (k_b * T))
@@ -1586,6 +1655,9 @@ def main():
     additional_options.add_argument('-time', metavar="hh:mm:ss", type=str, default=None, help='Monitoring duration [def: 144 hours]')
     additional_options.add_argument('-interval', metavar="int", nargs='?', const=1, type=int, help='Time interval between log file checks [def: based on molecule size]')
     additional_options.add_argument('-initial_delay', metavar="int", nargs='?', const=1, type=int, help='Initial delay before checking log files [def: based on molecule size]')
+    additional_options.add_argument('-poll', metavar="int", type=int, default=30, help='Time interval between job status queries (one squeue call for all jobs) [def: 30]')
+    additional_options.add_argument('-backend', type=str, default='slurm', choices=['slurm', 'local'], help='Run the jobs through SLURM or on this machine [def: slurm]')
+    additional_options.add_argument('-local_jobs', metavar="int", type=int, default=None, help='Number of simultaneous jobs with -backend local [def: cores/cpu]')
     additional_options.add_argument('-attempts', metavar="int", nargs='?', const=1, type=int, default=100, help='Number of log file check attempts [def: 100]')
     additional_options.add_argument('-max_conformers', metavar="int", nargs='?', const=1, type=int, default=None, help='Maximum number of conformers from CREST [def: 50]')
     additional_options.add_argument('-freq_cutoff', metavar="int", nargs='?', const=1, type=int, default=-100, help='TS imaginary frequency cutoff [def: -100 cm^-1]')
@@ -1626,6 +1698,13 @@ def main():
         args.G16 = True
         QC_program = "G16"
 
+    # Job submission and monitoring backend
+    local_jobs = args.local_jobs
+    if args.backend == 'local' and local_jobs is None:
+        from job_monitor import num_cores
+        local_jobs = max(1, num_cores() // args.cpu)
+    set_backend(args.backend, poll=args.poll, local_jobs=local_jobs)
+
     global termination_strings, error_strings  # Keep in lower case!!
     termination_strings = {
     "g16": ["normal termination"],
@@ -7,6 +7,7 @@ import pickle
 import random
 from rdkit import Chem
 from rdkit.Chem import AllChem
+from log_parser import parse_log
 ##################################################WORKFLOWS#################################################################
 # Change as you feel like
 OH_H2O_workflow = ['optimization', 'DLPNO']
@@ -400,81 +401,61 @@ class Molecule(Vector):
         file_path = log_file_path if log_file_path else self.log_file_path
         program = program if program else self.program
 
-        with open(file_path, 'r') as f:
-            log_content = f.read()
-
-            if program.lower() == 'g16':
-                zero_point_correction = re.findall(r'Zero-point correction=\s+([-.\d]+)', log_content)
-                free_energy = re.findall(r'Sum of electronic and thermal Free Energies=\s+([-.\d]+)', log_content)
-                dipole_moment = re.findall(r"Tot=\s+([-\d.]+)", log_content)
-                partition_function = re.findall(r"Total V=0\s+([-\d.]+D[+-]\d+)", log_content)
-                if zero_point_correction:
-                    self.zero_point = float(zero_point_correction[-1])
-                    self.free_energy = float(free_energy[-1])
-                    self.dipole_moment = float(dipole_moment[-1])
-                    self.Q = float(partition_function[-1].replace('D', 'E'))
-                electronic_energy = re.findall(r'(SCF Done:  E\(\S+\) =)\s+([-.\d]+)', log_content)
-                if electronic_energy:
-                    self.electronic_energy = float(electronic_energy[-1][-1])
-                    freq_matches = re.findall(r"Frequencies --\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)?\s+(-?\d+\.\d+)?", log_content)
-                    if freq_matches:
-                        self.vibrational_frequencies = [float(freq) for match in freq_matches for freq in match if freq]
-                        rot_temp = re.findall(r"Rotational temperatures? \(Kelvin\)\s+(-?\d+\.\d+)(?:\s+(-?\d+\.\d+))?(?:\s+(-?\d+\.\d+))?", log_content)
-                        self.rot_temps = [float(rot) for rot in rot_temp[-1] if rot != '']
-                        symmetry_num = re.search(r"Rotational symmetry number\s*(\d+)", log_content)
-                        if symmetry_num:
-                            self.symmetry_num = int(symmetry_num.group(1))
-                        else: 
-                            if logger:
-                                logger.log(f"No symmetry number found in {self.name}. assuming 1")
-                            self.symmetry_num = 1
-                        mol_mass = re.search(r"Molecular mass:\s+(-?\d+\.\d+)", log_content)
-                        self.mol_mass = float(mol_mass.group(1))
-                        mult = re.search(r"Multiplicity =\s*(\d+)", log_content)
-                        if mult:    
-                            self.mult = int(mult.group(1))
-                        else: self.mult = 2
-
-                        # self.partition_function()
-                    elif 'TS' in self.name:
+        if program.lower() == 'g16':
+            log = parse_log(file_path, 'g16')
+            if log['zero_point'] is not None:
+                self.zero_point = log['zero_point']
+                self.free_energy = log['free_energy']
+                self.dipole_moment = log['dipole_moment']
+                self.Q = log['Q']
+            if log['electronic_energy'] is not None:
+                self.electronic_energy = log['electronic_energy']
+                if log['frequencies']:
+                    self.vibrational_frequencies = list(log['frequencies'])
+                    self.rot_temps = list(log['rot_temps'])
+                    if log['symmetry_num'] is not None:
+                        self.symmetry_num = log['symmetry_num']
+                    else: 
                         if logger:
-                            logger.log(f"No frequencies found in {self.name}")
-
-
-            elif program.lower() == 'orca' or self.current_step == 'DLPNO' or DLPNO:
-                zero_point_correction = re.findall(r"Zero point energy\s+...\s+([-+]?\d*\.\d+|\d+)", log_content)
-                free_energy = re.findall(r"Final Gibbs free energy\s+...\s+([-+]?\d*\.\d+|\d+)", log_content)
-                electronic_energy = re.findall(r'(FINAL SINGLE POINT ENERGY)\s+([-.\d]+)', log_content)
-                dipole_moment = re.findall(r"Magnitude \(Debye\)\s*:\s*([\d.]+)", log_content)
-                # find ORCA zero point zorrected
-                if electronic_energy:
-                    self.electronic_energy = float(electronic_energy[-1][-1])
-                    if zero_point_correction and free_energy:
-                        self.zero_point = float(zero_point_correction[-1])
-                        self.free_energy = float(free_energy[-1])
-                        self.dipole_moment = float(dipole_moment[-1])
-                    freq_matches = re.findall(r'([-+]?\d*\.\d+)\s*cm\*\*-1', log_content)
-                    if freq_matches:
-                        n = 3*len(self.atoms)-6 # Utilizing the fact that non-linear molecules has 3N-6 degrees of freedom
-                        self.vibrational_frequencies = [float(freq) for freq in freq_matches][-n:]
-                        rot_temp = re.findall(r"Rotational constants in cm-1: \s*[-+]?(\d*\.\d*)  \s*[-+]?(\d*\.\d*) \s*[-+]?(\d*\.\d*)", log_content)
-                        self.rot_temps = [float(rot) for rot in rot_temp[-1]]
-                        symmetry_num = re.search(r'Symmetry Number:\s*(\d*)', log_content)
-                        if symmetry_num:
-                            self.symmetry_num = int(symmetry_num.group(1))
-                        else: 
-                            self.symmetry_num = 1
-
-                        mol_mass = re.search(r'Total Mass\s*...\s*\d*\.\d+', log_content)
-                        if mol_mass:
-                            self.mol_mass = float(mol_mass.group().split()[-1])
-                        multiplicity = re.search(r'Mult\s* ....\s*(\d*)', log_content)
-                        if multiplicity:
-                            self.mult = int(multiplicity.group().split()[-1])
-                        else:
-                            self.mult = 2
-
-                        self.partition_function()
+                            logger.log(f"No symmetry number found in {self.name}. assuming 1")
+                        self.symmetry_num = 1
+                    self.mol_mass = log['mol_mass']
+                    if log['mult'] is not None:
+                        self.mult = log['mult']
+                    else: self.mult = 2
+
+                    # self.partition_function()
+                elif 'TS' in self.name:
+                    if logger:
+                        logger.log(f"No frequencies found in {self.name}")
+
+
+        elif program.lower() == 'orca' or self.current_step == 'DLPNO' or DLPNO:
+            log = parse_log(file_path, 'orca')
+            # find ORCA zero point zorrected
+            if log['electronic_energy'] is not None:
+                self.electronic_energy = log['electronic_energy']
+                if log['zero_point'] is not None and log['free_energy'] is not None:
+                    self.zero_point = log['zero_point']
+                    self.free_energy = log['free_energy']
+                    self.dipole_moment = log['dipole_moment']
+                if log['frequencies']:
+                    n = 3*len(self.atoms)-6 # Utilizing the fact that non-linear molecules has 3N-6 degrees of freedom
+                    self.vibrational_frequencies = log['frequencies'][-n:]
+                    self.rot_temps = list(log['rot_temps'])
+                    if log['symmetry_num'] is not None:
+                        self.symmetry_num = log['symmetry_num']
+                    else: 
+                        self.symmetry_num = 1
+
+                    if log['mol_mass'] is not None:
+                        self.mol_mass = log['mol_mass']
+                    if log['mult'] is not None:
+                        self.mult = log['mult']
+                    else:
+                        self.mult = 2
+
+                    self.partition_function()
                 
 
 
@@ -971,80 +952,13 @@ class Molecule(Vector):
 
 
     def log2xyz(self, atoms=False):
-        if self.program.lower() == "g16":
-            match_string='Standard orientation'
-            atomic_number_to_symbol = {
-                1: 'H',
-                6: 'C',
-                7: 'N',
-                8: 'O',
-                16: 'S',
-                17: 'Cl'
-            }
-
-            with open(self.log_file_path, 'r') as file:
-                coordinates = []
-                element = []
-                start_reading = False
-                for line in file:
-                    if start_reading:
-                        parts = line.split()
-                        if len(parts) >= 6 and parts[1].isdigit() and all(part.replace('.', '', 1).isdigit() or part.lstrip('-').replace('.', '', 1).isdigit() for part in parts[-3:]):
-                            element_symbol = atomic_number_to_symbol.get(int(parts[1]), 'Unknown')
-                            element.append(element_symbol)
-                            coords = [float(parts[3]), float(parts[4]), float(parts[5])]
-                            coordinates.append(coords)
-                    if match_string in line:
-                        start_reading = True
-                        coordinates = []
-                        element = []
-                    if "Rotational" in line:
-                        start_reading = False
-                if not coordinates:
-                    return False
-                if atoms:
-                    return (element, coordinates)
-                else: return coordinates
-
-        elif self.program.lower() == "orca":
-            match_string='CARTESIAN COORDINATES (ANGSTROEM)'
-            with open(self.log_file_path, 'r') as file:
-                coordinates = []
-                element = []
-                start_reading = False
-
-                for line in file:
-                    if start_reading:
-                        parts = line.split()
-                        if len(parts) == 4 and parts[0].isalpha():  # Check if line starts with element symbol
-                                element_symbol = parts[0]
-                                coords = [float(parts[1]), float(parts[2]), float(parts[3])]
-                                element.append(element_symbol)
-                                coordinates.append(coords)
-                    if match_string in line:
-                        start_reading = True
-                        coordinates = []
-                        element = []
-                        parts = line.split()
-                        if len(parts) == 4 and parts[0].isalpha():  # Check if line starts with element symbol
-                                element_symbol = parts[0]
-                                coords = [float(parts[1]), float(parts[2]), float(parts[3])]
-                                element.append(element_symbol)
-                                coordinates.append(coords)
-                    if match_string in line:
-                        start_reading = True
-                        coordinates = []
-                        element = []
-                    if "------" in line:
-                        continue
-                    if "CARTESIAN COORDINATES (A.U.)" in line:
-                        start_reading = False
-                if not coordinates:
-                    return False
-
-                if atoms:
-                    return (element, coordinates)
-                else: return coordinates
+        if self.program.lower() in ["g16", "orca"]:
+            log = parse_log(self.log_file_path, self.program)
+            if not log['coordinates']:
+                return False
+            if atoms:
+                return (list(log['elements']), [list(coords) for coords in log['coordinates']])
+            else: return [list(coords) for coords in log['coordinates']]
 
 
     def print_items(self, logger=None):
@@ -0,0 +1,275 @@
+import os
+import re
+import subprocess
+import time
+from collections import deque
+from itertools import count
+from threading import Condition, Lock, Thread
+#########################################JOB MONITOR############################
+# One JobMonitor is shared by all monitoring threads (check_convergence/check_crest):
+# - the job states of all jobs are obtained by one backend query per poll cycle,
+# - log files are read incrementally (only the bytes appended since the last check),
+# - waiting threads are woken up as soon as one of their jobs changes its state.
+# The backend (SLURM or a local pool of processes) submits the generated submit scripts
+# and reports the job states.
+
+def extract_job_id(output):
+    match = re.search(r'Submitted batch job (\d+)', output)
+    if match:
+        return int(match.group(1))
+    else:
+        print("Could not extract job ID.")
+        return None
+
+
+def num_cores():
+    try:
+        return int(os.environ["SLURM_JOB_CPUS_PER_NODE"])
+    except (KeyError, ValueError):
+        from multiprocessing import cpu_count
+        return cpu_count()
+
+
+class SlurmBackend:
+    grace = 60  # seconds a freshly submitted job may be missing in squeue
+
+    def __init__(self):
+        from getpass import getuser
+        self.user = getuser()
+        self.on_change = None
+
+    def submit(self, submit_command, array_size=None):
+        result = subprocess.run(submit_command, capture_output=True, text=True, check=True)
+        return extract_job_id(result.stdout)
+
+    def query(self):
+        # -r lists every array task on its own line (e.g. 1234_5)
+        try:
+            result = subprocess.run(['squeue', '-h', '-r', '-u', self.user, '-o', '%i %t'], capture_output=True, text=True, check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return None
+        job_statuses = {}
+        for line in result.stdout.splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                job_statuses[parts[0]] = 'running' if parts[1] == 'R' else 'pending' if parts[1] == 'PD' else 'completed or not found'
+        return job_statuses
+
+
+def run_local_job(script, env, cwd, output):
+    from tempfile import TemporaryDirectory
+    with TemporaryDirectory(prefix="JKTS_") as wrkdir:
+        env = dict(env, WRKDIR=wrkdir)
+        with open(output, 'w') as out:
+            return subprocess.run(['sh'], input=script, text=True, stdout=out, stderr=subprocess.STDOUT, env=env, cwd=cwd).returncode
+
+
+class LocalBackend:
+    # The submit scripts are generated as for SLURM, but instead of sbatch the job script
+    # is executed (for every array task) by a pool on this machine.
+    grace = 0
+
+    def __init__(self, max_workers=None, executor=None):
+        if executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=max_workers or num_cores())
+        self.executor = executor
+        self.futures = {}
+        self.ids = count(1)
+        self.lock = Lock()
+        self.on_change = None
+
+    def submit(self, submit_command, array_size=None):
+        cwd = os.getcwd()
+        env = dict(os.environ, JKTS_SUBMIT='true')
+        subprocess.run(submit_command, capture_output=True, text=True, check=True, env=env, cwd=cwd)
+        with open(os.path.join(cwd, 'qsub.tmp')) as f:
+            script = f.read()
+        os.makedirs(os.path.join(cwd, 'slurm_output'), exist_ok=True)
+        job_id = next(self.ids)
+        tasks = range(1, array_size + 1) if array_size else [None]
+        for task in tasks:
+            key = f"{job_id}_{task}" if task else f"{job_id}"
+            env = dict(os.environ, SLURM_JOB_ID=str(job_id), SLURM_SUBMIT_DIR=cwd)
+            if task:
+                env.update(SLURM_ARRAY_JOB_ID=str(job_id), SLURM_ARRAY_TASK_ID=str(task))
+            output = os.path.join(cwd, 'slurm_output', f"local_{key}.out")
+            future = self.executor.submit(run_local_job, script, env, cwd, output)
+            with self.lock:
+                self.futures[key] = future
+            future.add_done_callback(self.job_done)
+        return job_id
+
+    def job_done(self, future):
+        if self.on_change:
+            self.on_change()
+
+    def query(self):
+        with self.lock:
+            futures = list(self.futures.items())
+        job_statuses = {}
+        for key, future in futures:
+            if future.done():
+                continue
+            job_statuses[key] = 'running' if future.running() else 'pending'
+        return job_statuses
+
+
+class LogTail:
+    # Keeps the last lines of a (growing) log file; only new bytes are read.
+    def __init__(self, path, num_lines=30, initial_bytes=65536):
+        self.path = path
+        self.num_lines = num_lines
+        self.initial_bytes = initial_bytes
+        self.reset(None)
+
+    def reset(self, inode):
+        self.inode = inode
+        self.offset = None
+        self.partial = b''
+        self.lines = deque(maxlen=self.num_lines)
+
+    def update(self):
+        """Reads the new bytes. Returns None if the file does not exist, else whether it has grown."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if stat.st_ino != self.inode or (self.offset is not None and stat.st_size < self.offset):
+            self.reset(stat.st_ino)  # new (e.g. resubmitted) job
+        if self.offset == stat.st_size:
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                if self.offset is None:
+                    # first read: only the end of the file is needed
+                    start = max(0, stat.st_size - self.initial_bytes)
+                    f.seek(start)
+                    data = f.read()
+                    if start > 0:
+                        data = data[data.find(b'\n') + 1:]
+                    self.offset = start
+                else:
+                    f.seek(self.offset)
+                    data = f.read()
+                self.offset = f.tell()
+        except FileNotFoundError:
+            return None
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        self.lines.extend(line.decode('utf-8', 'replace').rstrip('\r') for line in lines)
+        return True
+
+    def last_lines(self, num_lines=None):
+        lines = list(self.lines)
+        if self.partial:
+            lines.append(self.partial.decode('utf-8', 'replace'))
+        return lines[-(num_lines or self.num_lines):]
+
+
+class JobMonitor:
+    def __init__(self, backend, poll=30):
+        self.backend = backend
+        self.backend.on_change = self.refresh
+        self.poll = poll
+        self.job_statuses = {}
+        self.failed = False
+        self.seen = set()
+        self.submitted = {}
+        self.last_query = 0
+        self.tails = {}
+        self.condition = Condition()
+        self.query_lock = Lock()
+        self.poller = None
+
+    def submit(self, submit_command, array_size=None):
+        job_id = self.backend.submit(submit_command, array_size)
+        with self.condition:
+            self.submitted[str(job_id)] = time.time()
+        return job_id
+
+    def refresh(self):
+        """One backend query for all jobs; wakes up the threads waiting for a change."""
+        with self.query_lock:
+            job_statuses = self.backend.query()
+            with self.condition:
+                self.last_query = time.time()
+                if job_statuses is None:
+                    self.failed = True
+                else:
+                    self.failed = False
+                    self.seen.update(key.split("_")[0] for key in job_statuses)
+                    self.job_statuses = job_statuses
+                self.condition.notify_all()
+
+    def status(self, job_id):
+        job_id = str(job_id)
+        if self.failed:
+            return 'unknown'
+        if job_id in self.job_statuses:
+            return self.job_statuses[job_id]
+        main_job_id = job_id.split("_")[0]
+        if main_job_id not in self.seen and time.time() - self.submitted.get(main_job_id, 0) < self.backend.grace:
+            return 'pending'
+        return 'completed or not found'
+
+    def update(self, molecules):
+        if time.time() - self.last_query >= self.poll:
+            self.refresh()
+        with self.condition:
+            for molecule in molecules:
+                molecule.status = self.status(molecule.job_id)
+
+    def wait(self, molecules, timeout):
+        """Sleeps up to timeout seconds. Returns True if a job of the molecules changed its state meanwhile."""
+        self.start_poller()
+        with self.condition:
+            before = [self.status(m.job_id) for m in molecules]
+            return self.condition.wait_for(lambda: [self.status(m.job_id) for m in molecules] != before, timeout)
+
+    def start_poller(self):
+        with self.query_lock:
+            if self.poller is None:
+                self.poller = Thread(target=self.poll_forever, daemon=True)
+                self.poller.start()
+
+    def poll_forever(self):
+        while True:
+            time.sleep(max(0, self.last_query + self.poll - time.time()))
+            if time.time() - self.last_query >= self.poll:
+                self.refresh()
+
+    def tail(self, path):
+        with self.condition:
+            if path not in self.tails:
+                self.tails[path] = LogTail(path)
+            return self.tails[path]
+
+    def log_grew(self, path):
+        """True if new bytes were written to the log file since the last check."""
+        return bool(self.tail(path).update())
+
+    def last_lines(self, path, num_lines=30):
+        """Last lines of the log file (None if it does not exist)."""
+        tail = self.tail(path)
+        if tail.update() is None:
+            return None
+        return tail.last_lines(num_lines)
+
+
+monitor = None
+
+def get_monitor():
+    global monitor
+    if monitor is None:
+        monitor = JobMonitor(SlurmBackend())
+    return monitor
+
+def set_backend(name='slurm', poll=30, local_jobs=None):
+    global monitor
+    if name == 'local':
+        backend = LocalBackend(max_workers=local_jobs)
+    else:
+        backend = SlurmBackend()
+    monitor = JobMonitor(backend, poll=poll)
+    return monitor
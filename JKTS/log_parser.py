@@ -0,0 +1,180 @@
+import os
+import re
+from mmap import mmap, ACCESS_READ
+from threading import Lock
+#########################################LOG PARSER#############################
+# Energies, frequencies, rotational data and the last geometry of a G16/ORCA output are
+# extracted from one memory-mapped read of the file. Quantities of which the last
+# occurrence is needed are searched backwards from the end of the file (rfind), the others
+# forwards, so most of a long log is never touched. The results are cached by file size
+# and modification time, i.e. a log is parsed again only after it has changed.
+
+G16_LAST = {
+    'zero_point': (b'Zero-point correction=', re.compile(rb'Zero-point correction=\s+([-.\d]+)')),
+    'free_energy': (b'Sum of electronic and thermal Free Energies=', re.compile(rb'Sum of electronic and thermal Free Energies=\s+([-.\d]+)')),
+    'dipole_moment': (b'Tot=', re.compile(rb'Tot=\s+([-\d.]+)')),
+    'Q': (b'Total V=0', re.compile(rb'Total V=0\s+([-\d.]+D[+-]\d+)')),
+    'electronic_energy': (b'SCF Done:  E(', re.compile(rb'SCF Done:  E\(\S+\) =\s+([-.\d]+)')),
+    'rot_temps': (b'Rotational temperature', re.compile(rb'Rotational temperatures? \(Kelvin\)\s+(-?\d+\.\d+)(?:\s+(-?\d+\.\d+))?(?:\s+(-?\d+\.\d+))?')),
+}
+G16_FIRST = {
+    'symmetry_num': (b'Rotational symmetry number', re.compile(rb'Rotational symmetry number\s*(\d+)')),
+    'mol_mass': (b'Molecular mass:', re.compile(rb'Molecular mass:\s+(-?\d+\.\d+)')),
+    'mult': (b'Multiplicity =', re.compile(rb'Multiplicity =\s*(\d+)')),
+}
+G16_FREQUENCIES = re.compile(rb'Frequencies --\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)?\s+(-?\d+\.\d+)?')
+
+ORCA_LAST = {
+    'zero_point': (b'Zero point energy', re.compile(rb'Zero point energy\s+...\s+([-+]?\d*\.\d+|\d+)')),
+    'free_energy': (b'Final Gibbs free energy', re.compile(rb'Final Gibbs free energy\s+...\s+([-+]?\d*\.\d+|\d+)')),
+    'electronic_energy': (b'FINAL SINGLE POINT ENERGY', re.compile(rb'FINAL SINGLE POINT ENERGY\s+([-.\d]+)')),
+    'dipole_moment': (b'Magnitude (Debye)', re.compile(rb'Magnitude \(Debye\)\s*:\s*([\d.]+)')),
+    'rot_temps': (b'Rotational constants in cm-1:', re.compile(rb'Rotational constants in cm-1: \s*[-+]?(\d*\.\d*)  \s*[-+]?(\d*\.\d*) \s*[-+]?(\d*\.\d*)')),
+}
+ORCA_FIRST = {
+    'symmetry_num': (b'Symmetry Number:', re.compile(rb'Symmetry Number:\s*(\d*)')),
+    'mol_mass': (b'Total Mass', re.compile(rb'Total Mass\s*...\s*(\d*\.\d+)')),
+    'mult': (b'Mult', re.compile(rb'Mult\s* ....\s*(\d*)')),
+}
+ORCA_FREQUENCY = re.compile(rb'([-+]?\d*\.\d+)\s*$')
+
+atomic_number_to_symbol = {1: 'H', 6: 'C', 7: 'N', 8: 'O', 16: 'S', 17: 'Cl'}
+
+cache = {}
+cache_lock = Lock()
+
+
+def last_match(mm, key, pattern):
+    idx = len(mm)
+    while True:
+        idx = mm.rfind(key, 0, idx)
+        if idx == -1:
+            return None
+        match = pattern.match(mm, idx)
+        if match:
+            return match
+
+
+def first_match(mm, key, pattern):
+    idx = mm.find(key)
+    while idx != -1:
+        match = pattern.match(mm, idx)
+        if match:
+            return match
+        idx = mm.find(key, idx + 1)
+    return None
+
+
+def is_number(part):
+    return part.replace('.', '', 1).isdigit() or part.lstrip('-').replace('.', '', 1).isdigit()
+
+
+def g16_geometry(mm):
+    start = mm.rfind(b'Standard orientation')
+    if start == -1:
+        return None, None
+    end = mm.find(b'Rotational', start)
+    block = mm[mm.find(b'\n', start) + 1:len(mm) if end == -1 else end].decode('utf-8', 'replace')
+    element, coordinates = [], []
+    for line in block.splitlines():
+        parts = line.split()
+        if len(parts) >= 6 and parts[1].isdigit() and all(is_number(part) for part in parts[-3:]):
+            element.append(atomic_number_to_symbol.get(int(parts[1]), 'Unknown'))
+            coordinates.append([float(parts[3]), float(parts[4]), float(parts[5])])
+    return element, coordinates
+
+
+def orca_geometry(mm):
+    start = mm.rfind(b'CARTESIAN COORDINATES (ANGSTROEM)')
+    if start == -1:
+        return None, None
+    end = mm.find(b'CARTESIAN COORDINATES (A.U.)', start)
+    block = mm[mm.find(b'\n', start) + 1:len(mm) if end == -1 else end].decode('utf-8', 'replace')
+    element, coordinates = [], []
+    for line in block.splitlines():
+        parts = line.split()
+        if len(parts) == 4 and parts[0].isalpha():
+            element.append(parts[0])
+            coordinates.append([float(parts[1]), float(parts[2]), float(parts[3])])
+    return element, coordinates
+
+
+def orca_frequencies(mm):
+    frequencies = []
+    idx = mm.find(b'cm**-1')
+    while idx != -1:
+        line_start = mm.rfind(b'\n', 0, idx) + 1
+        match = ORCA_FREQUENCY.search(mm[line_start:idx])
+        if match:
+            frequencies.append(float(match.group(1)))
+        idx = mm.find(b'cm**-1', idx + 1)
+    return frequencies
+
+
+def read_g16_log(mm):
+    log = {}
+    for name, (key, pattern) in G16_LAST.items():
+        match = last_match(mm, key, pattern)
+        log[name] = match.groups() if match else None
+    for name, (key, pattern) in G16_FIRST.items():
+        match = first_match(mm, key, pattern)
+        log[name] = match.group(1) if match else None
+    for name in ['zero_point', 'free_energy', 'dipole_moment', 'electronic_energy']:
+        log[name] = float(log[name][0]) if log[name] else None
+    log['Q'] = float(log['Q'][0].replace(b'D', b'E')) if log['Q'] else None
+    log['rot_temps'] = [float(rot) for rot in log['rot_temps'] if rot] if log['rot_temps'] else None
+    log['symmetry_num'] = int(log['symmetry_num']) if log['symmetry_num'] else None
+    log['mol_mass'] = float(log['mol_mass']) if log['mol_mass'] else None
+    log['mult'] = int(log['mult']) if log['mult'] else None
+    log['frequencies'] = [float(freq) for match in G16_FREQUENCIES.findall(mm) for freq in match if freq]
+    log['elements'], log['coordinates'] = g16_geometry(mm)
+    return log
+
+
+def read_orca_log(mm):
+    log = {}
+    for name, (key, pattern) in ORCA_LAST.items():
+        match = last_match(mm, key, pattern)
+        log[name] = match.groups() if match else None
+    for name, (key, pattern) in ORCA_FIRST.items():
+        match = first_match(mm, key, pattern)
+        log[name] = match.group(1) if match else None
+    for name in ['zero_point', 'free_energy', 'dipole_moment', 'electronic_energy']:
+        log[name] = float(log[name][0]) if log[name] else None
+    log['rot_temps'] = [float(rot) for rot in log['rot_temps']] if log['rot_temps'] else None
+    log['symmetry_num'] = int(log['symmetry_num']) if log['symmetry_num'] else None
+    log['mol_mass'] = float(log['mol_mass']) if log['mol_mass'] else None
+    log['mult'] = int(log['mult']) if log['mult'] else None
+    log['frequencies'] = orca_frequencies(mm)
+    log['elements'], log['coordinates'] = orca_geometry(mm)
+    return log
+
+
+def parse_log(file_path, program):
+    '''Dictionary of the quantities in a G16 (program="g16") or ORCA (program="orca") output.
+    Missing quantities are None (frequencies: empty list).'''
+    program = program.lower()
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), program)
+    with cache_lock:
+        cached = cache.get(key)
+    if cached and cached[0] == (stat.st_size, stat.st_mtime_ns):
+        return cached[1]
+
+    with open(file_path, 'rb') as f:
+        if stat.st_size > 0:
+            mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+        else:
+            mm = b''
+        try:
+            if program == 'g16':
+                log = read_g16_log(mm)
+            else:
+                log = read_orca_log(mm)
+        finally:
+            if stat.st_size > 0:
+                mm.close()
+
+    with cache_lock:
+        cache[key] = ((stat.st_size, stat.st_mtime_ns), log)
+    return log
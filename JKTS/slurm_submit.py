@@ -1,6 +1,6 @@
 import os
 import subprocess
-import re
+from job_monitor import get_monitor
 #########################################SUBMIT JOBS############################
 def submit_array_job(molecules, args, nnodes=1):
     dir = molecules[0].directory
@@ -43,7 +43,7 @@ def submit_array_job(molecules, args, nnodes=1):
 
     with open(path_submit_script, 'w') as file:
         file.write("#!/bin/bash\n\n")
-        file.write("submit=sbatch\n\n")
+        file.write("submit=${JKTS_SUBMIT:-sbatch}\n\n")
         file.write(f"IN=$1\n")
         file.write("[ `cut -c1 <<< $IN` == '-' ] && { submit=cat; IN=`cut -c2- <<< $IN`; }\n\n")
 
@@ -127,12 +127,11 @@ def submit_array_job(molecules, args, nnodes=1):
             file.write(f"cp *output \\$SLURM_SUBMIT_DIR/.\n")
             file.write(f"!EOF\n\n")
 
-        file.write("sbatch $SUBMIT")
+        file.write("$submit $SUBMIT")
 
     submit_command = ['sh', path_submit_script, array_txt]
     try:
-        result = subprocess.run(submit_command, capture_output=True, text=True, check=True)
-        job_id = extract_job_id(result.stdout)
+        job_id = get_monitor().submit(submit_command, array_size=len(job_files))
         for n, molecule in enumerate(molecules, start=1): 
             molecule.job_id = f"{job_id}_{n}"
         return job_id, interval
@@ -218,7 +217,7 @@ cp *pkl \\$SLURM_SUBMIT_DIR/.
 cp *output \\$SLURM_SUBMIT_DIR/.
 !EOF
 
-sbatch $SUBMIT
+${{JKTS_SUBMIT:-sbatch}} $SUBMIT
     """
 ######################################################################################################################
 
@@ -255,7 +254,7 @@ export GAUSS_SCRDIR=\\$WRKDIR
 
 !EOF
 
-sbatch $SUBMIT
+${{JKTS_SUBMIT:-sbatch}} $SUBMIT
 """
 ######################################################################################################################
     script_content_orca = f"""#!/bin/bash
@@ -292,7 +291,7 @@ cp *Full_trj.xyz \\$SLURM_SUBMIT_DIR/.
 
 !EOF
 
-sbatch $SUBMIT
+${{JKTS_SUBMIT:-sbatch}} $SUBMIT
     """
 
     with open(path_submit_script, 'w') as file:
@@ -305,8 +304,7 @@ sbatch $SUBMIT
 
     submit_command = ['sh', path_submit_script, input_file_name]
     try:
-        result = subprocess.run(submit_command, capture_output=True, text=True, check=True)
-        job_id = extract_job_id(result.stdout)
+        job_id = get_monitor().submit(submit_command)
         molecule.job_id = f"{job_id}"
         return job_id, interval
     except subprocess.CalledProcessError as e:
@@ -315,56 +313,8 @@ sbatch $SUBMIT
 
 
 def update_molecules_status(molecules):
-    # Gather all unique job IDs
-    unique_job_ids = set(molecule.job_id.split("_")[0] for molecule in molecules)
-    job_statuses = {}
-
-    # Query the status of each unique job ID
-    for job_id in unique_job_ids:
-        try:
-            result = subprocess.run(['squeue', '-j', job_id], capture_output=True, text=True, check=True)
-            job_statuses.update(parse_job_statuses(result.stdout, job_id))
-        except subprocess.CalledProcessError:
-            # If the command fails, assume 'unknown' status for all jobs with this prefix
-            for molecule in molecules:
-                if molecule.job_id.startswith(job_id):
-                    molecule.status = 'unknown'
-            continue  # Skip to the next job_id if there's an error
-
-    # Update molecule status based on job_statuses dictionary
-    for molecule in molecules:
-        molecule.status = job_statuses.get(molecule.job_id, 'completed or not found')
-
-def parse_job_statuses(output, main_job_id):
-    job_statuses = {}
-    lines = output.strip().split("\n")
-
-    for line in lines[1:]:  # Skip the header line
-        parts = line.split()
-        if len(parts) > 4:
-            job_id_field = parts[0]
-            status = 'running' if 'R' in parts else 'pending' if 'PD' in parts else 'completed or not found'
-
-            # Handle range of job IDs
-            if '[' in job_id_field:
-                range_match = re.search(r'\[(\d+)-(\d+)', job_id_field)
-                if range_match:
-                    start, end = range_match.groups(1)
-                    for i in range(int(start), int(end) + 1):
-                        job_statuses[f"{main_job_id}_{i}"] = status
-            else:
-                job_statuses[job_id_field] = status
-
-    return job_statuses
-
-
-def extract_job_id(output):
-    match = re.search(r'Submitted batch job (\d+)', output)
-    if match:
-        return int(match.group(1))
-    else:
-        print("Could not extract job ID.")
-        return None
+    # The states of all jobs come from one (shared, cached) backend query per poll cycle
+    get_monitor().update(molecules)
 
 
 def get_interval_seconds(molecule):
@@ -619,3 +619,178 @@ def compare(in_a,in_b,simpleit=0,noHydrogens=0,mass_weighted=0,Qreturn_geometry=
       return(float(rmsds[0][0]))
      else:
       return(float(InitRMSD_unsorted))
+
+##############################################################################
+# BATCHED ArbAlign
+# The same algorithm as compare() (sorting by labels and coordinates, Kuhn-Munkres
+# assignment of the first element for all 48 swaps/reflections, then of every element
+# type with the Kabsch RMSD after each step) for many structure pairs:
+#  - the structures are packed: atomic numbers, positions (sum of N x 3) and offsets,
+#  - sorting, element blocks and weights are precomputed once per structure,
+#  - the cost matrices and Kabsch alignments of all 48 swaps/reflections are evaluated
+#    as stacked numpy arrays (only the lapjv assignment is done matrix by matrix).
+# Pairs for which compare() returns an error message (different number or type of
+# atoms) get nan.
+##############################################################################
+
+def transformation_matrices():
+   """
+   Returns the 48 swap/reflection matrices M (in the order of compare()) such that
+   transform_coords(coords, swap, reflect) == coords @ M
+   """
+   swaps = [(0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)]
+   reflects = [(1, 1, 1), (-1, 1, 1), (1, -1, 1), (1, 1, -1),
+               (-1, -1, 1), (-1, 1, -1), (1, -1, -1), (-1, -1, -1)]
+   T = np.zeros((len(swaps)*len(reflects), 3, 3))
+   for i, swap in enumerate(swaps):
+      for j, reflect in enumerate(reflects):
+         for k in range(3):
+            T[i*len(reflects) + j, swap[k], k] = reflect[k]
+   return T
+
+TRANSFORMS = transformation_matrices()
+
+def batch_kabsch(A, B, w):
+   """
+   A - set of coordinates (N x 3)
+   B - stack of sets of coordinates (K x N x 3)
+   w - weight vector (normalized; 1/N for the plain RMSD)
+
+   Returns the (weighted) Kabsch RMSDs between A and every B[k] (K)
+   """
+   A = A - w @ A
+   B = B - np.einsum('n,knd->kd', w, B)[:, None, :]
+   C = np.einsum('nd,n,kne->kde', A, w, B)
+   V, S, W = np.linalg.svd(C)
+   d = (np.linalg.det(V) * np.linalg.det(W)) < 0.0
+   V[d, :, -1] = -V[d, :, -1]
+   U = V @ W
+   diff = np.einsum('nd,kde->kne', A, U) - B
+   return np.sqrt(np.einsum('n,kn->k', w, (diff**2).sum(axis=2)))
+
+def batch_assignments(A, B):
+   """
+   A - set of coordinates (n x 3)
+   B - stack of sets of coordinates (K x n x 3)
+
+   Returns the Kuhn-Munkres (lapjv) permutations (K x n): B[k][perm[k][i]] is assigned to A[i]
+   """
+   cost = np.linalg.norm(A[None, :, None, :] - B[:, None, :, :], axis=3)
+   return np.array([lapjv.lapjv(cost[k])[0] for k in range(len(cost))], dtype=int)
+
+def prepare_structure(numbers, positions, mass_weighted=0):
+   """
+   Precomputes everything compare() derives from one structure: the labels and
+   coordinates sorted by (label, x, y, z), the element blocks and the weights
+   """
+   from ase.data import chemical_symbols
+   positions = np.array(positions, dtype=float)
+   labels = [chemical_symbols[int(z)] for z in numbers]
+   order = sorted(range(len(labels)), key=lambda i: (labels[i], positions[i][0], positions[i][1], positions[i][2]))
+   sorted_labels = [labels[i] for i in order]
+   uniq = sorted(set(sorted_labels))
+   blocks = [slice(sorted_labels.index(u), len(sorted_labels) - sorted_labels[::-1].index(u)) for u in uniq]
+   structure = {"positions": positions,
+                "coords": positions[order],
+                "composition": tuple((u, b.stop - b.start) for u, b in zip(uniq, blocks)),
+                "blocks": blocks}
+   if len(labels) == 0:
+      return structure
+   if mass_weighted == 1:
+      structure["weights"] = get_weight(labels)[1]
+      structure["sorted_weights"] = get_weight(sorted_labels)[1]
+   else:
+      structure["weights"] = structure["sorted_weights"] = np.full(len(labels), 1.0/len(labels))
+   return structure
+
+def compare_prepared(a, b):
+   """
+   a, b - structures from prepare_structure()
+
+   Returns the same (lowest) RMSD as compare(a, b) or nan
+   """
+   if len(a["positions"]) != len(b["positions"]) or len(a["positions"]) == 0:
+      return float("nan")
+   InitRMSD_unsorted = batch_kabsch(a["positions"], b["positions"][None], a["weights"])[0]
+   if InitRMSD_unsorted < 0.001:
+      return float(InitRMSD_unsorted)
+   if a["composition"] != b["composition"]:
+      return float("nan")
+
+   a_coords, b_coords, w = a["coords"], b["coords"], a["sorted_weights"]
+   blocks = a["blocks"]
+   # assignment of the first element type for all swaps/reflections of its centered coordinates
+   first = blocks[0]
+   A = a_coords[first] - a_coords[first].mean(axis=0)
+   B = b_coords[first] - b_coords[first].mean(axis=0)
+   perms = batch_assignments(A, np.einsum('nd,tde->tne', B, TRANSFORMS))
+   b_trans = np.repeat(b_coords[None], len(TRANSFORMS), axis=0)
+   b_trans[:, first] = b_coords[first][perms]
+   b_trans = np.einsum('tnd,tde->tne', b_trans, TRANSFORMS)
+   if len(blocks) == 1:
+      rmsds = batch_kabsch(a_coords, b_trans, w)
+   else:
+      # reassignment of every element type in the swapped/reflected frame
+      rmsds = []
+      for block in blocks:
+         perms = batch_assignments(a_coords[block], b_trans[:, block])
+         b_trans[:, block] = np.take_along_axis(b_trans[:, block], perms[:, :, None], axis=1)
+         rmsds.append(batch_kabsch(a_coords, b_trans, w))
+      rmsds = np.concatenate(rmsds)
+   FinalRMSD = rmsds.min()
+   if FinalRMSD < InitRMSD_unsorted:
+      return float(FinalRMSD)
+   else:
+      return float(InitRMSD_unsorted)
+
+def pack_structures(structures):
+   """
+   structures - list of ASE atoms
+
+   Returns the packed (numbers, positions, offsets)
+   """
+   offsets = np.cumsum([0] + [len(s) for s in structures])
+   numbers = np.concatenate([s.get_atomic_numbers() for s in structures]) if len(structures) > 0 else np.zeros(0, dtype=int)
+   positions = np.concatenate([s.get_positions() for s in structures]) if len(structures) > 0 else np.zeros((0, 3))
+   return numbers, positions, offsets
+
+def compare_batch(numbers, positions, offsets, pairs, mass_weighted=0):
+   """
+   numbers, positions, offsets - packed structures (structure i is [offsets[i]:offsets[i+1]])
+   pairs - list of (i, j)
+
+   Returns the array of compare(structure i, structure j) for all pairs
+   """
+   prepared = {}
+   def structure(i):
+      if i not in prepared:
+         prepared[i] = prepare_structure(numbers[offsets[i]:offsets[i+1]], positions[offsets[i]:offsets[i+1]], mass_weighted)
+      return prepared[i]
+   return np.array([compare_prepared(structure(int(i)), structure(int(j))) for i, j in pairs], dtype=float)
+
+def compare_many(reference, candidates, mass_weighted=0):
+   """
+   Returns the array of compare(reference, candidate) for all candidates (ASE atoms)
+   """
+   numbers, positions, offsets = pack_structures([reference] + list(candidates))
+   return compare_batch(numbers, positions, offsets, [(0, j) for j in range(1, len(offsets) - 1)], mass_weighted)
+
+def rmsd_matrix(structures, references=None, mass_weighted=0):
+   """
+   structures, references - lists of ASE atoms
+
+   Returns the RMSD matrix M[i, j] = compare(structures[i], references[j]).
+   Without references, the symmetric matrix of the structures (from compare(i, j) with i < j).
+   """
+   n = len(structures)
+   if references is None:
+      numbers, positions, offsets = pack_structures(structures)
+      pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+      M = np.zeros((n, n))
+      if len(pairs) > 0:
+         rows, cols = np.array(pairs).T
+         M[rows, cols] = M[cols, rows] = compare_batch(numbers, positions, offsets, pairs, mass_weighted)
+      return M
+   numbers, positions, offsets = pack_structures(list(structures) + list(references))
+   pairs = [(i, n + j) for i in range(n) for j in range(len(references))]
+   return compare_batch(numbers, positions, offsets, pairs, mass_weighted).reshape(n, len(references))